@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import abc
+import time
+import threading
+
+
+class Clock(abc.ABC):
+    """The time as seen by the server.
+
+    Everything that schedules or measures (announcements, TX hold-offs, the RX
+    indicator, queue waits, the duplicate request window, reconnection backoff
+    and message timestamps) asks the current clock rather than calling
+    time.time(), so a SimulatedClock can stand in for the real one.
+    """
+
+    @abc.abstractmethod
+    def time(self) -> float:
+        ...
+
+    @abc.abstractmethod
+    def sleep(self, seconds: float) -> None:
+        ...
+
+
+class SystemClock(Clock):
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class SimulatedClock(Clock):
+    """A clock that only moves when told to.
+
+    sleep() moves the clock forward rather than waiting, so hours of timers run
+    in moments and every run gives the same result.
+    """
+
+    def __init__(self, start: float = 1_700_000_000.0):
+        self.now = start
+        self.lock = threading.Lock()
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> float:
+        with self.lock:
+            self.now += max(0.0, seconds)
+            return self.now
+
+    def advance_to(self, when: float) -> float:
+        # Never goes backwards
+        with self.lock:
+            self.now = max(self.now, when)
+            return self.now
+
+
+_clock: Clock = SystemClock()
+
+
+def now() -> float:
+    return _clock.time()
+
+
+def sleep(seconds: float) -> None:
+    _clock.sleep(seconds)
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def use_clock(clock: Clock) -> Clock:
+    # Make clock the one used by the whole server; returns the one it replaces
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
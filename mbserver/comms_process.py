@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+# Run the connection to JS8Call in a process of its own.
+#
+#   python mbserver.py --mode process       the backend
+#   python -m mbserver.comms_process        the comms process; one for each radio (see --radio)
+#
+# The comms process runs the same Js8CallDriver as the threaded mode, so nothing the
+# backend does (a long scan of posts_dir, a slow upstream fetch) can hold up reading from
+# JS8Call or following the PTT.  The two talk over a Unix socket, passing UnifiedMessages
+# in the binary form from message_codec.  Either can be stopped and restarted without the
+# other: the comms process holds JS8Call's messages for the backend (up to
+# backend_queue_size) and the replies it has been given, and the backend holds replies for
+# a comms process that isn't connected until it comes back.
+
+import os
+import sys
+import queue
+import select
+import signal
+import socket
+import logging
+import argparse
+import threading
+from typing import Dict, Optional
+
+from . import clock
+from .config import SETTINGS
+from .logging_setup import configure_logging
+from .js8call_driver import Js8CallDriver, Reconnector
+from .latency_trace import tracer
+from .message_codec import encode_message, MessageFrameDecoder
+from .message_q import (
+    c2b_q, FairQueue, OverflowQueue, UnifiedMessage, MessageTarget, MessageType, MessageVerb, MessageParameter,
+    BACKEND_QUEUE_SIZE, CONTROL_QUEUE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+comms_socket = SETTINGS.comms_socket
+
+HAVE_UNIX_SOCKETS = hasattr(socket, "AF_UNIX")  # not on Windows
+RECV_BYTES = 65536
+STATS_INTERVAL = 3600  # seconds between the comms process logging its stats
+BACKEND_WAIT = 5.0  # seconds a request from a comms process waits for room in the backend queue
+
+
+def control_message(verb: MessageVerb, params: Optional[dict] = None) -> UnifiedMessage:
+    return UnifiedMessage.internal(
+        priority=0,
+        target=MessageTarget.COMMS,
+        typ=MessageType.CONTROL,
+        verb=verb,
+        params=params
+    )
+
+
+class CommsBridge:
+    """The comms process's link to the backend.
+
+    Messages the driver puts on its backend queue are sent to the backend, and
+    messages from the backend are put on the driver's P0 and P1 queues, as the
+    backend itself does in the threaded mode.  The link is remade, with backoff,
+    whenever the backend goes away; meanwhile the driver's backend queue fills and
+    its overflow policy applies.
+    """
+
+    def __init__(self, driver: Js8CallDriver, radio_name: str, path: str = comms_socket):
+        self.driver = driver
+        self.radio_name = radio_name
+        self.path = path
+        self.reconnector = Reconnector(peer="the backend")
+        self.sock: Optional[socket.socket] = None
+        self.decoder = MessageFrameDecoder()
+        self.running = True
+        self.next_stats = clock.now() + STATS_INTERVAL
+
+    def connect(self) -> bool:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(encode_message(control_message(
+                MessageVerb.ATTACH, {MessageParameter.RADIO: self.radio_name}
+            )))
+        except OSError as e:
+            sock.close()
+            logger.warning(f"Unable to connect to the backend at {self.path}: {e}")
+            return False
+
+        logger.info(f"Connected to the backend at {self.path}")
+        self.sock = sock
+        self.decoder.clear()
+        self.reconnector.link_up()
+        # The backend may have restarted, in which case it needs the callsign again
+        self.driver.b2c_q_p0.put(control_message(MessageVerb.GET_CALLSIGN))
+        self.driver.b2c_q_p0.put(control_message(MessageVerb.GET_FREQ))
+        return True
+
+    def disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            self.reconnector.link_down()
+
+    def run(self):
+        self.reconnector.link_down()
+        while self.running:
+            if self.sock is None and not self.connect():
+                delay = self.reconnector.next_delay()
+                logger.info(f"Retrying the connection to the backend in {delay:.1f}s")
+                clock.sleep(delay)
+                continue
+
+            try:
+                self.to_backend()
+                self.from_backend()
+            except (OSError, ValueError) as e:
+                logger.error(f"Lost the connection to the backend: {e}")
+                self.disconnect()
+
+            if clock.now() >= self.next_stats:
+                self.next_stats = clock.now() + STATS_INTERVAL
+                self.log_stats()
+
+    def to_backend(self):
+        # Wait briefly for a message for the backend, then send it with any others waiting
+        try:
+            batch = [self.driver.c2b_q.get(timeout=0.05)]
+        except queue.Empty:
+            return
+        while True:
+            try:
+                batch.append(self.driver.c2b_q.get_nowait())
+            except queue.Empty:
+                break
+        for _ in batch:
+            self.driver.c2b_q.task_done()
+
+        try:
+            self.sock.sendall(b"".join(map(encode_message, batch)))
+        except OSError:
+            for m in batch:
+                self.driver.c2b_q.put(m)  # for the next connection
+            raise
+
+    def from_backend(self):
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        if not readable:
+            return
+        data = self.sock.recv(RECV_BYTES)
+        if not data:
+            raise ConnectionResetError("the backend has closed the connection")
+        for m in self.decoder.feed(data):
+            if m.priority == 0:
+                self.driver.b2c_q_p0.put(m)
+            elif m.priority == 1:
+                self.driver.b2c_q_p1.put(m)
+
+    def log_stats(self):
+        driver = self.driver
+        logger.info(f"Transmissions: {driver.tx_scheduler.stats()}")
+        logger.info(f"Backend queue: {driver.c2b_q.stats()}")
+        logger.info(f"Outbound queue (high water {driver.b2c_q_p1.high_water}) by station: {driver.b2c_q_p1.stats()}")
+        logger.info(f"JS8Call connection: {driver.link_stats()}")
+        logger.info(f"Backend connection: {self.reconnector.stats()}")
+        logger.info(f"TX journal: {driver.journal.stats()}")
+
+    def close(self):
+        self.running = False
+        self.log_stats()
+
+
+class RemoteComms:
+    """The backend's stand-in for the comms driver of a radio served by a comms process.
+
+    MbServer puts messages on b2c_q_p0 and b2c_q_p1 as it would for a Js8CallDriver,
+    and run_comms() passes them on whenever the comms process is connected.  Replies
+    wait here while it isn't; P0 messages are dropped, as the comms process asks
+    JS8Call for the station details itself when it connects.
+    """
+
+    tx_scheduler = None  # transmissions are timed, and their airtime logged, by the comms process
+    journal = None  # and the replies it has been given are journaled there
+
+    def __init__(self, name: str):
+        self.name = name
+        self.b2c_q_p0 = OverflowQueue(CONTROL_QUEUE_SIZE)
+        # Duplicate replies are collapsed by the comms process, whose journal holds their requests
+        self.b2c_q_p1 = FairQueue(collapse=False)
+        self.conn: Optional[socket.socket] = None
+        self.lock = threading.Lock()
+        self.link = Reconnector(peer=f"the comms process for {name}")  # for its record of outages
+        self.link.link_down()
+        self.is_connected = True  # until the backend stops
+
+    def attach(self, conn: socket.socket):
+        with self.lock:
+            previous, self.conn = self.conn, conn
+        if previous is not None:
+            previous.close()  # a restarted comms process has taken over
+        self.link.link_up()
+
+    def detach(self, conn: socket.socket):
+        with self.lock:
+            if self.conn is not conn:
+                return
+            self.conn = None
+        self.link.link_down()
+
+    def link_stats(self) -> dict:
+        return self.link.stats()
+
+    def send(self, m: UnifiedMessage) -> bool:
+        conn = self.conn
+        if conn is None:
+            return False
+        try:
+            conn.sendall(encode_message(m))
+        except OSError as e:
+            logger.warning(f"Lost the connection to the comms process for {self.name}: {e}")
+            self.detach(conn)
+            return False
+        return True
+
+    def run_comms(self):
+        while self.is_connected:
+            try:
+                m: UnifiedMessage = self.b2c_q_p0.get_nowait()
+            except queue.Empty:
+                if self.conn is not None and not self.b2c_q_p1.empty():
+                    m = self.b2c_q_p1.get_nowait()
+                else:
+                    try:
+                        m = self.b2c_q_p0.get(timeout=0.05)
+                    except queue.Empty:
+                        continue
+
+            if m.get_typ() == MessageType.CONTROL and m.get_verb() == MessageVerb.SHUTDOWN:
+                # The backend is stopping; the comms process carries on without it
+                self.is_connected = False
+                break
+
+            if not self.send(m) and m.priority == 1:
+                self.b2c_q_p1.put_back(m)  # send it first once the comms process is back
+
+
+class CommsListener:
+    """Accept connections from comms processes and pass on what they send to the backend."""
+
+    def __init__(self, remotes: Dict[str, RemoteComms], c2b: OverflowQueue = c2b_q, path: str = comms_socket):
+        self.remotes = remotes
+        self.c2b_q = c2b
+        self.path = path
+        self.sock: Optional[socket.socket] = None
+
+    def open(self):
+        # Raises OSError if the socket can't be made, or another server is using it
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # left behind by a backend that didn't stop cleanly
+            else:
+                raise OSError(f"another server is already listening on {self.path}")
+            finally:
+                probe.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen()
+
+    def run(self):
+        if self.sock is None:
+            self.open()
+        logger.info(f"Waiting for comms processes on {self.path}")
+
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break  # closed by close()
+            threading.Thread(target=self.serve, args=(conn,), name="comms link", daemon=True).start()
+
+    def identify(self, m: UnifiedMessage) -> Optional[RemoteComms]:
+        if m.get_verb() != MessageVerb.ATTACH:
+            logger.error(f"A comms process sent {m.get_verb().value} before saying which radio it serves")
+            return None
+        name = m.get_param(MessageParameter.RADIO)
+        comms = self.remotes.get(name)
+        if comms is None and len(self.remotes) == 1:
+            comms = next(iter(self.remotes.values()))  # e.g. --tcp-port has given the one radio another name
+        if comms is None:
+            logger.error(f"A comms process for the unknown radio {name} has connected")
+            return None
+        logger.info(f"The comms process for {comms.name} has connected")
+        return comms
+
+    def serve(self, conn: socket.socket):
+        decoder = MessageFrameDecoder()
+        comms: Optional[RemoteComms] = None
+        try:
+            while True:
+                data = conn.recv(RECV_BYTES)
+                if not data:
+                    break
+                for m in decoder.feed(data):
+                    if comms is None:
+                        comms = self.identify(m)
+                        if comms is None:
+                            return
+                        comms.attach(conn)
+                        continue
+                    # If the backend is behind, stop reading for a while, so that the comms process's
+                    # own backend queue fills and its overflow policy (BUSY replies) applies.  Old
+                    # signals are dropped rather than waited for.
+                    if not self.c2b_q.put_wait(m, BACKEND_WAIT) and m.get_typ() == MessageType.MB_MSG:
+                        logger.warning(
+                            f"The backend has been busy for {BACKEND_WAIT:.0f}s; dropping a message from"
+                            f" {m.get_param(MessageParameter.SOURCE)}"
+                        )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Lost a connection from a comms process: {e}")
+        finally:
+            if comms is not None:
+                logger.info(f"The comms process for {comms.name} has disconnected")
+                comms.detach(conn)
+            conn.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m mbserver.comms_process",
+                                     description="Run the connection to one JS8Call instance for a server "
+                                                 "started with --mode process.")
+    parser.add_argument("--radio", default=None,
+                        help="Name of the radio in the [server] radios setting. Defaults to the first.")
+    parser.add_argument("--tcp-port", dest="tcp_port", type=int, default=None,
+                        help="The TCP port number that JS8Call is listening to for a connection.")
+    parser.add_argument("--socket", default=comms_socket,
+                        help="The server's Unix socket. Defaults to comms_socket in config.ini.")
+    parser.add_argument("--log-level", dest="log_level", default="INFO", help="Logging level. Defaults to INFO.")
+    parser.add_argument("--log-file", dest="log_file", default=None,
+                        help="Also log to this file; use a different file from the server's.")
+    args = parser.parse_args(sys.argv[1:])
+
+    configure_logging(
+        level=getattr(logging, args.log_level.upper(), logging.INFO),
+        terminator=SETTINGS.msg_terminator,
+        log_file=args.log_file,
+        console=True,
+    )
+
+    if not HAVE_UNIX_SOCKETS:
+        logger.error("The comms process needs Unix sockets, which this system doesn't have")
+        return 1
+
+    radios = {name: (host, port) for name, host, port in SETTINGS.radios}
+    name = args.radio if args.radio is not None else SETTINGS.radios[0][0]
+    if name not in radios:
+        logger.error(f"There is no radio called {name}; the radios are {', '.join(radios)}")
+        return 2
+    host, port = radios[name]
+    if args.tcp_port is not None:
+        port = args.tcp_port
+
+    tracer.enabled = False  # see latency_trace.LatencyTracer
+    driver = Js8CallDriver(
+        OverflowQueue(CONTROL_QUEUE_SIZE), FairQueue(), OverflowQueue(BACKEND_QUEUE_SIZE),
+        addr=(host, port), radio=name if len(radios) > 1 else ''
+    )
+    bridge = CommsBridge(driver, name, args.socket)
+    threading.Thread(target=bridge.run, name="backend link", daemon=True).start()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    logger.info(f"Running the comms process for {name}")
+    try:
+        driver.run_comms()
+    except KeyboardInterrupt:
+        pass
+    bridge.close()
+    logger.info("The comms process is stopping")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 import configparser
 import logging
 from dataclasses import dataclass
@@ -32,11 +33,54 @@ def _as_int(cfg: configparser.ConfigParser, section: str, option: str, default:
         return default
 
 
+def _as_float(cfg: configparser.ConfigParser, section: str, option: str, default: float) -> float:
+    try:
+        return cfg.getfloat(section, option, fallback=default)
+    except ValueError:
+        return default
+
+
 def _as_str(cfg: configparser.ConfigParser, section: str, option: str, default: str) -> str:
     val = cfg.get(section, option, fallback=default)
     return val if val is not None else default
 
 
+def _as_path(cfg: configparser.ConfigParser, section: str, option: str, default: str) -> str:
+    # Relative paths are taken from the app root, not the directory the server was started from.
+    # Blank stays blank (the feature is off).
+    value = _as_str(cfg, section, option, default).strip()
+    if not value or os.path.isabs(value):
+        return value
+    return os.path.join(str(_repo_root()), value)
+
+
+def _parse_radios(value: str, host: str, port: int) -> Tuple[Tuple[str, str, int], ...]:
+    # "40m=127.0.0.1:2442, 20m=127.0.0.1:2443" -> (name, host, port) for each radio.  The name
+    # and host are optional; an empty list means the single JS8Call at host:port.
+    radios = []
+    names = set()
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, addr = entry.rpartition("=")
+        radio_host, _, radio_port = addr.strip().rpartition(":")
+        radio_host = radio_host.strip() or host
+        try:
+            radio_port = int(radio_port)
+        except ValueError:
+            continue
+        name = name.strip() or f"{radio_host}:{radio_port}"
+        if name in names:
+            continue
+        names.add(name)
+        radios.append((name, radio_host, radio_port))
+
+    if not radios:
+        radios.append((f"{host}:{port}", host, port))
+    return tuple(radios)
+
+
 def _parse_log_level(value: str, default: int) -> int:
     if not value:
         return default
@@ -57,18 +101,40 @@ class Settings:
 
     # Server / protocol
     server: Tuple[str, int]
+    radios: Tuple[Tuple[str, str, int], ...]  # (name, host, port) of each JS8Call instance served
     msg_terminator: str
     announce: bool
     mb_announcement_timer: int  # minutes
+    mode: str  # threaded, asyncio or process
+    comms_socket: str  # Unix socket between the backend and the comms processes, in process mode
+    tx_chars_per_frame: float
+    max_message_chars: int
+    station_queue_size: int
+    backend_queue_size: int
+    control_queue_size: int
+    busy_reply: bool
+    duplicate_window: int  # seconds
+    reconnect_delay: float  # seconds
+    reconnect_max_delay: float  # seconds
+    tx_journal: str  # blank for none
+    tx_journal_expiry: int  # seconds
 
     # Posts
     posts_url_root: str
     posts_dir: str
     lst_limit: int
     replace_nl: bool
+    watch_interval: int  # seconds
+    content_cache_bytes: int
+    response_cache_entries: int
+    post_store: str  # directory, archive or sqlite
+    db_file: str
+    archive_file: str
+    search_limit: int
 
     # Debug
     debug: bool
+    validate_messages: bool
 
     # Logging
     log_level: int
@@ -76,6 +142,7 @@ class Settings:
     log_file: str
     log_max_bytes: int
     log_backup_count: int
+    trace_file: str  # blank for none
 
 
 def load_settings() -> Settings:
@@ -87,18 +154,40 @@ def load_settings() -> Settings:
         "server": {
             "host": "127.0.0.1",
             "port": "2442",
+            "radios": "",
             "msg_terminator": "♢",
             "announce": "true",
             "mb_announcement_timer": "60",
+            "mode": "threaded",
+            "comms_socket": "mbserver-comms.sock",
+            "tx_chars_per_frame": "16",
+            "max_message_chars": "0",
+            "station_queue_size": "5",
+            "backend_queue_size": "20",
+            "control_queue_size": "20",
+            "busy_reply": "true",
+            "duplicate_window": "120",
+            "reconnect_delay": "1",
+            "reconnect_max_delay": "60",
+            "tx_journal": "mbserver-tx.journal",
+            "tx_journal_expiry": "1800",
         },
         "posts": {
             "posts_url_root": "",
             "posts_dir": "posts\\",
             "lst_limit": "5",
             "replace_nl": "false",
+            "watch_interval": "5",
+            "content_cache_bytes": "262144",
+            "response_cache_entries": "256",
+            "store": "directory",
+            "db_file": "posts.db",
+            "archive_file": "posts.mbar",
+            "search_limit": "20",
         },
         "debug": {
             "debug": "false",
+            "validate_messages": "false",
         },
         "logging": {
             "log_level": "INFO",
@@ -106,6 +195,7 @@ def load_settings() -> Settings:
             "log_file": "logs/mbserver.log",
             "log_max_bytes": "5000000",
             "log_backup_count": "5",
+            "trace_file": "",
         },
     }
 
@@ -116,38 +206,84 @@ def load_settings() -> Settings:
 
     host = _as_str(cfg, "server", "host", "127.0.0.1")
     port = _as_int(cfg, "server", "port", 2442)
+    radios = _parse_radios(_as_str(cfg, "server", "radios", ""), host, port)
     msg_terminator = _as_str(cfg, "server", "msg_terminator", "♢")
     announce = _as_bool(cfg, "server", "announce", True)
     mb_announcement_timer = _as_int(cfg, "server", "mb_announcement_timer", 60)
+    mode = _as_str(cfg, "server", "mode", "threaded").strip().lower()
+    comms_socket = _as_path(cfg, "server", "comms_socket", "mbserver-comms.sock")
+    tx_chars_per_frame = _as_float(cfg, "server", "tx_chars_per_frame", 16.0)
+    max_message_chars = _as_int(cfg, "server", "max_message_chars", 0)
+    station_queue_size = _as_int(cfg, "server", "station_queue_size", 5)
+    backend_queue_size = _as_int(cfg, "server", "backend_queue_size", 20)
+    control_queue_size = _as_int(cfg, "server", "control_queue_size", 20)
+    busy_reply = _as_bool(cfg, "server", "busy_reply", True)
+    duplicate_window = _as_int(cfg, "server", "duplicate_window", 120)
+    reconnect_delay = _as_float(cfg, "server", "reconnect_delay", 1.0)
+    reconnect_max_delay = _as_float(cfg, "server", "reconnect_max_delay", 60.0)
+    tx_journal = _as_path(cfg, "server", "tx_journal", "mbserver-tx.journal")
+    tx_journal_expiry = _as_int(cfg, "server", "tx_journal_expiry", 1800)
 
     posts_url_root = _as_str(cfg, "posts", "posts_url_root", "")
-    posts_dir = _as_str(cfg, "posts", "posts_dir", "posts\\")
+    posts_dir = _as_path(cfg, "posts", "posts_dir", "posts\\")
     lst_limit = _as_int(cfg, "posts", "lst_limit", 5)
     replace_nl = _as_bool(cfg, "posts", "replace_nl", False)
+    watch_interval = _as_int(cfg, "posts", "watch_interval", 5)
+    content_cache_bytes = _as_int(cfg, "posts", "content_cache_bytes", 262144)
+    response_cache_entries = _as_int(cfg, "posts", "response_cache_entries", 256)
+    post_store = _as_str(cfg, "posts", "store", "directory").strip().lower()
+    db_file = _as_path(cfg, "posts", "db_file", "posts.db")
+    archive_file = _as_path(cfg, "posts", "archive_file", "posts.mbar")
+    search_limit = _as_int(cfg, "posts", "search_limit", 20)
 
     debug = _as_bool(cfg, "debug", "debug", False)
+    validate_messages = _as_bool(cfg, "debug", "validate_messages", False)
 
     log_level = _parse_log_level(_as_str(cfg, "logging", "log_level", "INFO"), logging.INFO)
     log_to_file = _as_bool(cfg, "logging", "log_to_file", True)
-    log_file = _as_str(cfg, "logging", "log_file", "logs/mbserver.log")
+    log_file = _as_path(cfg, "logging", "log_file", "logs/mbserver.log")
     log_max_bytes = _as_int(cfg, "logging", "log_max_bytes", 5_000_000)
     log_backup_count = _as_int(cfg, "logging", "log_backup_count", 5)
+    trace_file = _as_path(cfg, "logging", "trace_file", "")
 
     return Settings(
         server=(host, port),
+        radios=radios,
         msg_terminator=msg_terminator,
         announce=announce,
         mb_announcement_timer=mb_announcement_timer,
+        mode=mode,
+        comms_socket=comms_socket,
+        tx_chars_per_frame=tx_chars_per_frame,
+        max_message_chars=max_message_chars,
+        station_queue_size=station_queue_size,
+        backend_queue_size=backend_queue_size,
+        control_queue_size=control_queue_size,
+        busy_reply=busy_reply,
+        duplicate_window=duplicate_window,
+        reconnect_delay=reconnect_delay,
+        reconnect_max_delay=reconnect_max_delay,
+        tx_journal=tx_journal,
+        tx_journal_expiry=tx_journal_expiry,
         posts_url_root=posts_url_root,
         posts_dir=posts_dir,
         lst_limit=lst_limit,
         replace_nl=replace_nl,
+        watch_interval=watch_interval,
+        content_cache_bytes=content_cache_bytes,
+        response_cache_entries=response_cache_entries,
+        post_store=post_store,
+        db_file=db_file,
+        archive_file=archive_file,
+        search_limit=search_limit,
         debug=debug,
+        validate_messages=validate_messages,
         log_level=log_level,
         log_to_file=log_to_file,
         log_file=log_file,
         log_max_bytes=log_max_bytes,
         log_backup_count=log_backup_count,
+        trace_file=trace_file,
     )
 
 
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ContentCache:
+    """LRU cache of normalised post bodies, bounded in bytes.
+
+    Each entry remembers the stamp of the content it was loaded from, e.g. the name,
+    mtime and size of a post file.  The caller passes the current stamp to get() and
+    the content is only loaded again if the stamp has changed.  A stamp of None
+    means the content no longer exists.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, Tuple[Any, str, int]] = OrderedDict()  # stamp, body, cost
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _discard(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[2]
+
+    def get(self, key: str, stamp: Optional[Hashable], load: Callable[[], str]) -> Optional[str]:
+        # Returns None if the content no longer exists
+        if stamp is None:
+            self._discard(key)
+            return None
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        self._discard(key)
+        try:
+            body = load()
+        except OSError:
+            return None
+
+        cost = len(body.encode("utf-8"))
+        if cost <= self.max_bytes:
+            self.entries[key] = (stamp, body, cost)
+            self.size_bytes += cost
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size_bytes -= evicted[2]
+                self.evictions += 1
+
+        return body
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -3,48 +3,136 @@ from socket import socket, AF_INET, SOCK_STREAM
 import queue
 import logging
 import json
-import time
 import select
+import random
+import asyncio
+from typing import Optional, Tuple
 
+from . import clock
 from .general_functions import add_progress_m
-from .message_q import b2c_q_p0, b2c_q_p1, c2b_q, UnifiedMessage, MessageType, MessageVerb, MessageParameter
+from .message_q import (
+    b2c_q_p0, b2c_q_p1, c2b_q, AsyncOverflowQueue, FairQueue, OverflowQueue, UnifiedMessage, MessageTarget,
+    MessageType, MessageVerb, MessageParameter, _PARAM_KEYS
+)
 from .config import SETTINGS
+from .json_stream import JsonLineDecoder
+from .latency_trace import tracer
+from .request_grammar import parse_request
+from .tx_journal import TxJournal, journal_path, tx_journal
+from .tx_scheduler import Transmission, TxScheduler
 
 js8call_addr = SETTINGS.server
 debug = SETTINGS.debug
+tx_chars_per_frame = SETTINGS.tx_chars_per_frame
+reconnect_delay = SETTINGS.reconnect_delay
+reconnect_max_delay = SETTINGS.reconnect_max_delay
+busy_reply = SETTINGS.busy_reply
+msg_terminator = SETTINGS.msg_terminator
 
 logger = logging.getLogger(__name__)
 
 
+class Reconnector:
+    """Backoff between attempts to reach JS8Call, and a record of the outages.
+
+    The delay doubles after each failed attempt, from reconnect_delay up to
+    reconnect_max_delay, and is then shortened by a random amount of up to a half
+    so that several servers restarted together don't retry in step.
+    """
+
+    def __init__(
+        self, min_delay: float = reconnect_delay, max_delay: float = reconnect_max_delay, peer: str = "JS8Call"
+    ):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.peer = peer  # for logging
+        self.attempt = 0
+        self.connections = 0
+        self.downtime = 0.0  # seconds, not counting the wait for the first connection
+        self.down_since: Optional[float] = None
+
+    def link_down(self):
+        if self.down_since is None:
+            self.down_since = clock.now()
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.max_delay, self.min_delay * 2 ** self.attempt)
+        self.attempt += 1
+        return delay * random.uniform(0.5, 1.0)
+
+    def link_up(self):
+        self.connections += 1
+        if self.down_since is not None and self.connections > 1:
+            outage = clock.now() - self.down_since
+            self.downtime += outage
+            logger.info(
+                f"Reconnected to {self.peer} after {outage:.1f}s"
+                f" (reconnects {self.connections - 1}, total downtime {self.downtime:.1f}s)"
+            )
+        self.down_since = None
+
+    def stats(self) -> dict:
+        down_for = clock.now() - self.down_since if self.down_since is not None else 0.0
+        return {
+            'connected': self.down_since is None,
+            'reconnects': max(0, self.connections - 1),
+            'downtime_s': round(self.downtime + (down_for if self.connections else 0.0), 1),
+        }
+
+
 class Js8CallApi:
 
     my_station = ''
     my_grid = ''
+    refusal_explained = False
 
-    def __init__(self):
+    def __init__(self, addr: Optional[Tuple[str, int]] = None):
+        self.addr = addr if addr is not None else js8call_addr
         self.sock = socket(AF_INET, SOCK_STREAM)
+        self.decoder = JsonLineDecoder()
 
-    def connect(self):
-        logger.info('Connecting to JS8Call at ' + ':'.join(map(str, js8call_addr)))
+    def connect(self) -> bool:
+        logger.info('Connecting to JS8Call at ' + ':'.join(map(str, self.addr)))
+        # A socket can't be reused once a connection has failed or closed
+        self.sock.close()
+        self.sock = socket(AF_INET, SOCK_STREAM)
+        self.decoder.clear()
         try:
-            api = self.sock.connect(js8call_addr)
-            logger.info('Connected to JS8Call')
-            return api
-
-        except ConnectionRefusedError:
-            logger.error('Connection to JS8Call has been refused.')
-            logger.error('Check that:')
-            logger.error('* JS8Call is running')
-            logger.error(
-                '* JS8Call settings check boxes Enable TCP Server API and'
-                'Accept TCP Requests are checked'
-            )
-            logger.error(
-                '* The API server port number in JS8Call matches the setting in this script'
-                ' - default is 2442'
-            )
-            logger.error('* There are no firewall rules preventing the connection')
-            exit(1)
+            self.sock.connect(self.addr)
+        except OSError as e:
+            self.sock.close()
+            self.connection_failed(e)
+            return False
+
+        logger.info('Connected to JS8Call')
+        return True
+
+    def connection_failed(self, e: OSError):
+        if not isinstance(e, ConnectionRefusedError):
+            logger.warning(f"Unable to connect to JS8Call: {e}")
+        elif Js8CallApi.refusal_explained:
+            logger.warning('Connection to JS8Call has been refused.')
+        else:
+            # Only explain the likely causes once, not on every retry
+            Js8CallApi.refusal_explained = True
+            self.connection_refused()
+
+    @staticmethod
+    def connection_refused():
+        logger.error('Connection to JS8Call has been refused.')
+        logger.error('Check that:')
+        logger.error('* JS8Call is running')
+        logger.error(
+            '* JS8Call settings check boxes Enable TCP Server API and'
+            'Accept TCP Requests are checked'
+        )
+        logger.error(
+            '* The API server port number in JS8Call matches the setting in this script'
+            ' - default is 2442'
+        )
+        logger.error('* There are no firewall rules preventing the connection')
+        logger.error('The server will keep trying to connect')
 
     def listen(self):
         # the following block of code provides a socket recv with a 0.5-second timeout
@@ -56,18 +144,9 @@ class Js8CallApi:
             logger.debug('rx - ' + str(content))
 
             if content:
-                # remove the terminator
-                content = content.replace(bytes('♢', 'utf8'), bytes('', 'utf8'))
-                content = content.replace(bytes("  '}", 'utf8'), bytes("'}", 'utf8'))
-                # we have to tidy the content in case there are multiple responses in a single socket recv
-                content = content.replace(bytes('}\n{', 'utf8'), bytes('},{', 'utf8'))
-                content = bytes('[', 'utf8') + content
-                content += bytes(']', 'utf8')
-                content = content.replace(bytes('}\n]', 'utf8'), bytes('}]', 'utf8'))
-                try:
-                    messages = json.loads(content)
-                except ValueError:
-                    pass
+                # A recv can hold several messages and can end part way through one;
+                # the decoder keeps any partial message until the rest arrives.
+                messages = self.decoder.feed(content)
             else:
                 logger.info('Connection to JS8Call has closed')
                 messages.append({'type': 'DISCONNECT'})
@@ -80,10 +159,11 @@ class Js8CallApi:
             params = {}
         return json.dumps({'type': typ, 'value': value, 'params': params})
 
-    def send(self, *args, **kwargs):
+    def frame(self, *args, **kwargs) -> Optional[bytes]:
+        # Returns the bytes to send, or None if the message mustn't be sent
         params = kwargs.get('params', {})
         if '_ID' not in params:
-            params['_ID'] = '{}'.format(int(time.time() * 1000))
+            params['_ID'] = '{}'.format(int(clock.now() * 1000))
             kwargs['params'] = params
         message = self.to_message(*args, **kwargs)
 
@@ -92,10 +172,16 @@ class Js8CallApi:
         if len(args) > 1 and debug:
             logger.debug('MB message not sent as we are in debug mode')
             # this avoids hamlib errors in JS8Call if the radio isn't connected
-        else:
-            mb_msg = (message + '\n').encode()
-            logger.debug('tx - ' + str(mb_msg))
-            self.sock.send(mb_msg)   # newline suffix is required
+            return None
+
+        mb_msg = (message + '\n').encode()  # newline suffix is required
+        logger.debug('tx - ' + str(mb_msg))
+        return mb_msg
+
+    def send(self, *args, **kwargs):
+        mb_msg = self.frame(*args, **kwargs)
+        if mb_msg is not None:
+            self.sock.send(mb_msg)
 
     def close(self):
         self.sock.close()
@@ -108,14 +194,82 @@ class Js8CallDriver:
     rx_ind_timeout: float = 0.0
     rx_duration = 0.5
 
-    tx_release_time: float = 0.0
-
-    is_connected = False
-
-    def __init__(self):
-        self.js8call_api = Js8CallApi()
-        self.js8call_api.connect()
-        self.is_connected = True
+    is_connected = False  # True until the backend asks the driver to shut down
+    link_up = False  # True while connected to JS8Call
+    api_type = Js8CallApi  # how the driver talks to JS8Call
+
+    def __init__(
+        self, b2c_p0: OverflowQueue = b2c_q_p0, b2c_p1: FairQueue = b2c_q_p1, c2b: OverflowQueue = c2b_q,
+        addr: Optional[Tuple[str, int]] = None, radio: str = ''
+    ):
+        self.b2c_q_p0 = b2c_p0
+        self.b2c_q_p1 = b2c_p1
+        self.c2b_q = c2b
+        self.to_backend = self.deliver_to_backend  # how messages for the backend are delivered
+        self.radio = radio  # given to the backend with every message, when several radios share it
+        self.tx_scheduler = TxScheduler(tx_chars_per_frame, on_finish=self.on_tx_finished)
+        self.journal = TxJournal(journal_path(tx_journal, radio))
+        self.b2c_q_p1.on_queued = self.journal.queued
+        self.b2c_q_p1.on_collapsed = self.on_reply_collapsed
+        self.recovered_requests: list[UnifiedMessage] = []
+        self.reconnector = Reconnector()
+        self.js8call_api = self.api_type(addr)
+        self.is_connected = True  # the connection itself is made by run_comms()
+
+    def connect(self) -> bool:
+        # Keep trying until connected; returns False if told to shut down first
+        self.link_up = False
+        self.reconnector.link_down()
+        while self.is_connected:
+            if self.js8call_api.connect():
+                self.on_link_up()
+                return True
+            delay = self.reconnector.next_delay()
+            logger.info(f"Retrying the connection to JS8Call in {delay:.1f}s")
+            self.wait_for_shutdown(delay)
+        return False
+
+    def recover(self):
+        # Queue again what the journal says was left when the server last stopped.  The requests
+        # wait until the backend has been told the callsign, as it ignores everything before that.
+        self.recovered_requests, replies = self.journal.open()
+        for m in replies:
+            if not self.b2c_q_p1.put(m):
+                self.journal.dropped(m)
+
+    def resend_recovered_requests(self):
+        for m in self.recovered_requests:
+            source = m.get_param(MessageParameter.SOURCE)
+            m.params[_PARAM_KEYS[MessageParameter.TRACE]] = tracer.start(source, self.radio)
+            self.to_backend(m)
+        self.recovered_requests = []
+
+    def on_link_up(self):
+        self.link_up = True
+        self.reconnector.link_up()
+        # Whatever JS8Call was sending has gone with the old connection
+        self.tx_scheduler.reset()
+        self.request_station_info()
+
+    def wait_for_shutdown(self, timeout: float):
+        # While disconnected only a SHUTDOWN or NO_REPLY from the backend matters.  Other P0
+        # messages are dropped (the station info is requested again on reconnection); P1
+        # messages stay queued until the connection is back.
+        deadline = clock.now() + timeout
+        while self.is_connected:
+            remaining = deadline - clock.now()
+            if remaining <= 0:
+                return
+            try:
+                m: UnifiedMessage = self.b2c_q_p0.get(timeout=remaining)
+            except queue.Empty:
+                return
+            if m.get_typ() == MessageType.CONTROL and m.get_verb() in (MessageVerb.SHUTDOWN, MessageVerb.NO_REPLY):
+                self.process_control(m)
+            self.b2c_q_p0.task_done()
+
+    def link_stats(self) -> dict:
+        return self.reconnector.stats()
 
     def set_radio_frequency(self, freq: int):
         logger.debug('call: RIG.SET_FREQ')
@@ -124,14 +278,35 @@ class Js8CallDriver:
         pass
 
     def process_mb_msg(self, m: UnifiedMessage):
-        req_msg = f"{m.get_param(MessageParameter.DESTINATION)} {m.get_param(MessageParameter.MB_MSG)}"
-        self.tx_release_time = time.time() + 15  # Block further sends
-        self.js8call_api.send('TX.SEND_MESSAGE', req_msg)
+        mb_msg = m.get_param(MessageParameter.MB_MSG)
+        req_msg = f"{m.get_param(MessageParameter.DESTINATION)} {mb_msg}"
+        trace = m.get_param(MessageParameter.TRACE)
+        api_id = '{}'.format(int(clock.now() * 1000))
+        # Further P1 sends are held until this transmission has finished
+        self.tx_scheduler.on_send(
+            req_msg.split('\n')[0], mb_msg, trace=trace, entry=m.get_param(MessageParameter.JOURNAL)
+        )
+        self.js8call_api.send('TX.SEND_MESSAGE', req_msg, params={'_ID': api_id})
+        tracer.sent(trace, api_id)
+        if debug:
+            # Nothing is sent to JS8Call, so no PTT off will ever confirm the reply
+            self.journal.sent(m)
+
+    def on_tx_finished(self, tx: Transmission, now: float):
+        tracer.transmitted(tx, now)
+        self.journal.transmitted(tx)
+
+    def on_reply_collapsed(self, m: UnifiedMessage):
+        # The copy already waiting will be sent instead of this reply
+        tracer.collapsed(m.get_param(MessageParameter.TRACE))
+        self.journal.collapsed(m)
 
     def process_control(self, m: UnifiedMessage):
         if m.get_verb() == MessageVerb.SHUTDOWN:
             self.is_connected = False
             return
+        elif m.get_verb() == MessageVerb.NO_REPLY:
+            self.journal.no_reply(m)
         elif m.get_verb() == MessageVerb.SET_FREQ:
             self.set_radio_frequency(m.get_param(MessageParameter.FREQUENCY))
         elif m.get_verb() == MessageVerb.GET_FREQ:
@@ -160,158 +335,392 @@ class Js8CallDriver:
         #     return
 
         try:
-            comms_tx: UnifiedMessage = b2c_q_p0.get(timeout=timeout)
+            comms_tx: UnifiedMessage = self.b2c_q_p0.get(timeout=timeout)
             logger.debug(f"Received from BACKEND: {comms_tx.get_params()}")
             self.process_comms_tx(comms_tx)
             add_progress_m(comms_tx)
-            b2c_q_p0.task_done()
+            self.b2c_q_p0.task_done()
         except queue.Empty:
-            if time.time() > self.tx_release_time:
+            if self.tx_scheduler.can_release():
                 # We are free to send another priority 1 message.
                 try:
-                    comms_tx: UnifiedMessage = b2c_q_p1.get(timeout=timeout)
+                    comms_tx: UnifiedMessage = self.b2c_q_p1.get(timeout=timeout)
                     logger.debug(f"Received from BACKEND: {comms_tx.get_params()}")
-                    self.process_comms_tx(comms_tx)
+                    try:
+                        self.process_comms_tx(comms_tx)
+                    except OSError:
+                        self.b2c_q_p1.put_back(comms_tx)  # send it first once we have reconnected
+                        raise
                     add_progress_m(comms_tx)
-                    b2c_q_p1.task_done()
+                    self.b2c_q_p1.task_done()
                 except queue.Empty:
                     return
         return
 
-    @staticmethod
-    def signal_backend(verb: MessageVerb, param):
+    def backend_params(self, params: dict) -> dict:
+        # Tell the backend which radio the message is from
+        if self.radio:
+            return {**params, MessageParameter.RADIO: self.radio}
+        return params
+
+    def deliver_to_backend(self, m: UnifiedMessage) -> bool:
+        # Never waits for the backend: if it has fallen behind, old signals are dropped and
+        # requests are refused (see message_q.QueueOverflow)
+        request = m.get_verb() == MessageVerb.INFORM
+        if request:
+            self.journal.accepted(m)  # before the backend can answer it
+        if self.c2b_q.put_nowait(m):
+            return True
+        if request:
+            self.journal.no_reply(m)
+        if m.get_typ() == MessageType.MB_MSG:
+            tracer.discard(m.get_param(MessageParameter.TRACE))
+            self.refuse_request(m)
+        return False
+
+    def refuse_request(self, m: UnifiedMessage):
+        # Tell the station the server is busy rather than leave it waiting for a reply
+        source = m.get_param(MessageParameter.SOURCE)
+        logger.warning(f"The backend queue is full; refusing a message from {source}")
+        if not busy_reply or m.get_verb() != MessageVerb.INFORM:
+            return
+
+        mb_req = m.get_param(MessageParameter.MB_MSG).replace(msg_terminator, '').strip()
+        cmd = parse_request(mb_req).get('cmd')
+        if not cmd:
+            return
+        self.b2c_q_p1.put(UnifiedMessage.internal(
+            priority=1,
+            target=MessageTarget.COMMS,
+            typ=MessageType.MB_MSG,
+            verb=MessageVerb.SEND,
+            params={
+                MessageParameter.DESTINATION: source,
+                MessageParameter.MB_MSG: f"-{cmd}\nBUSY"
+            }
+        ))
+
+    def signal_backend(self, verb: MessageVerb, param):
         # These are the signal verbs we can send to the FRONTEND:
         #   NOTE_FREQ, NOTE_OFFSET, NOTE_CALLSIGN, NOTE_RX, NOTE_PTT
-        m = UnifiedMessage.create(
+        m = UnifiedMessage.internal(
             priority=0,
-            target="BACKEND",
-            typ="SIGNAL",
+            target=MessageTarget.BACKEND,
+            typ=MessageType.SIGNAL,
             verb=verb,
-            params=param
+            params=self.backend_params(param)
         )
-        c2b_q.put(m)
+        self.to_backend(m)
 
-    @staticmethod
-    def inform_backend(source: str, frequency: int, destination: str, mb_message: str):
+    def inform_backend(self, source: str, frequency: int, destination: str, mb_message: str):
         # This is where we send an inbound microblog message to the backend
-        m = UnifiedMessage.create(
+        m = UnifiedMessage.internal(
             priority=1,
-            target="BACKEND",
-            typ="MB_MSG",
-            verb="INFORM",
-            params={
-                "source": source,
-                "destination": destination,
-                "mb_msg": mb_message,
-                "frequency": frequency
-            }
+            target=MessageTarget.BACKEND,
+            typ=MessageType.MB_MSG,
+            verb=MessageVerb.INFORM,
+            params=self.backend_params({
+                MessageParameter.SOURCE: source,
+                MessageParameter.DESTINATION: destination,
+                MessageParameter.MB_MSG: mb_message,
+                MessageParameter.FREQUENCY: frequency,
+                MessageParameter.TRACE: tracer.start(source, self.radio)
+            })
         )
-        c2b_q.put(m)
+        self.to_backend(m)
         add_progress_m(m)
 
-    @staticmethod
-    def announce_to_backend(source: str, frequency: int, destination: str, mb_message: str):
+    def announce_to_backend(self, source: str, frequency: int, destination: str, mb_message: str):
         # This is where we send an inbound microblog message to the backend
-        m = UnifiedMessage.create(
+        m = UnifiedMessage.internal(
             priority=1,
-            target="BACKEND",
-            typ="MB_MSG",
-            verb="ANNOUNCE",
-            params={
-                "source": source,
-                "destination": destination,
-                "mb_msg": mb_message,
-                "frequency": frequency
-            }
+            target=MessageTarget.BACKEND,
+            typ=MessageType.MB_MSG,
+            verb=MessageVerb.ANNOUNCE,
+            params=self.backend_params({
+                MessageParameter.SOURCE: source,
+                MessageParameter.DESTINATION: destination,
+                MessageParameter.MB_MSG: mb_message,
+                MessageParameter.FREQUENCY: frequency
+            })
         )
-        c2b_q.put(m)
+        self.to_backend(m)
         add_progress_m(m)
 
-    def run_comms(self):
+    def request_station_info(self):
+        logger.debug('Send STATION.GET_CALLSIGN')
+        self.js8call_api.send('STATION.GET_CALLSIGN', '')
 
-        if self.is_connected:
-            logger.debug('Send STATION.GET_CALLSIGN')
-            self.js8call_api.send('STATION.GET_CALLSIGN', '')
+        logger.debug('Send RIG.GET_FREQ')
+        self.js8call_api.send('RIG.GET_FREQ', '')
 
-            logger.debug('Send RIG.GET_FREQ')
-            self.js8call_api.send('RIG.GET_FREQ', '')
+        logger.debug('Send MODE.GET_SPEED')
+        self.js8call_api.send('MODE.GET_SPEED', '')
+
+    def check_rx_indicator(self):
+        if 0 < self.rx_ind_timeout < clock.now():
+            self.signal_backend(MessageVerb.NOTE_RX, param={MessageParameter.RX: False})
+            self.rx_ind_timeout = 0
+
+    def handle_js8call_message(self, message: dict):
+        js8call_msg_type = message.get('type', '')
+        value = message.get('value', '')
+        params = message.get('params', {})
+
+        if self.rx_ind_timeout == 0:
+            self.signal_backend(MessageVerb.NOTE_RX, param={MessageParameter.RX: True})
+        self.rx_ind_timeout = clock.now() + self.rx_duration
+
+        if not js8call_msg_type:
+            return
+
+        elif js8call_msg_type == 'DISCONNECT':
+            # The comms loop reconnects; the backend carries on and replies stay queued
+            self.link_up = False
+            return
+
+        elif js8call_msg_type == 'RIG.PTT':
+            ptt_state = value == 'on'
+            self.tx_scheduler.on_ptt(ptt_state)
+
+            self.signal_backend(MessageVerb.NOTE_PTT, {MessageParameter.PTT: ptt_state})
+
+        elif js8call_msg_type == 'STATION.CALLSIGN':
+            self.signal_backend(MessageVerb.NOTE_CALLSIGN, {MessageParameter.CALLSIGN: value})
+            self.resend_recovered_requests()
+
+        elif js8call_msg_type == 'MODE.SPEED':
+            self.tx_scheduler.set_speed(int(params['SPEED']))
+
+        elif js8call_msg_type == 'RIG.FREQ' or js8call_msg_type == 'STATION.STATUS':
+            if 'SPEED' in params:
+                self.tx_scheduler.set_speed(int(params['SPEED']))
+
+            dial = int(params['DIAL'])
+            offset = int(params['OFFSET'])
+
+            self.signal_backend(MessageVerb.NOTE_FREQ, {MessageParameter.FREQUENCY: dial})
+            logger.debug('q_put: NOTE_FREQ - ' + str(dial))
+
+            self.signal_backend(MessageVerb.NOTE_OFFSET, {MessageParameter.OFFSET: offset})
+            logger.debug('q_put: NOTE_OFFSET - ' + str(offset))
+
+        elif js8call_msg_type == 'RX.DIRECTED':
+            logger.debug(f"RX.DIRECTED {value}")
+            # We need to extract the source and destination
+            msg_elements = re.findall(r"^\S+: +\S+ +([\S\s]+)", value)
+            mb_message = msg_elements[0]
+
+            if str(params['TO']) == "@MB":
+                self.announce_to_backend(
+                    str(params['FROM']),
+                    int(params['DIAL']),
+                    str(params['TO']),
+                    mb_message
+                )
+
+            else:
+                self.inform_backend(
+                    str(params['FROM']),
+                    int(params['DIAL']),
+                    str(params['TO']),
+                    mb_message
+                )
+
+            logger.debug('q_put: INFORM - ' + mb_message)
+
+    def run_comms(self):
+        self.recover()
 
         try:
             while self.is_connected:
-                # process messages from the backend
-                self.process_tx_q()
+                if not self.link_up and not self.connect():
+                    break
+
+                try:
+                    # process messages from the backend
+                    self.process_tx_q()
 
-                # process messages from Js8Call
-                messages = self.js8call_api.listen()
+                    # process messages from Js8Call
+                    messages = self.js8call_api.listen()
+                except OSError as e:
+                    logger.error(f"Lost the connection to JS8Call: {e}")
+                    messages = [{'type': 'DISCONNECT'}]
 
-                if 0 < self.rx_ind_timeout < time.time():
-                    self.signal_backend(MessageVerb.NOTE_RX, param={MessageParameter.RX: False})
-                    self.rx_ind_timeout = 0
+                self.check_rx_indicator()
 
                 for message in messages:
-                    js8call_msg_type = message.get('type', '')
-                    value = message.get('value', '')
-                    params = message.get('params', {})
-
-                    if self.rx_ind_timeout == 0:
-                        self.signal_backend(MessageVerb.NOTE_RX, param={MessageParameter.RX: True})
-                    self.rx_ind_timeout = time.time() + self.rx_duration
-
-                    if not js8call_msg_type:
-                        continue
-
-                    elif js8call_msg_type == 'DISCONNECT':
-                        self.is_connected = False
-                        self.signal_backend(MessageVerb.NOTE_DISCONNECT, {})
-                        continue
-
-                    elif js8call_msg_type == 'RIG.PTT':
-                        if value == 'on':
-                            ptt_state = True
-                            self.tx_release_time = time.time() + 15  # We need to wait for the last send to complete
-
-                        else:
-                            ptt_state = False
-                            self.tx_release_time = time.time() + 5  # We need to wait in case there are more frames
-
-                        self.signal_backend(MessageVerb.NOTE_PTT, {MessageParameter.PTT: ptt_state})
-
-                    elif js8call_msg_type == 'STATION.CALLSIGN':
-                        self.signal_backend(MessageVerb.NOTE_CALLSIGN, {'callsign': value})
-
-                    elif js8call_msg_type == 'RIG.FREQ' or js8call_msg_type == 'STATION.STATUS':
-                        dial = int(params['DIAL'])
-                        offset = int(params['OFFSET'])
-
-                        self.signal_backend(MessageVerb.NOTE_FREQ, {'frequency': dial})
-                        logger.debug('q_put: NOTE_FREQ - ' + str(dial))
-
-                        self.signal_backend(MessageVerb.NOTE_OFFSET, {'offset': offset})
-                        logger.debug('q_put: NOTE_OFFSET - ' + str(offset))
-
-                    elif js8call_msg_type == 'RX.DIRECTED':
-                        logger.debug(f"RX.DIRECTED {value}")
-                        # We need to extract the source and destination
-                        msg_elements = re.findall(r"^\S+: +\S+ +([\S\s]+)", value)
-                        mb_message = msg_elements[0]
-
-                        if str(params['TO']) == "@MB":
-                            self.announce_to_backend(
-                                str(params['FROM']),
-                                int(params['DIAL']),
-                                str(params['TO']),
-                                mb_message
-                            )
-
-                        else:
-                            self.inform_backend(
-                                str(params['FROM']),
-                                int(params['DIAL']),
-                                str(params['TO']),
-                                mb_message
-                            )
-
-                        logger.debug('q_put: INFORM - ' + mb_message)
+                    self.handle_js8call_message(message)
 
         finally:
             self.js8call_api.close()
+            self.journal.close()
+
+
+class AsyncJs8CallApi(Js8CallApi):
+    """The JS8Call API over an asyncio stream, for the asyncio mode.
+
+    listen() waits for data rather than polling, and send() queues the bytes on
+    the stream without blocking.
+    """
+
+    def __init__(self, addr: Optional[Tuple[str, int]] = None):
+        self.addr = addr if addr is not None else js8call_addr
+        self.decoder = JsonLineDecoder()
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> bool:
+        logger.info('Connecting to JS8Call at ' + ':'.join(map(str, self.addr)))
+        self.close()
+        self.decoder.clear()
+        try:
+            self.reader, self.writer = await asyncio.open_connection(*self.addr)
+        except OSError as e:
+            self.connection_failed(e)
+            return False
+
+        logger.info('Connected to JS8Call')
+        return True
+
+    async def listen(self):
+        content = await self.reader.read(65500)
+        logger.debug('rx - ' + str(content))
+
+        if not content:
+            logger.info('Connection to JS8Call has closed')
+            return [{'type': 'DISCONNECT'}]
+
+        return self.decoder.feed(content)
+
+    def send(self, *args, **kwargs):
+        mb_msg = self.frame(*args, **kwargs)
+        if mb_msg is not None:
+            self.writer.write(mb_msg)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class AsyncJs8CallDriver(Js8CallDriver):
+    """Js8CallDriver for the asyncio mode.
+
+    The queues to and from the backend are asyncio.Queues, apart from the P1
+    queue, which is a FairQueue as in the threaded driver.  run_rx() and run_tx()
+    are separate tasks that only wake when JS8Call sends something, the backend
+    queues something, the PTT changes, a held P1 message can be released or the
+    RX indicator is due to go off.
+    """
+
+    api_type = AsyncJs8CallApi
+
+    def __init__(
+        self, b2c_p0: AsyncOverflowQueue, b2c_p1: FairQueue, c2b: AsyncOverflowQueue,
+        addr: Optional[Tuple[str, int]] = None, radio: str = ''
+    ):
+        super().__init__(b2c_p0, b2c_p1, c2b, addr, radio)
+        self.tx_wakeup = asyncio.Event()  # set whenever the backend queues a message
+
+        # handle_js8call_message() is shared with the threaded driver and can't await,
+        # so messages for the backend are collected and then put on c2b_q.
+        self.backend_outbox: list[UnifiedMessage] = []
+        self.to_backend = self.backend_outbox.append
+
+    async def connect(self):
+        # Keep trying until connected
+        self.link_up = False
+        self.reconnector.link_down()
+        while not await self.js8call_api.connect():
+            delay = self.reconnector.next_delay()
+            logger.info(f"Retrying the connection to JS8Call in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        self.on_link_up()
+        self.tx_wakeup.set()
+
+    async def queue_tx(self, m: UnifiedMessage):
+        # Called by the backend
+        if m.priority == 0:
+            await self.b2c_q_p0.put(m)
+        elif m.priority == 1:
+            self.b2c_q_p1.put(m)  # never blocks; a station over its limit loses the message
+        else:
+            return  # If it's not P0 or P1, ignore it.
+        self.tx_wakeup.set()
+
+    def next_tx_message(self) -> Optional[UnifiedMessage]:
+        if not self.b2c_q_p0.empty():
+            return self.b2c_q_p0.get_nowait()
+        if not self.b2c_q_p1.empty() and self.tx_scheduler.can_release():
+            # We are free to send another priority 1 message.
+            return self.b2c_q_p1.get_nowait()
+        return None
+
+    async def run_tx(self):
+        while self.is_connected:
+            if not self.link_up:
+                # Replies stay queued until run_rx() has reconnected
+                self.tx_wakeup.clear()
+                await self.tx_wakeup.wait()
+                continue
+
+            comms_tx = self.next_tx_message()
+
+            if comms_tx is None:
+                # Sleep until the backend queues something, the PTT changes or a held P1 message can go
+                timeout = None
+                if not self.b2c_q_p1.empty():
+                    timeout = max(0.0, self.tx_scheduler.release_time() - clock.now())
+                self.tx_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.tx_wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.debug(f"Received from BACKEND: {comms_tx.get_params()}")
+            try:
+                self.process_comms_tx(comms_tx)
+                await self.js8call_api.drain()
+            except OSError as e:
+                logger.error(f"Lost the connection to JS8Call: {e}")
+                if comms_tx.priority == 1:
+                    self.b2c_q_p1.put_back(comms_tx)  # send it first once we have reconnected
+                self.link_up = False
+                continue
+            add_progress_m(comms_tx)
+
+    async def run_rx(self):
+        self.recover()
+        while self.is_connected:
+            if not self.link_up:
+                await self.connect()
+
+            # Only wake without data when the RX indicator needs turning off
+            timeout = None
+            if self.rx_ind_timeout > 0:
+                timeout = max(0.0, self.rx_ind_timeout - clock.now())
+
+            try:
+                messages = await asyncio.wait_for(self.js8call_api.listen(), timeout)
+            except asyncio.TimeoutError:
+                messages = []
+            except OSError as e:
+                logger.error(f"Lost the connection to JS8Call: {e}")
+                messages = [{'type': 'DISCONNECT'}]
+
+            self.check_rx_indicator()
+
+            for message in messages:
+                self.handle_js8call_message(message)
+                if message.get('type') == 'RIG.PTT':
+                    self.tx_wakeup.set()  # a held message may now be free to go
+
+            for m in self.backend_outbox:
+                if not self.deliver_to_backend(m) and m.get_typ() == MessageType.MB_MSG:
+                    self.tx_wakeup.set()  # there may be a BUSY reply to send
+            self.backend_outbox.clear()
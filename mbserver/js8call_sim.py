@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+# A stand-in for JS8Call and a radio, for load and latency testing without either.
+#
+# The simulator listens on the JS8Call TCP API port and speaks enough of the API for the
+# server: it answers STATION.GET_CALLSIGN, RIG.GET_FREQ and MODE.GET_SPEED, sends
+# RX.DIRECTED requests from a set of virtual stations, and "transmits" each TX.SEND_MESSAGE
+# with RIG.PTT on/off events timed from the message length and the speed mode.
+#
+#   python -m mbserver.js8call_sim --port 2442 --stations 20 --interval 10 --duration 600
+#   python mbserver.py --tcp-port 2442
+#
+# For every request it records how long the server took to hand over the first reply and
+# to finish transmitting it, and it totals the simulated airtime.
+
+import sys
+import json
+import math
+import random
+import asyncio
+import logging
+import argparse
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from . import clock
+from .config import SETTINGS
+from .latency_trace import percentile
+from .logging_setup import configure_logging
+from .tx_scheduler import FRAME_SECONDS, DEFAULT_SPEED, TX_DUTY
+
+logger = logging.getLogger(__name__)
+
+# The requests sent by --stations traffic, and how often each is chosen
+REQUEST_MIX = [
+    ("E~", 4),
+    ("I~", 1),
+    ("G{id}~", 4),
+    ("E{id}~", 2),
+    ("E{ids}~", 1),
+    ("E7D~", 1),
+]
+
+
+@dataclass
+class SimRequest:
+    station: str
+    cmd: str
+    sent: float  # when the RX.DIRECTED was sent to the server
+    first_reply: Optional[float] = None  # latency to the first TX.SEND_MESSAGE that answers it
+    first_reply_done: Optional[float] = None  # latency to the end of that transmission (PTT off)
+
+    def record(self) -> dict:
+        return asdict(self)
+
+
+def answers(cmd: str, text: str) -> bool:
+    # Whether a reply, e.g. "G4AAA +E12~\n12 - 2026-01-27 - ...", could be an answer to cmd
+    header = text.split("\n", 1)[0].split(" ", 1)[-1][1:]
+    if header == cmd:
+        return True
+    if not (cmd.startswith("E") and header.startswith("E") and header[1:-1].isdigit()):
+        return False
+    # A listing of the posts asked for by ID, or of any posts for E~, a date or a number of days
+    ids = cmd[1:-1]
+    if ids.replace(",", "").isdigit():
+        return header[1:-1] in ids.split(",")
+    return True
+
+
+def load_script(path: str) -> List[Tuple[float, str, str]]:
+    # One request per line: <seconds from the start> <station> <request>, e.g. "12.5 G4AAA E~".
+    # Blank lines and lines starting with # are ignored.
+    script = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            at, station, cmd = line.split(None, 2)
+            script.append((float(at), station, cmd))
+    return sorted(script)
+
+
+class Js8CallSimulator:
+    """Simulated JS8Call station for one or more connections from the server.
+
+    Each reply is matched to the oldest unanswered request from its station that it
+    could answer, so a request's latency runs from its RX.DIRECTED to its first reply.
+    A request with no reply after give_up seconds is left unanswered.
+    Transmissions are made one at a time, each starting on a frame boundary as
+    JS8Call does.
+    """
+
+    def __init__(
+        self, callsign: str, dial: int, offset: int, speed: int, chars_per_frame: float,
+        stations: int, interval: float, max_post_id: int,
+        script: Optional[List[Tuple[float, str, str]]] = None, seed: Optional[int] = None,
+        give_up: float = 3600.0
+    ):
+        self.callsign = callsign
+        self.dial = dial
+        self.offset = offset
+        self.speed = speed
+        self.chars_per_frame = chars_per_frame
+        self.stations = [f"SIM{n:02d}" for n in range(1, stations + 1)]
+        self.interval = interval
+        self.max_post_id = max_post_id
+        self.script = script
+        self.random = random.Random(seed)
+        self.give_up = give_up  # seconds after which a station stops waiting for a reply
+
+        self.started = clock.now()
+        self.open_requests: Dict[str, List[SimRequest]] = {}
+        self.requests: List[SimRequest] = []
+        self.announcements = 0
+        self.unmatched_replies = 0
+        self.transmissions = 0
+        self.airtime = 0.0  # seconds with the PTT on
+
+    @property
+    def frame_seconds(self) -> float:
+        return FRAME_SECONDS.get(self.speed, FRAME_SECONDS[DEFAULT_SPEED])
+
+    @staticmethod
+    def line(typ: str, value: str = "", params: Optional[dict] = None) -> bytes:
+        return (json.dumps({"type": typ, "value": value, "params": params or {}}) + "\n").encode()
+
+    def random_request(self) -> str:
+        cmds, weights = zip(*REQUEST_MIX)
+        cmd = self.random.choices(cmds, weights)[0]
+        ids = sorted(self.random.sample(range(1, self.max_post_id + 1), min(3, self.max_post_id)))
+        return cmd.format(id=ids[0], ids=",".join(map(str, ids)))
+
+    def rx_directed(self, station: str, cmd: str) -> dict:
+        # A request from station, recorded so its reply can be timed
+        request = SimRequest(station, cmd, clock.now())
+        self.requests.append(request)
+        self.open_requests.setdefault(station, []).append(request)
+        logger.info(f"RX.DIRECTED {station}: {self.callsign} {cmd}")
+        return {"type": "RX.DIRECTED", "value": f"{station}: {self.callsign} {cmd} ♢", "params": {
+            "FROM": station, "TO": self.callsign, "DIAL": self.dial, "OFFSET": self.offset,
+            "SNR": self.random.randint(-20, 5), "UTC": int(clock.now() * 1000),
+        }}
+
+    def send_request(self, writer: asyncio.StreamWriter, station: str, cmd: str):
+        message = self.rx_directed(station, cmd)
+        writer.write(self.line(message["type"], message["value"], message["params"]))
+
+    def frames(self, text: str) -> int:
+        return 1 + math.ceil(len(text) / self.chars_per_frame)
+
+    def note_sent(self, requests: List[SimRequest], airtime: float):
+        self.transmissions += 1
+        self.airtime += airtime
+        for request in requests:
+            request.first_reply_done = clock.now() - request.sent
+            logger.info(f"Reply to {request.station} {request.cmd} sent after {request.first_reply_done:.1f}s")
+
+    async def run_traffic(self, writer: asyncio.StreamWriter):
+        start = clock.now()
+        if self.script is not None:
+            for at, station, cmd in self.script:
+                await asyncio.sleep(max(0.0, start + at - clock.now()))
+                self.send_request(writer, station, cmd)
+            return
+
+        if not self.stations:
+            return
+        while True:
+            # Requests arrive at random, interval seconds apart on average
+            await asyncio.sleep(self.random.expovariate(1 / self.interval))
+            self.send_request(writer, self.random.choice(self.stations), self.random_request())
+
+    def match_reply(self, text: str) -> List[SimRequest]:
+        # The requests a reply answers: the oldest open one it fits, and any repeats of that
+        # request still open, which the server will have ignored as duplicates
+        destination = text.split(" ", 1)[0]
+        if destination == "@MB":
+            self.announcements += 1
+            return []
+
+        now = clock.now()
+        waiting = [r for r in self.open_requests.get(destination, []) if now - r.sent < self.give_up]
+        self.open_requests[destination] = waiting
+        request = next((r for r in waiting if answers(r.cmd, text)), None)
+        if request is None:
+            self.unmatched_replies += 1  # e.g. the second message of a long listing
+            return []
+
+        answered = [r for r in waiting if r.cmd == request.cmd]
+        for r in answered:
+            waiting.remove(r)
+            r.first_reply = now - r.sent
+        return answered
+
+    async def transmit(self, writer: asyncio.StreamWriter, tx_q: asyncio.Queue):
+        # JS8Call sends one message at a time, starting each frame on a cycle boundary
+        while True:
+            text, requests = await tx_q.get()
+            await asyncio.sleep(self.frame_seconds - clock.now() % self.frame_seconds)
+            airtime = 0.0
+            for _ in range(self.frames(text)):
+                cycle_start = clock.now()
+                writer.write(self.line("RIG.PTT", "on", {"PTT": True}))
+                await asyncio.sleep(self.frame_seconds * TX_DUTY)
+                writer.write(self.line("RIG.PTT", "off", {"PTT": False}))
+                airtime += clock.now() - cycle_start
+                await asyncio.sleep(max(0.0, cycle_start + self.frame_seconds - clock.now()))
+            self.note_sent(requests, airtime)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        logger.info(f"Server connected from {writer.get_extra_info('peername')}")
+        tx_q: asyncio.Queue = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(self.run_traffic(writer)),
+            asyncio.create_task(self.transmit(writer, tx_q)),
+        ]
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring a message that isn't valid JSON: {line[:200]!r}")
+                    continue
+
+                typ = message.get("type", "")
+                value = message.get("value", "")
+                params = message.get("params", {})
+                reply_params = {"_ID": params["_ID"]} if "_ID" in params else {}
+
+                if typ == "STATION.GET_CALLSIGN":
+                    writer.write(self.line("STATION.CALLSIGN", self.callsign, reply_params))
+                elif typ == "RIG.GET_FREQ":
+                    writer.write(self.line("RIG.FREQ", "", {
+                        **reply_params, "DIAL": self.dial, "FREQ": self.dial + self.offset, "OFFSET": self.offset
+                    }))
+                elif typ == "RIG.SET_FREQ":
+                    self.dial = int(params.get("DIAL", self.dial))
+                elif typ == "MODE.GET_SPEED":
+                    writer.write(self.line("MODE.SPEED", "", {**reply_params, "SPEED": self.speed}))
+                elif typ == "TX.SEND_MESSAGE":
+                    tx_q.put_nowait((value, self.match_reply(value)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            logger.info("Server disconnected")
+
+    def report(self) -> dict:
+        answered = [r for r in self.requests if r.first_reply is not None]
+        completed = [r.first_reply_done for r in self.requests if r.first_reply_done is not None]
+        first_reply = [r.first_reply for r in answered]
+        elapsed = clock.now() - self.started
+
+        def summary(values: List[float]) -> dict:
+            return {
+                'p50': round(percentile(values, 50), 2) if values else None,
+                'p90': round(percentile(values, 90), 2) if values else None,
+                'max': round(max(values), 2) if values else None,
+            }
+
+        return {
+            'elapsed_s': round(elapsed, 1),
+            'requests': len(self.requests),
+            'answered': len(answered),
+            'unanswered': len(self.requests) - len(answered),
+            'announcements': self.announcements,
+            'unmatched_replies': self.unmatched_replies,
+            'first_reply_s': summary(first_reply),
+            'first_reply_sent_s': summary(completed),
+            'transmissions': self.transmissions,
+            'airtime_s': round(self.airtime, 1),
+            'airtime_pct': round(100 * self.airtime / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+async def serve(sim: Js8CallSimulator, host: str, port: int, duration: float):
+    server = await asyncio.start_server(sim.handle, host, port)
+    logger.info(f"Simulating JS8Call as {sim.callsign} on {host}:{port}")
+    async with server:
+        if duration > 0:
+            await asyncio.sleep(duration)
+        else:
+            await server.serve_forever()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m mbserver.js8call_sim",
+                                     description="Simulate JS8Call and a radio, for testing the server.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Defaults to 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=SETTINGS.server[1],
+                        help="Port to listen on. Defaults to config.ini [server] port.")
+    parser.add_argument("--callsign", default="M0SIM", help="Callsign of the simulated station.")
+    parser.add_argument("--dial", type=int, default=7078000, help="Dial frequency in Hz.")
+    parser.add_argument("--offset", type=int, default=1500, help="Offset in Hz.")
+    parser.add_argument("--speed", type=int, default=DEFAULT_SPEED, choices=sorted(FRAME_SECONDS),
+                        help="JS8Call speed mode: 0 Normal, 1 Fast, 2 Turbo, 4 Slow, 8 Ultra.")
+    parser.add_argument("--chars-per-frame", dest="chars_per_frame", type=float, default=16.0,
+                        help="Message characters sent in each simulated frame.")
+    parser.add_argument("--stations", type=int, default=10, help="Number of virtual stations sending requests.")
+    parser.add_argument("--interval", type=float, default=30.0,
+                        help="Average seconds between requests, across all stations.")
+    parser.add_argument("--max-post-id", dest="max_post_id", type=int, default=10,
+                        help="Random requests ask for post IDs from 1 up to this.")
+    parser.add_argument("--script", default=None,
+                        help="File of requests to send instead of random ones; each line is "
+                             "<seconds from connection> <station> <request>.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed, for repeatable traffic.")
+    parser.add_argument("--duration", type=float, default=0,
+                        help="Seconds to run before reporting and stopping. 0 runs until interrupted.")
+    parser.add_argument("--give-up", dest="give_up", type=float, default=3600.0,
+                        help="Seconds a station waits for a reply before the request counts as unanswered.")
+    parser.add_argument("--record", default=None,
+                        help="Write each request and its latencies to this file as JSON lines.")
+    args = parser.parse_args(sys.argv[1:])
+
+    configure_logging(level=logging.INFO, console=True)
+
+    sim = Js8CallSimulator(
+        args.callsign, args.dial, args.offset, args.speed, args.chars_per_frame,
+        args.stations, args.interval, args.max_post_id,
+        script=load_script(args.script) if args.script else None, seed=args.seed, give_up=args.give_up
+    )
+    try:
+        asyncio.run(serve(sim, args.host, args.port, args.duration))
+    except KeyboardInterrupt:
+        pass
+
+    if args.record:
+        with open(args.record, "w") as f:
+            for request in sim.requests:
+                f.write(json.dumps(request.record()) + "\n")
+    print(json.dumps(sim.report(), indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
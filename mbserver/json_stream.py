@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# JS8Call appends this to the text of some messages; it isn't part of the JSON
+_TERMINATOR = "♢".encode("utf-8")
+
+MAX_LINE_BYTES = 1 << 20  # a line longer than this is garbage, not a message still arriving
+
+
+class JsonLineDecoder:
+    """Incremental decoder for the newline-delimited JSON sent by the JS8Call API.
+
+    feed() takes whatever a socket recv returned, which may hold several messages,
+    part of one, or both.  Complete lines are decoded and returned straight away;
+    a trailing partial line stays in the buffer until the rest of it arrives.
+    Only the new bytes are searched for line ends, so a message split over many
+    recvs is never rescanned, and the complete lines are decoded together.
+
+    A line that isn't valid JSON is logged and skipped; the lines around it are
+    still delivered.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scanned = 0  # bytes at the start of buffer already known not to contain a newline
+
+    def feed(self, data: bytes) -> List[dict]:
+        self.buffer += data
+
+        # Only the bytes not yet searched can hold the end of the last complete line
+        end = self.buffer.rfind(b"\n", self.scanned)
+        if end < 0:
+            self.scanned = len(self.buffer)
+            if self.scanned > MAX_LINE_BYTES:
+                logger.error(f"Discarding {self.scanned} bytes from JS8Call with no line end")
+                self.clear()
+            return []
+
+        complete = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+        self.scanned = len(self.buffer)
+
+        complete = complete.replace(_TERMINATOR, b"").replace(b"  '}", b"'}")
+        lines = [line for line in complete.split(b"\n") if line.strip()]
+        if not lines:
+            return []
+
+        # Decoding every complete line in one call is much quicker than one call per line.
+        # JSON strings can't hold a raw newline, so each line is a whole message.
+        try:
+            messages = json.loads(b"[" + b",".join(lines) + b"]")
+        except ValueError:
+            # At least one line is bad, so decode them one at a time and skip the bad ones
+            messages = [message for message in map(self._decode, lines) if message is not None]
+
+        return [message for message in messages if self._is_message(message)]
+
+    @staticmethod
+    def _decode(line: bytes):
+        try:
+            return json.loads(line)
+        except ValueError:
+            logger.warning(f"Ignoring a message from JS8Call that isn't valid JSON: {line[:200]!r}")
+            return None
+
+    @staticmethod
+    def _is_message(message) -> bool:
+        if isinstance(message, dict):
+            return True
+        logger.warning(f"Ignoring a message from JS8Call that isn't a JSON object: {message!r:.200}")
+        return False
+
+    def pending(self) -> int:
+        # Bytes held waiting for the rest of a line
+        return len(self.buffer)
+
+    def clear(self) -> None:
+        self.buffer.clear()
+        self.scanned = 0
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import os
+import json
+import math
+import logging
+import itertools
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, TextIO
+
+from . import clock
+from .config import SETTINGS
+from .tx_scheduler import Transmission
+
+logger = logging.getLogger(__name__)
+
+trace_file = SETTINGS.trace_file
+
+# The spans of each request, in the order they happen
+SPANS = ('backend_queue', 'parse', 'lookup', 'tx_queue', 'key_up', 'airtime', 'total')
+TRACE_WINDOW = 1000  # the most recent completed requests, summarised for each span
+TRACE_EXPIRY = 3600  # seconds; a request whose replies haven't all gone by then is given up
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(pct / 100 * len(ordered))) - 1)]
+
+
+@dataclass
+class Trace:
+    trace_id: int
+    station: str
+    radio: str
+    rx_at: float
+    cmd: str = ""
+    replies: int = 0  # still to be transmitted
+    queued_at: Optional[float] = None
+    first_sent_at: Optional[float] = None
+    js8call_ids: List[str] = field(default_factory=list)  # the _ID sent with each reply
+    spans: Dict[str, float] = field(default_factory=dict)  # seconds
+
+    def add(self, span: str, seconds: float):
+        self.spans[span] = self.spans.get(span, 0.0) + seconds
+
+    def record(self) -> dict:
+        return {
+            'trace': self.trace_id,
+            'station': self.station,
+            'radio': self.radio,
+            'cmd': self.cmd,
+            'rx_at': round(self.rx_at, 3),
+            'js8call_ids': self.js8call_ids,
+            **{span: round(self.spans[span], 6) for span in SPANS if span in self.spans},
+        }
+
+
+class LatencyTracer:
+    """Follow each request from RX.DIRECTED to the PTT going off after its last reply.
+
+    The comms driver starts a trace when a request arrives and gives its ID to the
+    backend with the request; the backend copies the ID onto each reply, and the
+    driver reports each reply handed to JS8Call and each transmission finished.
+    The spans, in seconds, are:
+
+        backend_queue  the request waiting for the backend
+        parse          tidying and parsing the request
+        lookup         building the replies from the post store and caches
+        tx_queue       the replies waiting until the first is handed to JS8Call
+        key_up         JS8Call waiting for a cycle to start, over all the replies
+        airtime        PTT on to PTT off, over all the replies
+        total          the request arriving to the PTT going off after the last reply
+
+    Requests that get no reply (not valid, repeated, or refused) are dropped from
+    tracing, as are those whose replies all matched replies already waiting.
+    Percentiles over the last TRACE_WINDOW requests are logged with the other
+    stats, and each completed request can be written to trace_file as a JSON line.
+
+    With enabled False (the process mode, where the backend's spans are made in
+    another process) start() still hands out IDs, as the TX journal uses them to
+    match replies to requests, but nothing is traced.
+    """
+
+    def __init__(self, path: str = trace_file, window: int = TRACE_WINDOW):
+        self.path = path
+        self.file: Optional[TextIO] = None
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.open: Dict[int, Trace] = {}
+        self.samples: Dict[str, Deque[float]] = {span: deque(maxlen=window) for span in SPANS}
+        self.completed = 0
+        self.abandoned = 0
+        self.enabled = True
+
+    def start(self, station: str, radio: str = '') -> int:
+        now = clock.now()
+        with self.lock:
+            trace_id = next(self.ids)
+            if not self.enabled:
+                return trace_id
+            self.open[trace_id] = Trace(trace_id, station, radio, now)
+            self._expire(now)
+        return trace_id
+
+    def _expire(self, now: float):
+        stale = [trace_id for trace_id, trace in self.open.items() if now - trace.rx_at > TRACE_EXPIRY]
+        for trace_id in stale:
+            del self.open[trace_id]
+        self.abandoned += len(stale)
+
+    def discard(self, trace_id: Optional[int]):
+        with self.lock:
+            self.open.pop(trace_id, None)
+
+    def span(self, trace_id: Optional[int], span: str, seconds: float):
+        with self.lock:
+            trace = self.open.get(trace_id)
+            if trace is not None:
+                trace.add(span, seconds)
+
+    def queued(self, trace_id: Optional[int], cmd: str, replies: int):
+        with self.lock:
+            trace = self.open.get(trace_id)
+            if trace is None:
+                return
+            if not replies:
+                del self.open[trace_id]
+                return
+            trace.cmd = cmd
+            trace.replies = replies
+            trace.queued_at = clock.now()
+
+    def collapsed(self, trace_id: Optional[int]):
+        # A reply wasn't queued, as the same reply was already waiting for the station
+        with self.lock:
+            trace = self.open.get(trace_id)
+            if trace is None:
+                return
+            trace.replies -= 1
+            if trace.replies <= 0:
+                del self.open[trace_id]
+
+    def sent(self, trace_id: Optional[int], js8call_id: str):
+        # A reply has been handed to JS8Call
+        now = clock.now()
+        with self.lock:
+            trace = self.open.get(trace_id)
+            if trace is None:
+                return
+            if trace.first_sent_at is None and trace.queued_at is not None:
+                trace.first_sent_at = now
+                trace.add('tx_queue', now - trace.queued_at)
+            trace.js8call_ids.append(js8call_id)
+
+    def transmitted(self, tx: Transmission, now: float):
+        # A reply's transmission has finished; called by the TxScheduler
+        with self.lock:
+            trace = self.open.get(tx.trace)
+            if trace is None or trace.queued_at is None:
+                return  # not a reply the backend has told us about
+            end = now
+            if tx.started_at is not None:
+                trace.add('key_up', tx.started_at - tx.sent_at)
+                trace.add('airtime', tx.ptt_off_at - tx.started_at)
+                end = tx.ptt_off_at
+            trace.replies -= 1
+            if trace.replies <= 0:
+                del self.open[tx.trace]
+                trace.spans['total'] = end - trace.rx_at
+                self._complete(trace)
+
+    def _complete(self, trace: Trace):
+        self.completed += 1
+        for span, seconds in trace.spans.items():
+            self.samples[span].append(seconds)
+        if self.path:
+            try:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self.file = open(self.path, "a", encoding="utf-8")
+                self.file.write(json.dumps(trace.record()) + "\n")
+                self.file.flush()
+            except OSError as e:
+                logger.warning(f"Can't write to the trace file {self.path}: {e}")
+                self.path = ""
+
+    def summary(self) -> dict:
+        # Percentiles of each span, in seconds
+        with self.lock:
+            summary = {'completed': self.completed, 'in_progress': len(self.open), 'abandoned': self.abandoned}
+            for span in SPANS:
+                values = list(self.samples[span])
+                if values:
+                    summary[span] = {
+                        'p50': round(percentile(values, 50), 6),
+                        'p90': round(percentile(values, 90), 6),
+                        'p99': round(percentile(values, 99), 6),
+                        'max': round(max(values), 6),
+                    }
+        return summary
+
+
+tracer = LatencyTracer()
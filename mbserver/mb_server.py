@@ -16,19 +16,32 @@
 # resulting from the use of the program code.
 
 import threading
+import time
 import os
 import sys
 import argparse
+import asyncio
+from typing import Optional
 
-from . import js8call_driver
 from .js8call_driver import *
 from .server_api import *
 from .server_cli import *
 import logging
 
+from . import clock
 from .logging_setup import configure_logging
 from .config import SETTINGS
 from .upstream import UpstreamStore
+from .post_watcher import PostWatcher
+from .content_cache import ContentCache
+from .response_cache import ResponseCache, request_key, file_stamp
+from .response_packer import pack_responses
+from .request_dedup import RequestDedup
+from .latency_trace import tracer
+from .comms_process import RemoteComms, CommsListener, HAVE_UNIX_SOCKETS
+from .tx_scheduler import estimate_airtime
+from .post_index import PostMeta
+from .post_store import post_store
 from .message_q import *
 
 logger = logging.getLogger(__name__)
@@ -42,6 +55,14 @@ posts_url_root = SETTINGS.posts_url_root
 announce = SETTINGS.announce
 mb_announcement_timer = SETTINGS.mb_announcement_timer
 lst_limit = SETTINGS.lst_limit
+watch_interval = SETTINGS.watch_interval
+content_cache_bytes = SETTINGS.content_cache_bytes
+response_cache_entries = SETTINGS.response_cache_entries
+max_message_chars = SETTINGS.max_message_chars
+duplicate_window = SETTINGS.duplicate_window
+
+# Seconds by which a radio's announcement may be brought forward to go with another radio's
+ANNOUNCEMENT_SLACK = 60
 
 # Logging config
 LOG_LEVEL = SETTINGS.log_level
@@ -55,52 +76,29 @@ class CommsDisconnect(Exception):
     pass
 
 
-def send_to_comms(m: UnifiedMessage):
+def send_to_comms(m: UnifiedMessage, radio: 'Radio'):
     if m.get_param(MessageParameter.MB_MSG):
         log_msg = m.get_param(MessageParameter.MB_MSG).split('\n')[0]
-        logger.info(f"SEND -> {m.get_param(MessageParameter.DESTINATION)}: {log_msg}")
+        logger.info(f"SEND -> {m.get_param(MessageParameter.DESTINATION)}{radio.label}: {log_msg}")
 
     logger.debug(f"Sending to COMMS: {m.get_target().value}|{m.get_typ().value}|{m.get_verb().value}|{m.get_params()}")
     if m.priority == 0:
-        b2c_q_p0.put(m)
+        if not radio.comms.b2c_q_p0.put(m):
+            logger.warning(f"The control queue{radio.label} is full; dropping {m.get_verb().value}")
     elif m.priority == 1:
-        b2c_q_p1.put(m)
+        radio.comms.b2c_q_p1.put(m)
 
     # If it's not P0 or P1, ignore it.
 
 
-def is_valid_post_file(file_spec: str):
-    result = [()]  # default value
-
-    post_file_patterns = [
-        {'exp': "^([0-9]+) - (\\d{4}-\\d{2}-\\d{2}) - ([\\S\\s]+) *.txt", 'type': 'post_file'},
-    ]
-
-    pos = len(posts_dir)
-
-    file_name = file_spec[pos:]
-
-    for entry in post_file_patterns:
-        # try to match the request
-        result = re.findall(entry['exp'], file_name)
-        if len(result) > 0:
-            break
-
-    return result
-
-
 class CmdProcessors:
     @staticmethod
     def list_posts(post_id: int) -> str:
-        listing = ""
+        meta = post_store.get(post_id)
+        if meta is None:
+            return ""
 
-        post_id_str = f"{post_id:04d}"
-        file_list = sorted(Path(posts_dir).glob(f"{post_id_str}*.txt"), reverse=True)
-        file_name = [f.name for f in file_list]
-        if len(file_name) > 0:
-            listing = re.findall(r"^([\S\s]+).txt", file_name[0])[0]
-
-        return listing
+        return meta.listing
 
     def verb_list(self, req: dict) -> list[str]:
         # The req structure will look like one of these
@@ -109,6 +107,10 @@ class CmdProcessors:
 
         response_list = []
 
+        if req['by'] != 'ID' and len(req['id_list']) == 0:
+            # A listing by date that found nothing
+            return [f"-{req['cmd']}\nNO POSTS FOUND"]
+
         for post_id in req['id_list']:
             listing = self.list_posts(post_id)
             if len(listing) > 0:
@@ -119,11 +121,31 @@ class CmdProcessors:
         return response_list
 
     @staticmethod
-    def get_post_content(filename):
+    def tidy_content(post: str) -> str:
+        # Tidy the post content.
+        post = post.replace('\r\n', '\n')
+        if replace_nl:
+            post = post.replace('\n', ' ')  # temp code until NL fixed
+
+        return post
+
+    @staticmethod
+    def content_stamp(stamp):
+        # Content is cached tidied, so it is stale when replace_nl changes as well as when the file does
+        return None if stamp is None else (stamp, replace_nl)
+
+    def get_post_content(self, filename):
         f = open(filename)
         post = f.read()
         f.close()
-        return post
+
+        return self.tidy_content(post)
+
+    def read_post(self, meta: PostMeta) -> Optional[str]:
+        # Returns None if the post has gone from the store
+        return content_cache.get(
+            f"post:{meta.post_id}", self.content_stamp(post_store.stamp(meta)), lambda: self.tidy_content(post_store.read(meta))
+        )
 
     def verb_get(self, req: dict) -> list[str]:
         # The req structure will look like this:
@@ -131,41 +153,62 @@ class CmdProcessors:
 
         post_id = req['id_list'][0]
 
-        file_search = f"{post_id:04d}*.txt"
-
-        file_path_name = sorted(Path(posts_dir).glob(file_search), reverse=True)
+        meta = post_store.get(post_id)
+        post_content = self.read_post(meta) if meta else None
 
-        if len(file_path_name) == 0:
+        if post_content is None:
             return [f"-G{post_id}~\nPOST NOT FOUND"]
 
-        post_content = self.get_post_content(file_path_name[0])
-
-        # Tidy the post content.
-        post_content = post_content.replace('\r\n', '\n')
-        if replace_nl:
-            post_content = post_content.replace('\n', ' ')  # temp code until NL fixed
-
         return [f"+G{post_id}~\n{post_content}"]
 
     def verb_info(self) -> list[str]:
         # The req structure will look like this:
         # {'cmd': 'I~', 'verb': 'INFO', 'id_list': []}  -> get server info
 
-        file_search = "info.txt"
-
-        file_path_name = sorted(Path(posts_dir).glob(file_search), reverse=True)
+        info_path = os.path.join(posts_dir, "info.txt")
+        info_content = content_cache.get(
+            info_path, self.content_stamp(file_stamp(info_path)), lambda: self.get_post_content(info_path)
+        )
 
-        if len(file_path_name) == 0:
+        if info_content is None:
             return ["-I~\nNO INFORMATION IS AVAILABLE FOR THIS SERVER"]
 
-        info_content = self.get_post_content(file_path_name[0])
+        return [f"+I~\n{info_content}"]
 
-        # Tidy the post content.
-        info_content = info_content.replace('\r\n', '\n')
-        if replace_nl:
-            info_content = info_content.replace('\n', ' ')  # temp code until NL fixed
+    @staticmethod
+    def verb_search(req: dict) -> list[str]:
+        # The req structure will look like this:
+        # {'cmd': 'SFLOOD~', 'verb': 'SEARCH', 'by': 'TEXT', 'text': 'FLOOD', 'id_list': [12, 7]}
+        # id_list is None if the post store doesn't support search
+
+        if req['id_list'] is None:
+            return [f"-{req['cmd']}\nSEARCH NOT AVAILABLE"]
+
+        if len(req['id_list']) == 0:
+            return [f"-{req['cmd']}\nNO POSTS FOUND"]
+
+        return [f"+{req['cmd']}\n{','.join(map(str, req['id_list']))}"]
+
+
+# Post bodies and info.txt, normalised ready to send
+content_cache = ContentCache(content_cache_bytes)
+
+# Finished responses, keyed by the normalised request
+response_cache = ResponseCache(response_cache_entries)
 
-        return [f"+I~\n{info_content}"]
+
+def response_validator(req: dict) -> tuple:
+    # Everything a response depends on: the set of posts, the settings used to build it and,
+    # for GET and INFO, the file the content comes from.
+    validator = (post_store.generation, lst_limit, replace_nl)
+
+    if req['verb'] == 'GET':
+        meta = post_store.get(req['id_list'][0])
+        validator += (post_store.stamp(meta) if meta else None,)
+    elif req['verb'] == 'INFO':
+        validator += (file_stamp(os.path.join(posts_dir, "info.txt")),)
+
+    return validator
 
 
 class MbAnnouncement:
@@ -180,26 +223,24 @@ class MbAnnouncement:
 
     @staticmethod
     def latest_post_meta() -> dict:
-        file_list = sorted(Path(posts_dir).glob(f"* - * - *.txt"), reverse=True)
-        latest_meta = [f.name for f in file_list][0]
-
-        post_id, post_date = re.findall(r'^(\d+) - (\d{4}-\d{2}-\d{2}) - [\S\s]*\.txt', latest_meta)[0]
+        latest = post_store.latest()
 
-        if post_id:
-            return {'post_id': int(post_id), 'post_date': post_date}
+        if latest:
+            return {'post_id': latest.post_id, 'post_date': latest.post_date}
         else:
             return {'post_id': 0, 'post_date': "1970-01-01"}
 
     def is_announcement_needed(self):
-        epoch = time.time()
+        epoch = clock.now()
         if epoch > self.next_announcement and announce:
             return True
         else:
             return False
 
-    def send_mb_announcement(self):
+    def mb_announcement_message(self) -> Optional[UnifiedMessage]:
+        # Returns None if an announcement isn't due yet
         # get the current epoch
-        epoch = time.time()
+        epoch = clock.now()
         if epoch > self.next_announcement:
             meta = self.latest_post_meta()  # update with the latest post info
 
@@ -208,7 +249,7 @@ class MbAnnouncement:
 
             message = f"{meta['post_id']} {compressed_latest_post_date}"
 
-            m = UnifiedMessage(
+            m = UnifiedMessage.internal(
                 priority=1,
                 target=MessageTarget.COMMS,
                 typ=MessageType.MB_MSG,
@@ -222,19 +263,96 @@ class MbAnnouncement:
             # update the next announcement epoch
             self.next_announcement = epoch + (mb_announcement_timer * 60)
 
-            send_to_comms(m)
+            return m
+
+        return None
+
+
+class Radio:
+    """One JS8Call instance served by this server.
+
+    Each radio has its own callsign, announcements, outbound queues and TX
+    scheduler (all in its comms driver), and its own record of requests already
+    answered.  The post store and the caches are shared by every radio.
+    """
+
+    def __init__(self, name: str, comms: Js8CallDriver, label: str = ''):
+        self.name = name
+        self.comms = comms
+        self.label = label  # added to SEND log lines, to show which radio is sending
+        self.this_blog = ''
+        self.mb_announcement: Optional[MbAnnouncement] = None
+
+        # Requests already answered, so resent and relayed copies aren't answered again
+        self.request_dedup = RequestDedup(duplicate_window)
+
+        self.started = clock.now()
+        self.requests = 0
+        self.replies = 0
+        self.reply_chars = 0
+
+    def note_replies(self, replies: list[UnifiedMessage]):
+        self.requests += 1
+        self.replies += len(replies)
+        self.reply_chars += sum(len(m.get_param(MessageParameter.MB_MSG)) for m in replies)
+
+    def stats(self) -> dict:
+        # Throughput since the server started; transmissions and airtime are as seen through RIG.PTT
+        hours = max(clock.now() - self.started, 1.0) / 3600
+        # A comms process keeps its own record of transmissions
+        tx = self.comms.tx_scheduler.stats() if self.comms.tx_scheduler is not None else {}
+        return {
+            'blog': self.this_blog,
+            'requests': self.requests,
+            'replies': self.replies,
+            'reply_chars': self.reply_chars,
+            'requests_per_hour': round(self.requests / hours, 1),
+            'transmissions': tx.get('transmissions'),
+            'airtime_s': tx.get('actual_s'),
+        }
+
+
+def radio_labels(radio_settings) -> list[str]:
+    # Only name the radio in SEND log lines if there is more than one
+    if len(radio_settings) == 1:
+        return ['']
+    return [f" via {name}" for name, _, _ in radio_settings]
 
 
 class MbServer:
 
-    this_blog = ''
     request = None
-    mb_announcement = None
 
-    def __init__(self):
-        comms = Js8CallDriver()
-        self.comms_t = threading.Thread(target=comms.run_comms)
-        self.comms_t.start()
+    def __init__(self, radio_settings=SETTINGS.radios, comms_socket: Optional[str] = None):
+        # One comms driver per JS8Call instance, all passing requests to the same backend queue.
+        # Given comms_socket, the drivers run in comms processes that connect to it.
+        self.radios: dict[str, Radio] = {}
+        self.comms_threads: list[threading.Thread] = []
+        self.c2b_q = c2b_q
+        several = len(radio_settings) > 1
+        for (name, host, port), label in zip(radio_settings, radio_labels(radio_settings)):
+            if comms_socket:
+                comms = RemoteComms(name)
+            else:
+                comms = Js8CallDriver(
+                    OverflowQueue(CONTROL_QUEUE_SIZE), FairQueue(), c2b_q,
+                    addr=(host, port), radio=name if several else ''
+                )
+            self.radios[name] = Radio(name, comms, label)
+
+        self.comms_listener: Optional[CommsListener] = None
+        if comms_socket:
+            remotes = {name: radio.comms for name, radio in self.radios.items()}
+            self.comms_listener = CommsListener(remotes, c2b_q, comms_socket)
+
+    def start_comms(self):
+        # A thread for each comms driver
+        if self.comms_listener is not None:
+            threading.Thread(target=self.comms_listener.run, name="comms listener", daemon=True).start()
+        for radio in self.radios.values():
+            comms_t = threading.Thread(target=radio.comms.run_comms, name=f"comms {radio.name}")
+            comms_t.start()
+            self.comms_threads.append(comms_t)
 
     @staticmethod
     def tidy(messy: str) -> str:
@@ -245,23 +363,82 @@ class MbServer:
         clean = value.replace('  ', ' ')  # remove double spaces
         return clean
 
-    def process(self, m: UnifiedMessage) -> list[UnifiedMessage]:
+    @staticmethod
+    def respond(req) -> list[str]:
+        key = request_key(req)
+        validator = response_validator(req)
+        cached = response_cache.get(key, validator)
+        if cached is not None:
+            return cached
 
         mb_rsp_list: list[str] = []
+        p = CmdProcessors()
+
+        if req['verb'] == 'LIST':
+            mb_rsp_list = p.verb_list(req)
+        elif req['verb'] == 'GET':
+            mb_rsp_list = p.verb_get(req)
+        elif req['verb'] == 'INFO':
+            mb_rsp_list = p.verb_info()
+        elif req['verb'] == 'SEARCH':
+            mb_rsp_list = p.verb_search(req)
+
+        # Send several listings in one transmission where they fit
+        mb_rsp_list = pack_responses(mb_rsp_list, max_message_chars)
+
+        response_cache.put(key, validator, mb_rsp_list)
+        return mb_rsp_list
+
+    def warm_up(self):
+        # Scan and validate posts_dir once, then build the responses most likely to be asked
+        # for first, so the first request on air is served from the caches.
+        start = time.perf_counter()
+
+        post_watcher = PostWatcher(post_store, poll_interval=watch_interval)
+        post_watcher.start()
+        post_store.scan_report.log(posts_dir)
+
+        latest = post_store.latest()
+        if latest is None:
+            logger.warning(f"No posts found in {posts_dir}")
+
+        warm_cmds = ["E~", "I~"]
+        if latest is not None:
+            warm_cmds.append(f"G{latest.post_id}~")
+        for cmd in warm_cmds:
+            self.respond(api_get_req_structure(cmd))
+
+        logger.info(f"Post store warm-up: {len(post_store)} posts indexed in {time.perf_counter() - start:.3f}s")
+        return post_watcher
+
+    def radio_for(self, m: UnifiedMessage) -> Radio:
+        # Messages only name their radio when there is more than one
+        name = m.get_param(MessageParameter.RADIO)
+        if name is None:
+            return next(iter(self.radios.values()))
+        return self.radios[name]
+
+    def process(self, radio: Radio, m: UnifiedMessage) -> list[UnifiedMessage]:
+
         m_out_list: list[UnifiedMessage] = []
 
+        trace = m.get_param(MessageParameter.TRACE)
+        tracer.span(trace, 'backend_queue', clock.now() - m.get_ts())
+        start = time.perf_counter()
+
         mb_req = self.tidy(m.get_param(MessageParameter.MB_MSG))
 
         if mb_req == 'Q':
-            self.mb_announcement.next_announcement = 0
-            return []
+            radio.mb_announcement.next_announcement = 0
+            return self.no_reply(trace)
 
         # mb_req is in the format _source_: _destination_ _mb_cmd_
         req = api_get_req_structure(mb_req)  # Go get a structured request
 
         if req == {}:
             logger.debug('Not a valid MB request <- : ' + mb_req)
-            return []
+            return self.no_reply(trace)
+        tracer.span(trace, 'parse', time.perf_counter() - start)
 
         # The req structure will look like one of these
         # {'cmd': 'E6~', 'verb': 'LIST', 'by': 'ID', 'id_list': [6]}  -> list #6, #10 and #12
@@ -269,108 +446,325 @@ class MbServer:
         # {'cmd': 'G12~', 'verb': 'GET', 'id_list': [12]}  -> get #12
         # {'cmd': 'I~', 'verb': 'INFO', 'id_list': [12]}  -> get server info
 
-        p = CmdProcessors()
+        start = time.perf_counter()
+        mb_rsp_list = self.respond(req)
+        tracer.span(trace, 'lookup', time.perf_counter() - start)
 
-        if req['verb'] == 'LIST':
-            mb_rsp_list = p.verb_list(req)
-        elif req['verb'] == 'GET':
-            mb_rsp_list = p.verb_get(req)
-        elif req['verb'] == 'INFO':
-            mb_rsp_list = p.verb_info()
+        source = m.get_param(MessageParameter.SOURCE)
+        if radio.request_dedup.is_duplicate(source, req['cmd']):
+            radio.request_dedup.note_dropped(
+                sum(estimate_airtime(mb_rsp, SETTINGS.tx_chars_per_frame) for mb_rsp in mb_rsp_list)
+            )
+            logger.info(f"Ignoring a repeat of {req['cmd']} from {source}")
+            return self.no_reply(trace)
 
         for mb_rsp in mb_rsp_list:
-            m_out = UnifiedMessage(
+            params = {
+                MessageParameter.DESTINATION: source,
+                MessageParameter.MB_MSG: mb_rsp
+            }
+            if trace is not None:
+                params[MessageParameter.TRACE] = trace  # announcements to @MB aren't traced
+            m_out = UnifiedMessage.internal(
                 priority=1,
                 target=MessageTarget.COMMS,
                 typ=MessageType.MB_MSG,
                 verb=MessageVerb.SEND,
-                params={
-                    MessageParameter.DESTINATION: m.get_param(MessageParameter.SOURCE),
-                    MessageParameter.MB_MSG: mb_rsp
-                }
+                params=params
             )
 
             m_out_list.append(m_out)
 
+        if not m_out_list:
+            return self.no_reply(trace)
+        tracer.queued(trace, req['cmd'], len(m_out_list))
+        radio.note_replies(m_out_list)
         return m_out_list
 
-    def run_server(self):
+    @staticmethod
+    def no_reply(trace: Optional[int]) -> list[UnifiedMessage]:
+        # A request that gets no reply.  The comms driver is told, so that its TX journal
+        # doesn't keep the request to be sent again after a restart.
+        tracer.discard(trace)
+        if trace is None:
+            return []
+        return [UnifiedMessage.internal(
+            priority=0,
+            target=MessageTarget.COMMS,
+            typ=MessageType.CONTROL,
+            verb=MessageVerb.NO_REPLY,
+            params={MessageParameter.TRACE: trace}
+        )]
+
+    def handle_comms_message(self, radio: Radio, m: UnifiedMessage) -> list[UnifiedMessage]:
+        # Returns the messages to send back to COMMS, through the radio the message came from
+        logger.debug(
+            f"Received from COMMS:" +
+            f" {m.get_target()}|{m.get_typ()}|{m.get_verb()}|{m.get_params()}"
+        )
+
+        if m.get_typ() == MessageType.SIGNAL and m.get_verb() == MessageVerb.NOTE_DISCONNECT:
+            raise CommsDisconnect(f"Comms communication has been disconnected")
+
+        if radio.this_blog == '':
+            # We can't go any further until we have the blog name
+            if m.get_verb() == MessageVerb.NOTE_CALLSIGN:
+                radio.this_blog = m.get_param(MessageParameter.CALLSIGN)
+                logger.info(f"Running as blog {radio.this_blog}{radio.label}")
+                radio.mb_announcement = MbAnnouncement(radio.this_blog)
+            return self.no_reply(m.get_param(MessageParameter.TRACE))
+
+        if m.get_typ() == MessageType.MB_MSG:
+            if m.get_param(MessageParameter.DESTINATION) == radio.this_blog \
+                    or m.get_param(MessageParameter.DESTINATION) == '@MB':
+                # console trace of message received
+                logger.info(
+                    f"RECV <-"
+                    f" {m.get_param(MessageParameter.SOURCE)}{radio.label}:"
+                    f" {m.get_param(MessageParameter.MB_MSG)}"
+                )
+                return self.process(radio, m)
+            return self.no_reply(m.get_param(MessageParameter.TRACE))
+
+        return []
+
+    def due_announcements(self) -> list[tuple[Radio, UnifiedMessage]]:
+        # The announcements due on each radio.  The post store is refreshed from upstream once
+        # for all of them, not once per radio.
+        due = [
+            radio for radio in self.radios.values()
+            if radio.mb_announcement is not None and radio.mb_announcement.is_announcement_needed()
+        ]
+        if not due:
+            return []
+
+        # Bring forward any announcement due soon on another radio, so the radios announce together
+        for radio in self.radios.values():
+            if radio not in due and radio.mb_announcement is not None \
+                    and radio.mb_announcement.next_announcement < clock.now() + ANNOUNCEMENT_SLACK:
+                radio.mb_announcement.next_announcement = 0
+                due.append(radio)
+
+        self.refresh_posts()
+        return [(radio, radio.mb_announcement.mb_announcement_message()) for radio in due]
+
+    @staticmethod
+    def refresh_posts():
+        # refresh the blog with new posts
+        if posts_url_root:
+            blog_store = UpstreamStore()
+            meta = MbAnnouncement.latest_post_meta()
+            next_post_needed = meta['post_id'] + 1
+            logger.info("Checking central store for new posts")
+            blog_store.get_new_content(starting_at=next_post_needed)
+
+    def log_stats(self):
+        logger.info(f"Content cache: {content_cache.stats()}")
+        logger.info(f"Response cache: {response_cache.stats()}")
+        logger.info(f"Backend queue: {self.c2b_q.stats()}")
+        if tracer.enabled:
+            logger.info(f"Request latency (s): {tracer.summary()}")
+        for radio in self.radios.values():
+            outbound_q = radio.comms.b2c_q_p1
+            logger.info(f"Radio {radio.name}: {radio.stats()}")
+            logger.info(f"Control queue: {radio.comms.b2c_q_p0.stats()}")
+            logger.info(f"Outbound queue (high water {outbound_q.high_water}) by station: {outbound_q.stats()}")
+            logger.info(
+                f"Duplicates suppressed: requests {radio.request_dedup.stats()},"
+                f" queued replies saved {outbound_q.airtime_saved:.0f}s airtime"
+            )
+            logger.info(f"JS8Call connection: {radio.comms.link_stats()}")
+            if radio.comms.journal is not None:
+                logger.info(f"TX journal: {radio.comms.journal.stats()}")
+
+    @staticmethod
+    def check_posts_dir():
         # check the posts directory looks OK
         if not os.path.exists(posts_dir):
             logger.info("Can't find the posts directory")
             logger.info("Check that the posts_dir value in config.ini is correct")
             exit(1)
 
+    def run_server(self):
+        self.start_comms()
+        self.check_posts_dir()
+
+        post_watcher = self.warm_up()
+
         while True:
             try:  # To catch a KeyboardInterrupt
                 # Check for incoming messages from COMMS.
                 try:
                     m: UnifiedMessage = c2b_q.get(block=True, timeout=0.1)  # if no msg waiting, throw an except
 
-                    logger.debug(
-                        f"Received from COMMS:" +
-                        f" {m.get_target()}|{m.get_typ()}|{m.get_verb()}|{m.get_params()}"
-                    )
-
-                    if m.get_typ() == MessageType.SIGNAL and m.get_verb() == MessageVerb.NOTE_DISCONNECT:
-                        raise CommsDisconnect(f"Comms communication has been disconnected")
-
-                    if self.this_blog == '':
-                        # We can't go any further until we have the blog name
-                        if m.get_verb() == MessageVerb.NOTE_CALLSIGN:
-                            self.this_blog = m.get_param(MessageParameter.CALLSIGN)
-                            logger.info(f"Running as blog {self.this_blog}")
-                            self.mb_announcement = MbAnnouncement(self.this_blog)
-                            c2b_q.task_done()
-                        continue
-
-                    elif m.get_typ() == MessageType.MB_MSG:
-                        if m.get_param(MessageParameter.DESTINATION) == self.this_blog \
-                                or m.get_param(MessageParameter.DESTINATION) == '@MB':
-                            # console trace of message received
-                            logger.info(
-                                f"RECV <-"
-                                f" {m.get_param(MessageParameter.SOURCE)}:"
-                                f" {m.get_param(MessageParameter.MB_MSG)}"
-                            )
-                            m_out_list: list[UnifiedMessage] = self.process(m)
-                            for m_out in m_out_list:
-                                send_to_comms(m_out)
-
+                    radio = self.radio_for(m)
+                    for m_out in self.handle_comms_message(radio, m):
+                        send_to_comms(m_out, radio)
                     c2b_q.task_done()
 
                 except queue.Empty:
                     pass
 
-                if self.this_blog == '':
-                    continue
+                post_watcher.poll()
 
-                if self.mb_announcement.is_announcement_needed():
-                    # refresh the blog with new posts
-                    if posts_url_root:
-                        blog_store = UpstreamStore()
-                        meta = self.mb_announcement.latest_post_meta()
-                        next_post_needed = meta['post_id'] + 1
-                        logger.info("Checking central store for new posts")
-                        blog_store.get_new_content(starting_at=next_post_needed)
-
-                    self.mb_announcement.send_mb_announcement()
+                announcements = self.due_announcements()
+                for radio, m in announcements:
+                    send_to_comms(m, radio)
+                if announcements:
+                    self.log_stats()
 
             except (KeyboardInterrupt, CommsDisconnect):
-                m = UnifiedMessage(
+                m = UnifiedMessage.internal(
                     priority=0,
                     target=MessageTarget.COMMS,
                     typ=MessageType.CONTROL,
                     verb=MessageVerb.SHUTDOWN
                 )
 
-                send_to_comms(m)
+                for radio in self.radios.values():
+                    send_to_comms(m, radio)
 
-                self.comms_t.join(1)  # wait for up to one second for the comms thread to exit
+                for comms_t in self.comms_threads:
+                    comms_t.join(1)  # wait for up to one second for each comms thread to exit
+                if self.comms_listener is not None:
+                    self.comms_listener.close()
+                post_watcher.close()
                 logger.info('The server is stopping')
                 break
 
 
+class AsyncMbServer(MbServer):
+    """MbServer for the asyncio mode.
+
+    The comms driver and the backend share one event loop, so nothing polls:
+    a request is handled as soon as it arrives and its reply is passed straight
+    to the comms driver.  Announcements are scheduled callbacks, and posts_dir
+    changes are picked up when the inotify descriptor becomes readable (or by a
+    repeating timer where inotify isn't available).
+    """
+
+    def __init__(self, radio_settings=SETTINGS.radios):
+        # The comms drivers are created in serve(), once the event loop is running
+        self.radio_settings = radio_settings
+        self.radios: dict[str, Radio] = {}
+        self.c2b_q: Optional[AsyncOverflowQueue] = None
+        self.announcement_timer: Optional[asyncio.TimerHandle] = None
+        self.announcement_due = 0.0
+        self.post_watch_timer: Optional[asyncio.TimerHandle] = None
+
+    @staticmethod
+    async def send_to_comms(m: UnifiedMessage, radio: 'Radio'):
+        if m.get_param(MessageParameter.MB_MSG):
+            log_msg = m.get_param(MessageParameter.MB_MSG).split('\n')[0]
+            logger.info(f"SEND -> {m.get_param(MessageParameter.DESTINATION)}{radio.label}: {log_msg}")
+
+        await radio.comms.queue_tx(m)
+
+    def schedule_announcement(self):
+        # One timer, for whichever radio's announcement is due first
+        announcements = [radio.mb_announcement for radio in self.radios.values() if radio.mb_announcement]
+        if not announce or not announcements:
+            return
+
+        due = min(mb_announcement.next_announcement for mb_announcement in announcements)
+        if self.announcement_timer is not None:
+            if due == self.announcement_due:
+                return
+            self.announcement_timer.cancel()  # e.g. a Q request has asked for one now
+
+        self.announcement_due = due
+        self.announcement_timer = asyncio.get_running_loop().call_later(
+            max(0.0, due - clock.now()), lambda: asyncio.ensure_future(self.announce())
+        )
+
+    async def announce(self):
+        self.announcement_timer = None
+        announcements = self.due_announcements()
+        for radio, m in announcements:
+            await self.send_to_comms(m, radio)
+        if announcements:
+            self.log_stats()
+        self.schedule_announcement()
+
+    def watch_posts(self, post_watcher: PostWatcher):
+        loop = asyncio.get_running_loop()
+
+        if post_watcher.inotify_fd is not None:
+            fd = post_watcher.inotify_fd
+
+            def on_posts_changed():
+                post_watcher.poll()
+                if post_watcher.inotify_fd is None:
+                    # inotify has failed and the watcher has fallen back to polling
+                    loop.remove_reader(fd)
+                    self.poll_posts(post_watcher)
+
+            loop.add_reader(fd, on_posts_changed)
+        else:
+            self.poll_posts(post_watcher)
+
+    def poll_posts(self, post_watcher: PostWatcher):
+        post_watcher.poll()
+        self.post_watch_timer = asyncio.get_running_loop().call_later(
+            watch_interval, self.poll_posts, post_watcher
+        )
+
+    async def run_backend(self):
+        while True:
+            m: UnifiedMessage = await self.c2b_q.get()
+            radio = self.radio_for(m)
+            for m_out in self.handle_comms_message(radio, m):
+                await self.send_to_comms(m_out, radio)
+            self.c2b_q.task_done()
+            self.schedule_announcement()
+
+    async def serve(self):
+        self.check_posts_dir()
+
+        self.c2b_q = AsyncOverflowQueue(BACKEND_QUEUE_SIZE)
+        several = len(self.radio_settings) > 1
+        for (name, host, port), label in zip(self.radio_settings, radio_labels(self.radio_settings)):
+            comms = AsyncJs8CallDriver(
+                AsyncOverflowQueue(CONTROL_QUEUE_SIZE), FairQueue(), self.c2b_q,
+                addr=(host, port), radio=name if several else ''
+            )
+            self.radios[name] = Radio(name, comms, label)
+        post_watcher = self.warm_up()
+        self.watch_posts(post_watcher)
+
+        # run_rx() connects to JS8Call, and reconnects whenever the connection is lost
+        tasks = [asyncio.create_task(self.run_backend())]
+        for radio in self.radios.values():
+            tasks.append(asyncio.create_task(radio.comms.run_rx()))
+            tasks.append(asyncio.create_task(radio.comms.run_tx()))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        except CommsDisconnect:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.announcement_timer is not None:
+                self.announcement_timer.cancel()
+            if self.post_watch_timer is not None:
+                self.post_watch_timer.cancel()
+            if post_watcher.inotify_fd is not None:
+                asyncio.get_running_loop().remove_reader(post_watcher.inotify_fd)
+            post_watcher.close()
+            for radio in self.radios.values():
+                radio.comms.js8call_api.close()
+                radio.comms.journal.close()
+            logger.info('The server is stopping')
+
+    def run_server(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+
 def main():
     """Application entry point.
 
@@ -417,6 +811,20 @@ def main():
         default=None,
         help="The TCP port number that JS8Call is listening to for a connection from MbServer",
     )
+    parser.add_argument(
+        "--mode",
+        dest="mode",
+        choices=["threaded", "asyncio", "process"],
+        default=None,
+        help="Run the comms driver and backend as threads, on one asyncio event loop, or with the "
+             "comms driver in separate processes. Overrides config.ini [server] mode.",
+    )
+    parser.add_argument(
+        "--import-posts",
+        dest="import_posts",
+        action="store_true",
+        help="Import the post files in posts_dir into the post store and exit (for store = sqlite).",
+    )
 
     args = parser.parse_args(sys.argv[1:])
 
@@ -457,14 +865,43 @@ def main():
         console=True,
     )
 
+    if args.import_posts:
+        post_store.build()
+        logger.info(f"The post store holds {len(post_store)} posts")
+        return 0
+
+    radio_settings = SETTINGS.radios
     if args.tcp_port is not None:
-        host, _ = SETTINGS.server
-        js8call_driver.js8call_addr = (host, args.tcp_port)
+        # Applies to the first radio if there are several
+        name, host, _ = radio_settings[0]
+        if len(radio_settings) == 1:
+            name = f"{host}:{args.tcp_port}"
+        radio_settings = ((name, host, args.tcp_port),) + radio_settings[1:]
         logger.info(
             f"Overriding JS8Call TCP port: {host}:{args.tcp_port}"
         )
 
-    srv = MbServer()
+    mode = args.mode if args.mode is not None else SETTINGS.mode
+    if mode == "asyncio":
+        srv = AsyncMbServer(radio_settings)
+    elif mode == "process":
+        if not HAVE_UNIX_SOCKETS:
+            logger.error("The process mode needs Unix sockets, which this system doesn't have")
+            return 1
+        # The backend's half of each request's spans can't be joined to the comms process's half
+        tracer.enabled = False
+        srv = MbServer(radio_settings, comms_socket=SETTINGS.comms_socket)
+        try:
+            srv.comms_listener.open()
+        except OSError as e:
+            logger.error(f"Can't listen for comms processes on {SETTINGS.comms_socket}: {e}")
+            return 1
+    else:
+        if mode != "threaded":
+            logger.warning(f"Unknown mode {mode!r} in config.ini; using threaded")
+            mode = "threaded"
+        srv = MbServer(radio_settings)
+    logger.info(f"Running in {mode} mode")
     srv.run_server()
 
     return 0
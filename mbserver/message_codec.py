@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import struct
+import logging
+from typing import List
+
+from .message_q import UnifiedMessage, MessageTarget, MessageType, MessageVerb, MessageParameter, _PARAM_KEYS
+
+logger = logging.getLogger(__name__)
+
+# A compact binary form of UnifiedMessage, for passing messages between the comms process
+# and the backend, and for the TX journal.  Each frame is a 4 byte length and then:
+#
+#   priority, target, typ, verb (one byte each), ts (8 byte float), number of params (one byte)
+#   and for each param: key (one byte), value type (one byte), value
+#
+# Enum members and parameter keys are sent as their position in the Enum, so both ends
+# must be running the same version of the server.
+
+_FRAME = struct.Struct("<I")
+_HEADER = struct.Struct("<BBBBdB")
+_PARAM = struct.Struct("<BB")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_STR_LEN = struct.Struct("<I")
+
+_TARGETS = tuple(MessageTarget)
+_TYPES = tuple(MessageType)
+_VERBS = tuple(MessageVerb)
+_PARAMS = tuple(MessageParameter)
+_TARGET_INDEX = {member: i for i, member in enumerate(_TARGETS)}
+_TYPE_INDEX = {member: i for i, member in enumerate(_TYPES)}
+_VERB_INDEX = {member: i for i, member in enumerate(_VERBS)}
+_PARAM_INDEX = {_PARAM_KEYS[p]: i for i, p in enumerate(_PARAMS)}  # UnifiedMessage.params keys
+
+# Value types
+_NONE, _FALSE, _TRUE, _INT_VALUE, _FLOAT_VALUE, _STR_VALUE = range(6)
+
+MAX_FRAME_BYTES = 1 << 20  # a longer frame means the stream is corrupt
+
+
+def encode_message(m: UnifiedMessage) -> bytes:
+    # The whole frame, length included
+    body = encode_body(m)
+    return _FRAME.pack(len(body)) + body
+
+
+def encode_body(m: UnifiedMessage) -> bytes:
+    # The frame without its length, as decode_message() takes it
+    parts = [_HEADER.pack(
+        m.priority, _TARGET_INDEX[m.target], _TYPE_INDEX[m.typ], _VERB_INDEX[m.verb], m.ts, len(m.params)
+    )]
+    for key, value in m.params.items():
+        index = _PARAM_INDEX[key]
+        if value is None:
+            parts.append(_PARAM.pack(index, _NONE))
+        elif value is True or value is False:
+            parts.append(_PARAM.pack(index, _TRUE if value else _FALSE))
+        elif isinstance(value, int):
+            parts.append(_PARAM.pack(index, _INT_VALUE) + _INT.pack(value))
+        elif isinstance(value, float):
+            parts.append(_PARAM.pack(index, _FLOAT_VALUE) + _FLOAT.pack(value))
+        else:
+            data = str(value).encode("utf-8")
+            parts.append(_PARAM.pack(index, _STR_VALUE) + _STR_LEN.pack(len(data)) + data)
+    return b"".join(parts)
+
+
+def decode_message(body: bytes) -> UnifiedMessage:
+    # The body of one frame, without its length
+    priority, target, typ, verb, ts, count = _HEADER.unpack_from(body)
+    offset = _HEADER.size
+    params = {}
+    for _ in range(count):
+        index, kind = _PARAM.unpack_from(body, offset)
+        offset += _PARAM.size
+        if kind == _NONE:
+            value = None
+        elif kind == _FALSE or kind == _TRUE:
+            value = kind == _TRUE
+        elif kind == _INT_VALUE:
+            value = _INT.unpack_from(body, offset)[0]
+            offset += _INT.size
+        elif kind == _FLOAT_VALUE:
+            value = _FLOAT.unpack_from(body, offset)[0]
+            offset += _FLOAT.size
+        elif kind == _STR_VALUE:
+            length = _STR_LEN.unpack_from(body, offset)[0]
+            offset += _STR_LEN.size
+            value = body[offset:offset + length].decode("utf-8")
+            offset += length
+        else:
+            raise ValueError(f"Unknown value type {kind}")
+        params[_PARAMS[index]] = value
+
+    m = UnifiedMessage.internal(priority, _TARGETS[target], _TYPES[typ], _VERBS[verb], params)
+    m.ts = ts  # when it was made, in the other process
+    return m
+
+
+class MessageFrameDecoder:
+    """Incremental decoder for a stream of encoded messages.
+
+    As with JsonLineDecoder, feed() takes whatever a recv returned and gives back the
+    messages completed by it; a partial frame waits in the buffer for the rest.
+    A frame that can't be decoded is logged and skipped.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[UnifiedMessage]:
+        self.buffer += data
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= _FRAME.size:
+            length = _FRAME.unpack_from(self.buffer, offset)[0]
+            if length > MAX_FRAME_BYTES:
+                raise ValueError(f"Frame of {length} bytes; the stream is corrupt")
+            end = offset + _FRAME.size + length
+            if len(self.buffer) < end:
+                break
+            try:
+                messages.append(decode_message(bytes(self.buffer[offset + _FRAME.size:end])))
+            except (ValueError, IndexError, struct.error, UnicodeDecodeError) as e:
+                logger.warning(f"Ignoring a message that can't be decoded: {e}")
+            offset = end
+        del self.buffer[:offset]
+        return messages
+
+    def clear(self) -> None:
+        self.buffer.clear()
@@ -1,19 +1,26 @@
 from __future__ import annotations
 
 import time
+import asyncio
+import logging
+import threading
+from collections import deque
 from enum import Enum
-from queue import Queue
-from typing import Any, Dict, Mapping, Optional, Union, Literal, cast, Type, TypeVar
+from queue import Queue, Empty
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Tuple, Union, Literal, cast, Type, TypeVar
 
-MAX_QUEUE_SIZE = 20
+from . import clock
+from .config import SETTINGS
+from .tx_scheduler import estimate_airtime
 
-b2c_q_p0 = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages from the backend to the comms driver
-b2c_q_p1 = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages from the backend to the comms driver
-c2b_q = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages to the backend from the comms driver
+logger = logging.getLogger(__name__)
 
-# The following queues are only used by MbClient
-f2b_q = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages from the frontend to the backend
-b2f_q = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages to the frontend from the backend
+MAX_QUEUE_SIZE = 20
+BACKEND_QUEUE_SIZE = SETTINGS.backend_queue_size
+CONTROL_QUEUE_SIZE = SETTINGS.control_queue_size
+VALIDATE_MESSAGES = SETTINGS.validate_messages  # check messages made with UnifiedMessage.internal()
+STATION_QUEUE_SIZE = SETTINGS.station_queue_size
+FAIR_QUEUE_QUANTUM = 100  # characters of message credited to a station each round
 
 
 class UiArea(str, Enum):
@@ -63,6 +70,7 @@ class MessageVerb(str, Enum):
     CHG_USER_FREQUENCY = "chg_user_frequency"
     CHG_BLOG = "chg_blog"
     SHUTDOWN = "shutdown"
+    ATTACH = "attach"  # A comms process introducing itself, with the RADIO it serves
 
     # To BACKEND - MB_MSG
     INFORM = "inform"
@@ -85,6 +93,7 @@ class MessageVerb(str, Enum):
     GET_OFFSET = "get_offset"
     GET_CALLSIGN = "get_callsign"
     NO_OP = "no_op"
+    NO_REPLY = "no_reply"  # The request with this TRACE has been dealt with, and gets no reply
 
     NONE = "none"  # A value has not yet been assigned
 
@@ -112,6 +121,9 @@ class MessageParameter(str, Enum):
     OPERATOR = "operator"
     PTT = "ptt"
     RX = "rx"
+    RADIO = "radio"  # The JS8Call instance a message came in on, when the server has more than one
+    TRACE = "trace"  # The request a message belongs to, for latency tracing
+    JOURNAL = "journal"  # The entry for an outbound message in the TX journal
 
 
 # ---- type helpers for IDE autocomplete / linting ----
@@ -133,6 +145,23 @@ VerbLike = Union[MessageVerb, MessageVerbStr, str]
 
 E = TypeVar("E", bound=Enum)
 
+# The string forms accepted for each Enum, in lower case, mapped to the member: the values
+# (e.g. 'comms', 'flash_rx_start') and then the names, so a string is found with one lookup
+_STRING_FORMS: Dict[type, Dict[str, Enum]] = {}
+
+
+def _string_forms(enum_cls: Type[E]) -> Dict[str, E]:
+    forms = _STRING_FORMS.get(enum_cls)
+    if forms is None:
+        forms = {}
+        # Names take precedence over values, as they always have
+        for name, m in enum_cls.__members__.items():
+            forms[name.lower()] = m
+        for m in enum_cls:
+            forms.setdefault(str(m.value).lower(), m)
+        _STRING_FORMS[enum_cls] = forms
+    return cast(Dict[str, E], forms)
+
 
 def _coerce_enum(enum_cls: Type[E], value: Any, *, field: str) -> E:
     """Coerce an input into an Enum member.
@@ -145,20 +174,10 @@ def _coerce_enum(enum_cls: Type[E], value: Any, *, field: str) -> E:
         return value
 
     if isinstance(value, str):
-        s = value.strip()
-
-        # Match by name (preferred because it matches the 'COMMS' style the caller wants).
-        member = enum_cls.__members__.get(s.upper())
+        member = _string_forms(enum_cls).get(value.strip().lower())
         if member is not None:
             return member
 
-        # Match by value (e.g. 'comms', 'request', 'flash_rx_start') case-insensitive
-        s_lower = s.lower()
-        for m in enum_cls:
-            m = cast(E, m)  # help PyCharm: iteration typing for Enum subclasses can be flaky
-            if str(m.value).lower() == s_lower:
-                return m
-
     raise ValueError(
         f"Invalid {field}: {value!r}. Expected one of {[m.name for m in enum_cls]} or their values."
     )
@@ -168,34 +187,41 @@ def _coerce_param_key(key: MessageParameterKey) -> MessageParameter:
     if isinstance(key, MessageParameter):
         return key
     if isinstance(key, str):
-        s = key.strip()
-        member = MessageParameter.__members__.get(s.upper())
+        member = _string_forms(MessageParameter).get(key.strip().lower())
         if member is not None:
             return member
-
-        # match by value
-        s_lower = s.lower()
-        for m in MessageParameter:
-            if m.lower() == s_lower:
-                return cast(MessageParameter, m)  # Yes, this is a MessageParameter; the IDE just needs help.
     raise ValueError(f"Invalid parameter key: {key!r}. Expected one of {[m for m in MessageParameter]}.")
 
 
+# The key each parameter is stored under in UnifiedMessage.params
+_PARAM_KEYS: Dict[MessageParameter, str] = {p: str(p) for p in MessageParameter}
+_STORED_KEYS = frozenset(_PARAM_KEYS.values())
+
+
+def _param_key(key: MessageParameterKey) -> str:
+    # The key a parameter is stored under, given the member, its name or value, or the stored key itself
+    stored = _PARAM_KEYS.get(key)
+    if stored is not None:
+        return stored
+    if key in _STORED_KEYS:
+        return key
+    return _PARAM_KEYS[_coerce_param_key(key)]
+
+_STR_PARAMS = frozenset({
+    MessageParameter.SOURCE, MessageParameter.DESTINATION, MessageParameter.CALLSIGN, MessageParameter.BLOG,
+    MessageParameter.RADIO, MessageParameter.MB_MSG,
+})
+_INT_PARAMS = frozenset({MessageParameter.FREQUENCY, MessageParameter.OFFSET, MessageParameter.TRACE})
+
+
 def _validate_param_value(param: MessageParameter, value: Any) -> Any:
     """Validate and (where helpful) coerce parameter values."""
-    if param in (
-            MessageParameter.SOURCE, MessageParameter.DESTINATION, MessageParameter.CALLSIGN, MessageParameter.BLOG
-    ):
-        if not isinstance(value, str):
-            raise TypeError(f"Parameter '{param.value}' must be a str, got {type(value).__name__}.")
-        return value
-
-    if param is MessageParameter.MB_MSG:
+    if param in _STR_PARAMS:
         if not isinstance(value, str):
             raise TypeError(f"Parameter '{param.value}' must be a str, got {type(value).__name__}.")
         return value
 
-    if param in (MessageParameter.FREQUENCY, MessageParameter.OFFSET):
+    if param in _INT_PARAMS:
         if not isinstance(value, int):
             raise TypeError(f"Parameter '{param.value}' must be an int, got {type(value).__name__}.")
         return value
@@ -241,7 +267,7 @@ class UnifiedMessage:
     __slots__ = ("ts", "priority", "target", "typ", "verb", "params")
 
     def __init__(self, **kwargs: Any):
-        self.ts: float = time.time()
+        self.ts: float = clock.now()
         self.priority: int = 1
         self.target: MessageTarget = MessageTarget.NONE
         self.typ: MessageType = MessageType.NONE
@@ -263,7 +289,7 @@ class UnifiedMessage:
         priority: Optional[int] = None,
         ts: Optional[float] = None,
         **extra: Any,
-    ) -> "UnifiedMessage":
+    ) -> UnifiedMessage:
         """Factory constructor with the same runtime validation as `set_many()`.
 
         This avoids the two-step pattern of constructing a message and then calling
@@ -327,9 +353,50 @@ class UnifiedMessage:
             new_params: Dict[str, Any] = {}
             for k, v in params.items():
                 p = _coerce_param_key(k)
-                new_params[str(p)] = _validate_param_value(p, v)
+                new_params[_PARAM_KEYS[p]] = _validate_param_value(p, v)
             self.params = new_params
 
+    @classmethod
+    def internal(
+        cls,
+        priority: int,
+        target: MessageTarget,
+        typ: MessageType,
+        verb: MessageVerb,
+        params: Optional[Mapping[MessageParameter, Any]] = None,
+    ) -> UnifiedMessage:
+        """Fast constructor for messages made by the server itself.
+
+        Takes Enum members only, with MessageParameter keys, and skips the coercion
+        done by create().  The fields are only checked when validate_messages is set
+        in config.ini, as a development aid.
+        """
+        if VALIDATE_MESSAGES:
+            cls._check_internal(priority, target, typ, verb, params)
+
+        m = cls.__new__(cls)
+        m.ts = clock.now()
+        m.priority = priority
+        m.target = target
+        m.typ = typ
+        m.verb = verb
+        m.params = {_PARAM_KEYS[k]: v for k, v in params.items()} if params else {}
+        return m
+
+    @staticmethod
+    def _check_internal(priority, target, typ, verb, params) -> None:
+        if not isinstance(priority, int):
+            raise TypeError(f"priority must be an int, got {type(priority).__name__}")
+        for field, value, enum_cls in (
+                ("target", target, MessageTarget), ("typ", typ, MessageType), ("verb", verb, MessageVerb)
+        ):
+            if not isinstance(value, enum_cls):
+                raise TypeError(f"{field} must be a {enum_cls.__name__}, got {value!r}")
+        for k, v in (params or {}).items():
+            if not isinstance(k, MessageParameter):
+                raise TypeError(f"Parameter keys must be MessageParameter members, got {k!r}")
+            _validate_param_value(k, v)
+
     # Getters
 
     def get_ts(self) -> float:
@@ -347,12 +414,328 @@ class UnifiedMessage:
     def get_verb(self) -> MessageVerb:
         return self.verb
 
-    def get_param(self, parameter: MessageParameter):
-        try:
-            value = self.params[str(parameter)]
-            return value
-        except KeyError:
-            return None
+    def get_param(self, parameter: MessageParameterKey):
+        return self.params.get(_param_key(parameter))
 
     def get_params(self) -> Dict[str, Any]:
         return self.params
+
+
+class StationQueueStats:
+    __slots__ = ("sent", "dropped", "collapsed", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.collapsed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class FairQueue:
+    """Outbound queue with a sub-queue for each destination station.
+
+    Stations are served by deficit round robin, weighted by message length, so a
+    station with a long run of posts queued takes turns with one that is waiting
+    for a single short reply, and short replies aren't stuck behind long ones.
+
+    Each station may have up to station_size messages waiting; put() drops (and
+    logs) a message beyond that rather than blocking the backend.  A message
+    identical to one already waiting for the same station is collapsed into it, and
+    passed to on_collapsed rather than on_queued.  The get side matches queue.Queue,
+    so the comms driver can use either.
+    """
+
+    def __init__(
+        self, station_size: int = STATION_QUEUE_SIZE, quantum: int = FAIR_QUEUE_QUANTUM, collapse: bool = True
+    ):
+        self.station_size = station_size
+        self.quantum = quantum
+        self.collapse = collapse
+        self.queues: Dict[str, Deque[tuple]] = {}  # destination -> (message, cost, enqueue time)
+        self.active: Deque[str] = deque()  # destinations with something queued, in service order
+        self.deficit: Dict[str, int] = {}
+        self.station_stats: Dict[str, StationQueueStats] = {}
+        self.count = 0
+        self.high_water = 0  # most messages waiting at once, all stations together
+        self.airtime_saved = 0.0  # seconds, estimated, by collapsing duplicates
+        self.on_queued: Optional[Callable[[UnifiedMessage], None]] = None  # e.g. to journal each message queued
+        self.on_collapsed: Optional[Callable[[UnifiedMessage], None]] = None  # e.g. to close what it answers
+        self.not_empty = threading.Condition()
+
+    @staticmethod
+    def _destination(m: UnifiedMessage) -> str:
+        return m.get_param(MessageParameter.DESTINATION) or ""
+
+    @staticmethod
+    def _cost(m: UnifiedMessage) -> int:
+        return len(m.get_param(MessageParameter.MB_MSG) or "") + 1
+
+    def put(self, m: UnifiedMessage, block: bool = True, timeout: Optional[float] = None) -> bool:
+        # block and timeout are accepted for compatibility with queue.Queue; put() never blocks
+        destination = self._destination(m)
+        with self.not_empty:
+            stats = self.station_stats.setdefault(destination, StationQueueStats())
+            q = self.queues.get(destination)
+            if q is None:
+                q = self.queues[destination] = deque()
+
+            text = m.get_param(MessageParameter.MB_MSG)
+            if self.collapse and any(queued.get_param(MessageParameter.MB_MSG) == text for queued, _, _ in q):
+                stats.collapsed += 1
+                self.airtime_saved += estimate_airtime(text or "", SETTINGS.tx_chars_per_frame)
+                logger.info(f"Not queueing a second copy of a reply for {destination}")
+                if self.on_collapsed is not None:
+                    self.on_collapsed(m)
+                return True
+
+            if len(q) >= self.station_size:
+                stats.dropped += 1
+                logger.warning(f"Outbound queue for {destination} is full; dropping a message")
+                return False
+
+            if not q:
+                self.active.append(destination)
+                self.deficit[destination] = 0
+            q.append((m, self._cost(m), clock.now()))
+            self.count += 1
+            self.high_water = max(self.high_water, self.count)
+            if self.on_queued is not None:
+                self.on_queued(m)
+            self.not_empty.notify()
+        return True
+
+    def put_nowait(self, m: UnifiedMessage) -> bool:
+        return self.put(m, block=False)
+
+    def put_back(self, m: UnifiedMessage):
+        # Return a message that get() gave out but that couldn't be sent, so that it is the next
+        # one out.  It isn't passed to on_queued again, and is never dropped or collapsed.
+        destination = self._destination(m)
+        cost = self._cost(m)
+        with self.not_empty:
+            q = self.queues.get(destination)
+            if q is None:
+                q = self.queues[destination] = deque()
+                self.deficit[destination] = 0
+            else:
+                self.active.remove(destination)
+            self.active.appendleft(destination)
+            self.deficit[destination] += cost  # what get() charged for it
+            q.appendleft((m, cost, clock.now()))
+            self.count += 1
+            self.high_water = max(self.high_water, self.count)
+            self.station_stats[destination].sent -= 1  # its wait so far stays in wait_total
+            self.not_empty.notify()
+
+    def _pop(self) -> UnifiedMessage:
+        while True:
+            destination = self.active[0]
+            q = self.queues[destination]
+            m, cost, enqueued = q[0]
+            if self.deficit[destination] < cost:
+                self.deficit[destination] += self.quantum
+                self.active.rotate(-1)
+                continue
+
+            q.popleft()
+            self.deficit[destination] -= cost
+            if not q:
+                # An idle station doesn't bank credit
+                self.active.popleft()
+                del self.queues[destination]
+                del self.deficit[destination]
+            self.count -= 1
+
+            stats = self.station_stats[destination]
+            wait = clock.now() - enqueued
+            stats.sent += 1
+            stats.wait_total += wait
+            stats.wait_max = max(stats.wait_max, wait)
+            return m
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> UnifiedMessage:
+        with self.not_empty:
+            if block and not self.count:
+                self.not_empty.wait_for(lambda: self.count, timeout)
+            if not self.count:
+                raise Empty
+            return self._pop()
+
+    def get_nowait(self) -> UnifiedMessage:
+        return self.get(block=False)
+
+    def task_done(self) -> None:
+        # For compatibility with queue.Queue; nothing waits on completion
+        pass
+
+    def qsize(self) -> int:
+        return self.count
+
+    def empty(self) -> bool:
+        return self.count == 0
+
+    def waiting(self) -> List[str]:
+        # Destinations with something queued, in the order they will next be served
+        with self.not_empty:
+            return list(self.active)
+
+    def stats(self) -> Dict[str, dict]:
+        # Per station: messages waiting and sent, messages dropped or collapsed into an identical
+        # waiting message, and time spent waiting in seconds
+        with self.not_empty:
+            return {
+                destination: {
+                    'queued': len(self.queues.get(destination, ())),
+                    'sent': stats.sent,
+                    'dropped': stats.dropped,
+                    'collapsed': stats.collapsed,
+                    'avg_wait': round(stats.wait_total / stats.sent, 1) if stats.sent else 0.0,
+                    'max_wait': round(stats.wait_max, 1),
+                }
+                for destination, stats in self.station_stats.items()
+            }
+
+
+# Signals that are soon out of date, and so can be dropped when a queue is full
+_DROPPABLE_SIGNALS = frozenset({
+    MessageVerb.NOTE_RX, MessageVerb.NOTE_PTT, MessageVerb.NOTE_FREQ, MessageVerb.NOTE_OFFSET
+})
+# Messages the server can't do without, which are queued even when a queue is full
+_ESSENTIAL_VERBS = frozenset({MessageVerb.NOTE_CALLSIGN, MessageVerb.NOTE_DISCONNECT, MessageVerb.SHUTDOWN})
+
+
+class QueueOverflow:
+    """Capacity and overflow policy of an OverflowQueue, and a count of what it has cost.
+
+    When the queue is full a droppable signal (RX, PTT, frequency or offset) makes
+    room by pushing out the oldest one waiting; failing that, the new signal is the
+    one dropped.  Any other message takes the place of the oldest waiting signal if
+    there is one and is otherwise refused, except for NOTE_CALLSIGN, NOTE_DISCONNECT
+    and SHUTDOWN, which are always queued.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.high_water = 0
+        self.dropped = 0  # signals
+        self.refused = 0
+
+    def make_room(
+        self, items: Deque[UnifiedMessage], m: UnifiedMessage, count_refusal: bool = True
+    ) -> Tuple[bool, int]:
+        # Returns whether m may be queued, and how many waiting messages were dropped to make room.
+        # count_refusal is False while the caller is prepared to wait and try again.
+        if self.capacity <= 0 or len(items) < self.capacity:
+            return True, 0
+
+        for i, queued in enumerate(items):
+            if queued.verb in _DROPPABLE_SIGNALS:
+                del items[i]
+                self.dropped += 1
+                return True, 1
+
+        if m.verb in _DROPPABLE_SIGNALS:
+            self.dropped += 1
+            return False, 0
+        if m.verb in _ESSENTIAL_VERBS:
+            return True, 0
+        if count_refusal:
+            self.refused += 1
+        return False, 0
+
+    def note_depth(self, depth: int):
+        self.high_water = max(self.high_water, depth)
+
+    def stats(self, depth: int) -> dict:
+        return {
+            'queued': depth,
+            'capacity': self.capacity,
+            'high_water': self.high_water,
+            'dropped': self.dropped,
+            'refused': self.refused,
+        }
+
+
+class OverflowQueue(Queue):
+    """A queue.Queue whose put() never blocks.
+
+    A full queue makes room or refuses the message as QueueOverflow decides, and
+    put() returns False if the message wasn't queued.
+    """
+
+    def __init__(self, capacity: int = MAX_QUEUE_SIZE):
+        super().__init__()  # unbounded; capacity is enforced by put()
+        self.overflow = QueueOverflow(capacity)
+
+    def put(self, m: UnifiedMessage, block: bool = True, timeout: Optional[float] = None) -> bool:
+        # block and timeout are accepted for compatibility with queue.Queue
+        with self.mutex:
+            accepted, evicted = self.overflow.make_room(self.queue, m)
+            if accepted:
+                self._put(m)
+                self.unfinished_tasks += 1
+                self.overflow.note_depth(self._qsize())
+                self.not_empty.notify()
+        for _ in range(evicted):
+            self.task_done()
+        return accepted
+
+    def put_nowait(self, m: UnifiedMessage) -> bool:
+        return self.put(m, block=False)
+
+    def put_wait(self, m: UnifiedMessage, timeout: float) -> bool:
+        # As put(), but a message that would be refused waits up to timeout seconds for room.
+        # A droppable signal is never worth waiting for, so it is dropped at once as usual.
+        deadline = time.monotonic() + timeout
+        with self.not_full:
+            while True:
+                remaining = deadline - time.monotonic()
+                accepted, evicted = self.overflow.make_room(self.queue, m, count_refusal=remaining <= 0)
+                if accepted or remaining <= 0 or m.verb in _DROPPABLE_SIGNALS:
+                    break
+                self.not_full.wait(remaining)
+            if accepted:
+                self._put(m)
+                self.unfinished_tasks += 1
+                self.overflow.note_depth(self._qsize())
+                self.not_empty.notify()
+        for _ in range(evicted):
+            self.task_done()
+        return accepted
+
+    def stats(self) -> dict:
+        return self.overflow.stats(self.qsize())
+
+
+class AsyncOverflowQueue(asyncio.Queue):
+    """The asyncio counterpart of OverflowQueue; put() returns at once."""
+
+    def __init__(self, capacity: int = MAX_QUEUE_SIZE):
+        super().__init__()  # unbounded; capacity is enforced by put_nowait()
+        self.overflow = QueueOverflow(capacity)
+
+    async def put(self, m: UnifiedMessage) -> bool:
+        return self.put_nowait(m)
+
+    def put_nowait(self, m: UnifiedMessage) -> bool:
+        # asyncio.Queue keeps its messages in _queue
+        accepted, evicted = self.overflow.make_room(self._queue, m)
+        for _ in range(evicted):
+            self.task_done()
+        if accepted:
+            super().put_nowait(m)
+            self.overflow.note_depth(self.qsize())
+        return accepted
+
+    def stats(self) -> dict:
+        return self.overflow.stats(self.qsize())
+
+
+b2c_q_p0 = OverflowQueue(CONTROL_QUEUE_SIZE)  # queue for messages from the backend to the comms driver
+b2c_q_p1 = FairQueue()  # replies from the backend to the comms driver, shared fairly between stations
+c2b_q = OverflowQueue(BACKEND_QUEUE_SIZE)  # queue for messages to the backend from the comms driver
+
+# The following queues are only used by MbClient
+f2b_q = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages from the frontend to the backend
+b2f_q = Queue(maxsize=MAX_QUEUE_SIZE)  # queue for messages to the frontend from the backend
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import os
+import sys
+import mmap
+import struct
+import logging
+import argparse
+from typing import Dict, Hashable, Optional, Tuple
+
+from .config import SETTINGS
+from .post_index import PostIndex, PostMeta, parse_post_file_name
+
+logger = logging.getLogger(__name__)
+
+# Archive layout (all integers little-endian):
+#   header: magic b"MBAR", format version, number of posts
+#   table:  one fixed size entry per post, in ascending post ID order
+#           post ID, post date (ascii yyyy-mm-dd), offset and length of the file name,
+#           offset and length of the post body
+#   data:   the UTF-8 file names and post bodies the table points to
+_MAGIC = b"MBAR"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_ENTRY = struct.Struct("<q10sQHQI")
+
+
+def pack_posts(posts_dir: str, archive_file: str, remove: bool = False) -> int:
+    """Pack the post files in posts_dir into archive_file and return the number packed.
+
+    Posts already in archive_file are kept, unless a post file has the same ID.
+    The archive is written to a temporary file and moved into place, so a running
+    server never sees a partly written archive.  If remove is True, the packed post
+    files are deleted from posts_dir afterwards; a file not packed because another
+    file has the same post ID is left where it is.
+    """
+    if os.path.exists(archive_file):
+        index = PostArchive(archive_file, posts_dir)
+    else:
+        index = PostIndex(posts_dir)
+    index.build()
+
+    names = []
+    bodies = []
+    packed_files = []
+    for post_id in index.ids:
+        meta = index.by_id[post_id]
+        names.append(f"{meta.listing}.txt".encode("utf-8"))
+        if meta.path is None:
+            bodies.append(index.read_bytes(post_id))
+        else:
+            with open(meta.path, "rb") as f:
+                bodies.append(f.read())
+            packed_files.append(meta.path)
+
+    if isinstance(index, PostArchive):
+        index.close()
+
+    data_start = _HEADER.size + _ENTRY.size * len(index.ids)
+    table = []
+    offset = data_start
+    for post_id, name, body in zip(index.ids, names, bodies):
+        meta = index.by_id[post_id]
+        table.append(_ENTRY.pack(post_id, meta.post_date.encode("ascii"), offset, len(name),
+                                 offset + len(name), len(body)))
+        offset += len(name) + len(body)
+
+    tmp_file = archive_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(table)))
+        f.writelines(table)
+        for name, body in zip(names, bodies):
+            f.write(name)
+            f.write(body)
+    os.replace(tmp_file, archive_file)
+
+    if remove:
+        for path in packed_files:
+            os.remove(path)
+        for post_id in index.scan_report.duplicates:
+            logger.warning(
+                f"Post ID {post_id} is used by more than one file; only {index.by_id[post_id].listing}.txt"
+                f" was packed, and the others are left in {posts_dir}"
+            )
+
+    return len(table)
+
+
+def unpack_posts(archive_file: str, posts_dir: str) -> int:
+    # Write every post in the archive back out as a post file; returns the number written
+    archive = PostArchive(archive_file, posts_dir)
+    archive.open()
+    os.makedirs(posts_dir, exist_ok=True)
+    for post_id, (name, _, _) in archive.entries.items():
+        with open(os.path.join(posts_dir, name), "wb") as f:
+            f.write(archive.read_bytes(post_id))
+    count = len(archive.entries)
+    archive.close()
+    return count
+
+
+class PostArchive(PostIndex):
+    """Post store held in a single memory-mapped archive file.
+
+    The offset table is read once at startup to build the same in-memory index as
+    PostIndex; a GET then decodes one slice of the mapping rather than opening a file.
+
+    Post files in posts_dir are still served and take precedence over an archived
+    post with the same ID, so new posts can be added without repacking the archive.
+    """
+
+    def __init__(self, archive_file: str, posts_dir: str):
+        super().__init__(posts_dir)
+        self.archive_file = archive_file
+        self.entries: Dict[int, Tuple[str, int, int]] = {}  # post ID -> file name, body offset, body length
+        self.archived: Dict[int, PostMeta] = {}
+        self.archive_mtime_ns = 0
+        self.mm: Optional[mmap.mmap] = None
+
+    def open(self) -> None:
+        self.close()
+        self.entries = {}
+        self.archived = {}
+
+        try:
+            f = open(self.archive_file, "rb")
+        except OSError as e:
+            logger.error(f"Unable to open the post archive {self.archive_file}: {e}")
+            return
+
+        with f:
+            self.archive_mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = _HEADER.unpack_from(self.mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            logger.error(f"{self.archive_file} is not a version {_VERSION} post archive")
+            self.close()
+            return
+
+        for post_id, _, name_offset, name_len, body_offset, body_len in _ENTRY.iter_unpack(
+                self.mm[_HEADER.size:_HEADER.size + _ENTRY.size * count]):
+            name = self.mm[name_offset:name_offset + name_len].decode("utf-8")
+            parsed = parse_post_file_name(name)
+            if parsed is None:
+                continue
+            self.entries[post_id] = (name, body_offset, body_len)
+            self.archived[post_id] = PostMeta(post_id, parsed[1], parsed[2], name[:-len(".txt")])
+
+    def build(self) -> None:
+        self.open()
+        by_id, files = self._scan()
+        for post_id, meta in self.archived.items():
+            by_id.setdefault(post_id, meta)
+        self._load(by_id, files)
+        self.scan_report.posts = len(by_id)
+        logger.debug(f"Indexed {len(self.archived)} archived posts and {len(files)} post files")
+
+    def remove_file(self, file_name: str) -> bool:
+        post_id = self.files.get(file_name)
+        removed = super().remove_file(file_name)
+        if removed and post_id not in self.by_id and post_id in self.archived:
+            # The file was overriding an archived post, which is now served again
+            self._link(self.archived[post_id])
+        return removed
+
+    def read_bytes(self, post_id: int) -> bytes:
+        _, offset, length = self.entries[post_id]
+        return self.mm[offset:offset + length]
+
+    def stamp(self, meta: PostMeta) -> Optional[Hashable]:
+        if meta.path is not None:
+            return super().stamp(meta)
+        if meta.post_id not in self.entries:
+            return None
+        return self.archive_file, self.archive_mtime_ns, meta.post_id
+
+    def read(self, meta: PostMeta) -> str:
+        if meta.path is not None:
+            return super().read(meta)
+        if meta.post_id not in self.entries:
+            raise FileNotFoundError(f"Post {meta.post_id} is not in {self.archive_file}")
+        # Match text-mode file reads, which translate \r\n to \n
+        return self.read_bytes(meta.post_id).decode("utf-8").replace("\r\n", "\n")
+
+    def close(self) -> None:
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m mbserver.post_archive",
+                                     description="Pack posts_dir into a post archive, or unpack one.")
+    parser.add_argument("action", choices=["pack", "unpack"])
+    parser.add_argument("--posts-dir", dest="posts_dir", default=SETTINGS.posts_dir,
+                        help="Posts directory. Defaults to config.ini [posts] posts_dir.")
+    parser.add_argument("--archive", dest="archive_file", default=SETTINGS.archive_file,
+                        help="Archive file. Defaults to config.ini [posts] archive_file.")
+    parser.add_argument("--remove", action="store_true",
+                        help="After packing, delete the packed post files from the posts directory.")
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.action == "pack":
+        count = pack_posts(args.posts_dir, args.archive_file, remove=args.remove)
+        print(f"Packed {count} posts from {args.posts_dir} into {args.archive_file}")
+    else:
+        count = unpack_posts(args.archive_file, args.posts_dir)
+        print(f"Unpacked {count} posts from {args.archive_file} into {args.posts_dir}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+import sqlite3
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from .post_index import PostMeta, ScanReport, parse_post_file_name
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id INTEGER PRIMARY KEY,
+    post_date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    body TEXT NOT NULL,
+    source_name TEXT,
+    source_mtime_ns INTEGER,
+    source_size INTEGER,
+    updated_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_by_date ON posts (post_date, post_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (
+    title, body, content='posts', content_rowid='post_id'
+);
+CREATE TRIGGER IF NOT EXISTS posts_ai AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, title, body) VALUES (new.post_id, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_ad AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, title, body) VALUES ('delete', old.post_id, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_au AFTER UPDATE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, title, body) VALUES ('delete', old.post_id, old.title, old.body);
+    INSERT INTO posts_fts (rowid, title, body) VALUES (new.post_id, new.title, new.body);
+END;
+"""
+
+_META_COLUMNS = "post_id, post_date, title, listing"
+
+
+class PostDb:
+    """Post store held in a SQLite database with an FTS5 full text index.
+
+    The database is the store of record.  posts_dir acts as an inbox: post files
+    found there at startup, or added later (see PostWatcher), are imported into the
+    database, replacing any post with the same ID.  Removing a file from posts_dir
+    does not remove the post from the database.
+
+    Offers the same lookups as PostIndex, plus search().
+    """
+
+    def __init__(self, db_file: str, posts_dir: str):
+        self.db_file = db_file
+        self.posts_dir = posts_dir
+        self.files: Dict[str, int] = {}  # names of the files imported from posts_dir, mapped to their ID
+        self.generation = 0
+        self.count = 0
+        self.scan_report = ScanReport()
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self.conn is None:
+            db_dir = os.path.dirname(self.db_file)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self.conn = sqlite3.connect(self.db_file)
+            self.conn.executescript(_SCHEMA)
+        return self.conn
+
+    def _row_to_meta(self, row) -> Optional[PostMeta]:
+        if row is None:
+            return None
+        return PostMeta(row[0], row[1], row[2], row[3])
+
+    def _import_file(self, file_name: str, parsed: Tuple[int, str, str], st: os.stat_result) -> None:
+        post_id, post_date, title = parsed
+        with open(os.path.join(self.posts_dir, file_name)) as f:
+            body = f.read()
+        # An upsert rather than INSERT OR REPLACE, whose delete doesn't fire posts_ad
+        # (SQLite only fires delete triggers for REPLACE with recursive_triggers on), which
+        # would leave the old text in the search index
+        self.conn.execute(
+            "INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (post_id) DO UPDATE SET"
+            " post_date = excluded.post_date, title = excluded.title, listing = excluded.listing,"
+            " body = excluded.body, source_name = excluded.source_name,"
+            " source_mtime_ns = excluded.source_mtime_ns, source_size = excluded.source_size,"
+            " updated_ns = excluded.updated_ns",
+            (post_id, post_date, title, file_name[:-len(".txt")], body,
+             file_name, st.st_mtime_ns, st.st_size, time.time_ns())
+        )
+
+    def build(self) -> None:
+        # Import anything in posts_dir that is new or has changed since it was last imported
+        conn = self._open()
+        imported = {
+            name: (mtime_ns, size) for name, mtime_ns, size in
+            conn.execute("SELECT source_name, source_mtime_ns, source_size FROM posts WHERE source_name IS NOT NULL")
+        }
+
+        try:
+            entries = list(os.scandir(self.posts_dir))
+        except OSError:
+            entries = []
+
+        files: Dict[str, int] = {}
+        first_names: Dict[int, str] = {}
+        report = ScanReport()
+        changes = 0
+        for entry in sorted(entries, key=lambda e: e.name):
+            parsed = parse_post_file_name(entry.name)
+            if parsed is None:
+                report.note_malformed(entry.name)
+                continue
+            files[entry.name] = parsed[0]
+            if parsed[0] in first_names:
+                report.note_duplicate(parsed[0], first_names[parsed[0]], entry.name)
+            else:
+                first_names[parsed[0]] = entry.name
+            st = entry.stat()
+            if imported.get(entry.name) != (st.st_mtime_ns, st.st_size):
+                self._import_file(entry.name, parsed, st)
+                changes += 1
+
+        conn.commit()
+        self.files = files
+        self.count = conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        self.generation += 1
+        report.posts = self.count
+        self.scan_report = report
+
+        logger.info(f"Imported {changes} posts from {self.posts_dir} into {self.db_file}")
+
+    def add_file(self, file_name: str) -> bool:
+        parsed = parse_post_file_name(file_name)
+        if parsed is None:
+            return False
+
+        try:
+            st = os.stat(os.path.join(self.posts_dir, file_name))
+            self._open()
+            self._import_file(file_name, parsed, st)
+        except OSError as e:
+            logger.error(f"Unable to import {file_name}: {e}")
+            return False
+
+        self.conn.commit()
+        self.files[file_name] = parsed[0]
+        self.count = self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        self.generation += 1
+        logger.debug(f"Imported {file_name} into the post database")
+        return True
+
+    def remove_file(self, file_name: str) -> bool:
+        # The database is the store of record, so the post stays
+        return self.files.pop(file_name, None) is not None
+
+    def get(self, post_id: int) -> Optional[PostMeta]:
+        row = self._open().execute(f"SELECT {_META_COLUMNS} FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+        return self._row_to_meta(row)
+
+    def recent(self, limit: int) -> List[int]:
+        # Most recent first
+        if limit <= 0:
+            return []
+        rows = self._open().execute("SELECT post_id FROM posts ORDER BY post_id DESC LIMIT ?", (limit,))
+        return [row[0] for row in rows]
+
+    def latest(self) -> Optional[PostMeta]:
+        row = self._open().execute(f"SELECT {_META_COLUMNS} FROM posts ORDER BY post_id DESC LIMIT 1").fetchone()
+        return self._row_to_meta(row)
+
+    def ids_for_date(self, date: str) -> List[int]:
+        return self.ids_for_date_range(date, date)
+
+    def ids_for_date_range(self, date_from: str, date_to: str) -> List[int]:
+        # Dates are inclusive; most recent first
+        rows = self._open().execute(
+            "SELECT post_id FROM posts WHERE post_date BETWEEN ? AND ? ORDER BY post_date DESC, post_id DESC",
+            (date_from, date_to)
+        )
+        return [row[0] for row in rows]
+
+    def stamp(self, meta: PostMeta) -> Optional[int]:
+        row = self._open().execute("SELECT updated_ns FROM posts WHERE post_id = ?", (meta.post_id,)).fetchone()
+        return row[0] if row else None
+
+    def read(self, meta: PostMeta) -> str:
+        row = self._open().execute("SELECT body FROM posts WHERE post_id = ?", (meta.post_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Post {meta.post_id} is not in {self.db_file}")
+        return row[0]
+
+    def search(self, text: str, limit: int) -> Optional[List[int]]:
+        # Every word must appear in the title or body; most recent first
+        words = re.findall(r"\w+", text)
+        if not words or limit <= 0:
+            return []
+        query = " ".join(f'"{word}"' for word in words)
+        rows = self._open().execute(
+            "SELECT rowid FROM posts_fts WHERE posts_fts MATCH ? ORDER BY rowid DESC LIMIT ?",
+            (query, limit)
+        )
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
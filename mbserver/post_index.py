@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import os
+import re
+import bisect
+import logging
+from datetime import date
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+POST_FILE_EXP = re.compile(r"^(\d+) - (\d{4}-\d{2}-\d{2}) - ([\S\s]+)\.txt$")
+INFO_FILE = "info.txt"
+
+
+@dataclass(frozen=True)
+class PostMeta:
+    post_id: int
+    post_date: str  # yyyy-mm-dd
+    title: str
+    listing: str  # the listing line sent on air, i.e. the file name without the .txt extension
+    path: Optional[str] = None  # None where the post isn't held as a file
+
+
+@dataclass
+class ScanReport:
+    # What the last full scan of posts_dir found
+    posts: int = 0
+    malformed: List[str] = field(default_factory=list)  # .txt files that aren't valid post file names
+    duplicates: Dict[int, List[str]] = field(default_factory=dict)  # post ID -> every file with that ID
+
+    def note_malformed(self, file_name: str) -> None:
+        # Other files, such as info.txt, are expected in posts_dir
+        if file_name.endswith(".txt") and file_name != INFO_FILE:
+            self.malformed.append(file_name)
+
+    def note_duplicate(self, post_id: int, first_name: str, file_name: str) -> None:
+        self.duplicates.setdefault(post_id, [first_name]).append(file_name)
+
+    def log(self, posts_dir: str) -> None:
+        for file_name in self.malformed:
+            logger.warning(f"Ignoring {file_name} in {posts_dir}: not a valid post file name")
+        for post_id, names in self.duplicates.items():
+            serving = max(names)
+            ignoring = ", ".join(name for name in sorted(names) if name != serving)
+            logger.warning(f"Post ID {post_id} is used by more than one file; serving {serving}, ignoring {ignoring}")
+
+
+def parse_post_file_name(file_name: str) -> Optional[Tuple[int, str, str]]:
+    # Returns None unless the name is a valid post file name with a real date
+    result = POST_FILE_EXP.match(file_name)
+    if result is None:
+        return None
+    try:
+        date.fromisoformat(result.group(2))
+    except ValueError:
+        return None
+    return int(result.group(1)), result.group(2), result.group(3)
+
+
+class PostIndex:
+    """In-memory index of the posts directory.
+
+    The directory is scanned once, then every lookup is served from memory:
+      - by_id maps the post ID to its PostMeta
+      - ids holds the post IDs in ascending order (recency)
+      - by_date maps each post date to the IDs of the posts on that date, in ascending order
+      - dates holds the post dates that have at least one post, in ascending order
+
+    After the initial scan the index is kept up to date one file at a time through
+    add_file() and remove_file(), which are driven by the PostWatcher.
+
+    generation is bumped whenever the set of posts changes, so callers can cheaply
+    tell whether anything they derived from the index is still current.
+    """
+
+    def __init__(self, posts_dir: str):
+        self.posts_dir = posts_dir
+        self.by_id: Dict[int, PostMeta] = {}
+        self.ids: List[int] = []
+        self.by_date: Dict[str, List[int]] = {}
+        self.dates: List[str] = []
+        self.files: Dict[str, int] = {}  # every post file name, including duplicates, mapped to its ID
+        self.is_built = False
+        self.generation = 0
+        self.scan_report = ScanReport()
+
+    def _meta(self, file_name: str, parsed: Tuple[int, str, str]) -> PostMeta:
+        post_id, post_date, title = parsed
+        # A plain string path; building a Path for every post dominates the startup scan of a large blog
+        return PostMeta(post_id, post_date, title, file_name[:-len(".txt")], os.path.join(self.posts_dir, file_name))
+
+    def _scan(self) -> Tuple[Dict[int, PostMeta], Dict[str, int]]:
+        by_id: Dict[int, PostMeta] = {}
+        files: Dict[str, int] = {}
+        report = ScanReport()
+
+        try:
+            entries = list(os.scandir(self.posts_dir))
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            parsed = parse_post_file_name(entry.name)
+            if parsed is None:
+                report.note_malformed(entry.name)
+                continue
+            post_id = parsed[0]
+            files[entry.name] = post_id
+            current = by_id.get(post_id)
+            if current is not None:
+                report.note_duplicate(post_id, f"{current.listing}.txt", entry.name)
+            # Where two files share an ID, keep the one that sorts last, as the old glob lookup did.
+            if current is None or entry.name[:-len(".txt")] > current.listing:
+                by_id[post_id] = self._meta(entry.name, parsed)
+
+        report.posts = len(by_id)
+        self.scan_report = report
+        return by_id, files
+
+    def _load(self, by_id: Dict[int, PostMeta], files: Dict[str, int]) -> None:
+        self.by_id = by_id
+        self.files = files
+        self.ids = sorted(by_id)
+        self.by_date = {}
+        for post_id in self.ids:
+            self.by_date.setdefault(by_id[post_id].post_date, []).append(post_id)
+        self.dates = sorted(self.by_date)
+        self.is_built = True
+        self.generation += 1
+
+    def build(self) -> None:
+        self._load(*self._scan())
+        logger.debug(f"Indexed {len(self.by_id)} posts in {self.posts_dir}")
+
+    def _ensure_built(self) -> None:
+        if not self.is_built:
+            self.build()
+
+    def _unlink(self, meta: PostMeta) -> None:
+        del self.by_id[meta.post_id]
+        i = bisect.bisect_left(self.ids, meta.post_id)
+        del self.ids[i]
+        bucket = self.by_date[meta.post_date]
+        del bucket[bisect.bisect_left(bucket, meta.post_id)]
+        if not bucket:
+            del self.by_date[meta.post_date]
+            del self.dates[bisect.bisect_left(self.dates, meta.post_date)]
+        self.generation += 1
+
+    def _link(self, meta: PostMeta) -> None:
+        self.by_id[meta.post_id] = meta
+        bisect.insort(self.ids, meta.post_id)
+        bucket = self.by_date.get(meta.post_date)
+        if bucket is None:
+            bucket = self.by_date[meta.post_date] = []
+            bisect.insort(self.dates, meta.post_date)
+        bisect.insort(bucket, meta.post_id)
+        self.generation += 1
+
+    def add_file(self, file_name: str) -> bool:
+        # Returns True if the file is a post file and the index has been updated
+        self._ensure_built()
+        parsed = parse_post_file_name(file_name)
+        if parsed is None or file_name in self.files:
+            return False
+
+        post_id = parsed[0]
+        self.files[file_name] = post_id
+        current = self.by_id.get(post_id)
+        if current is not None:
+            if current.path is not None and file_name[:-len(".txt")] < current.listing:
+                return False  # shadowed by an existing file with the same ID
+            self._unlink(current)
+
+        self._link(self._meta(file_name, parsed))
+        logger.debug(f"Added {file_name} to the post index")
+        return True
+
+    def remove_file(self, file_name: str) -> bool:
+        # Returns True if the file was in the index
+        self._ensure_built()
+        post_id = self.files.pop(file_name, None)
+        if post_id is None:
+            return False
+
+        current = self.by_id.get(post_id)
+        if current is not None and current.path is not None and current.listing == file_name[:-len(".txt")]:
+            self._unlink(current)
+            # Promote any file the removed one was shadowing
+            others = [name for name, i in self.files.items() if i == post_id]
+            if others:
+                name = max(others)
+                self._link(self._meta(name, parse_post_file_name(name)))
+
+        logger.debug(f"Removed {file_name} from the post index")
+        return True
+
+    def get(self, post_id: int) -> Optional[PostMeta]:
+        self._ensure_built()
+        return self.by_id.get(post_id)
+
+    def recent(self, limit: int) -> List[int]:
+        # Most recent first
+        self._ensure_built()
+        if limit <= 0:
+            return []
+        return self.ids[:-limit - 1:-1]
+
+    def latest(self) -> Optional[PostMeta]:
+        self._ensure_built()
+        if not self.ids:
+            return None
+        return self.by_id[self.ids[-1]]
+
+    def ids_for_date(self, date: str) -> List[int]:
+        # Most recent first
+        self._ensure_built()
+        return self.by_date.get(date, [])[::-1]
+
+    def ids_for_date_range(self, date_from: str, date_to: str) -> List[int]:
+        # Dates are inclusive; most recent first
+        self._ensure_built()
+        lo = bisect.bisect_left(self.dates, date_from)
+        hi = bisect.bisect_right(self.dates, date_to)
+        id_list = []
+        for date in reversed(self.dates[lo:hi]):
+            id_list.extend(reversed(self.by_date[date]))
+        return id_list
+
+    @staticmethod
+    def stamp(meta: PostMeta) -> Optional[Tuple[str, int, int]]:
+        # Changes whenever the post content may have changed; None if the post has gone
+        try:
+            st = os.stat(meta.path)
+        except OSError:
+            return None
+        return meta.path, st.st_mtime_ns, st.st_size
+
+    @staticmethod
+    def read(meta: PostMeta) -> str:
+        with open(meta.path) as f:
+            return f.read()
+
+    @staticmethod
+    def search(text: str, limit: int) -> Optional[List[int]]:
+        # Full text search needs the sqlite store
+        return None
+
+    def __len__(self) -> int:
+        return len(self.by_id)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import logging
+from typing import Union
+
+from .config import SETTINGS
+from .post_archive import PostArchive
+from .post_db import PostDb
+from .post_index import PostIndex
+
+logger = logging.getLogger(__name__)
+
+# Every store offers the same lookups:
+#   build(), add_file(), remove_file(), get(), recent(), latest(), ids_for_date(),
+#   ids_for_date_range(), stamp(), read(), search(), len() and a generation counter
+# that changes whenever the set of posts changes.
+PostStore = Union[PostIndex, PostArchive, PostDb]
+
+
+def open_post_store(store: str) -> PostStore:
+    if store == "sqlite":
+        return PostDb(SETTINGS.db_file, SETTINGS.posts_dir)
+
+    if store == "archive":
+        return PostArchive(SETTINGS.archive_file, SETTINGS.posts_dir)
+
+    if store != "directory":
+        logger.warning(f"Unknown post store {store!r} in config.ini; using the posts directory")
+
+    return PostIndex(SETTINGS.posts_dir)
+
+
+post_store: PostStore = open_post_store(SETTINGS.post_store)
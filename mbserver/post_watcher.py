@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+import sys
+import struct
+import ctypes
+import ctypes.util
+import logging
+from typing import Dict, Optional
+
+from . import clock
+from .post_store import PostStore
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class PostWatcher:
+    """Keep a post store in step with the posts directory.
+
+    On Linux the watcher uses inotify, so poll() only has to drain pending events.
+    Elsewhere it falls back to scanning the directory every poll_interval seconds
+    and comparing each file's mtime with the last scan, so posts edited in place are
+    picked up as well as posts added and removed (editing a file doesn't change the
+    directory's mtime).
+
+    poll() never blocks and is called from the backend loop, so the index is only
+    ever touched by one thread.
+    """
+
+    def __init__(self, index: PostStore, poll_interval: float = 5.0):
+        self.index = index
+        self.poll_interval = poll_interval
+        self.next_poll: float = 0.0
+        self.file_mtimes: Dict[str, int] = {}  # file name -> mtime_ns, as of the last scan
+        self.inotify_fd: Optional[int] = None
+
+    def start(self):
+        self.index.build()
+        self.file_mtimes = self._scan()  # also needed if inotify fails later
+
+        if sys.platform.startswith("linux"):
+            self.inotify_fd = self._inotify_open(self.index.posts_dir)
+
+        if self.inotify_fd is None:
+            logger.info(f"Watching {self.index.posts_dir} for changes every {self.poll_interval}s")
+        else:
+            logger.info(f"Watching {self.index.posts_dir} for changes using inotify")
+
+    @staticmethod
+    def _inotify_open(path: str) -> Optional[int]:
+        # noinspection PyBroadException
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+            if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except Exception:
+            return None
+
+    def _scan(self) -> Dict[str, int]:
+        mtimes = {}
+        try:
+            with os.scandir(self.index.posts_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            mtimes[entry.name] = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return mtimes
+
+    def poll(self):
+        if self.inotify_fd is not None:
+            self._poll_inotify()
+        elif clock.now() >= self.next_poll:
+            self.next_poll = clock.now() + self.poll_interval
+            self._poll_mtime()
+
+    def _poll_inotify(self):
+        try:
+            data = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.error(f"inotify read failed ({e}); falling back to polling")
+            self.close()
+            return
+
+        pos = 0
+        while pos < len(data):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = os.fsdecode(data[pos:pos + name_len].rstrip(b"\0"))
+            pos += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed; rebuilding the post index")
+                self.index.build()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                logger.warning(f"{self.index.posts_dir} has been removed or moved; falling back to polling")
+                self.close()
+                return
+            elif mask & IN_ISDIR:
+                continue
+            elif mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE):
+                # A file that has been written is passed on again, so the sqlite store imports its content
+                self.index.add_file(name)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.index.remove_file(name)
+
+    def _poll_mtime(self):
+        mtimes = self._scan()
+        for name in set(self.index.files) - mtimes.keys():
+            self.index.remove_file(name)
+        for name, mtime_ns in mtimes.items():
+            if self.file_mtimes.get(name) != mtime_ns:
+                # New or written since the last scan; passed on again, so the sqlite store imports its content
+                self.index.add_file(name)
+        self.file_mtimes = mtimes
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
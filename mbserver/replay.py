@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+# Replay hours of net traffic through the server in seconds, on a simulated clock.
+#
+#   python -m mbserver.replay --hours 24 --stations 20 --interval 300 --seed 1
+#
+# The backend and a comms driver run in this one thread, exactly as in the server,
+# but the driver talks to an in-memory JS8Call instead of a socket.  Simulated stations
+# send requests, each reply is "transmitted" with RIG.PTT events timed as JS8Call would
+# send it, and the clock jumps from one event to the next: an arriving request, a PTT
+# change, a held reply becoming free to go, the RX indicator or an announcement
+# falling due.  The same seed gives the same results on every run.
+
+import sys
+import json
+import heapq
+import itertools
+import logging
+import argparse
+import time
+from typing import Callable, List, Optional, Tuple
+
+from . import clock
+from .clock import SimulatedClock
+from .config import SETTINGS
+from .logging_setup import configure_logging
+from .js8call_driver import Js8CallApi
+from .js8call_sim import Js8CallSimulator, load_script
+from .latency_trace import tracer
+from .mb_server import MbServer, send_to_comms
+from .message_q import c2b_q
+from .tx_scheduler import DEFAULT_SPEED, FRAME_SECONDS, TX_DUTY
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayApi(Js8CallApi):
+    """Js8CallApi that hands each message to a function instead of a socket."""
+
+    def __init__(self, deliver: Callable[[dict], None]):
+        super().__init__()
+        self.sock.close()
+        self.deliver = deliver
+
+    def connect(self) -> bool:
+        return True
+
+    def listen(self):
+        return []
+
+    def send(self, *args, **kwargs):
+        mb_msg = self.frame(*args, **kwargs)
+        if mb_msg is not None:
+            self.deliver(json.loads(mb_msg))
+
+    def close(self):
+        pass
+
+
+class Replay:
+
+    def __init__(self, sim: Js8CallSimulator, hours: float):
+        self.sim = sim
+        self.end = clock.now() + hours * 3600
+        self.events: List[Tuple[float, int, Callable[[], None]]] = []
+        self.sequence = itertools.count()  # keeps events at the same time in the order they were made
+        self.tx_free_at = 0.0  # when the simulated transmitter finishes what it has been given
+
+        self.server = MbServer(((sim.callsign, "replay", 0),))
+        self.radio = next(iter(self.server.radios.values()))
+        self.comms = self.radio.comms
+        self.comms.js8call_api = ReplayApi(self.from_driver)
+
+    def at(self, when: float, action: Callable[[], None]):
+        heapq.heappush(self.events, (when, next(self.sequence), action))
+
+    def to_driver(self, message: dict):
+        self.comms.handle_js8call_message(message)
+
+    def from_driver(self, message: dict):
+        # The simulated JS8Call's side of the API
+        typ = message["type"]
+        now = clock.now()
+        if typ == "STATION.GET_CALLSIGN":
+            self.at(now, lambda: self.to_driver({"type": "STATION.CALLSIGN", "value": self.sim.callsign}))
+        elif typ == "RIG.GET_FREQ":
+            params = {"DIAL": self.sim.dial, "OFFSET": self.sim.offset}
+            self.at(now, lambda: self.to_driver({"type": "RIG.FREQ", "value": "", "params": params}))
+        elif typ == "MODE.GET_SPEED":
+            params = {"SPEED": self.sim.speed}
+            self.at(now, lambda: self.to_driver({"type": "MODE.SPEED", "value": "", "params": params}))
+        elif typ == "TX.SEND_MESSAGE":
+            self.transmit(message["value"])
+
+    def transmit(self, text: str):
+        # Frames start on cycle boundaries, after anything already being sent
+        requests = self.sim.match_reply(text)
+        frame_seconds = self.sim.frame_seconds
+        start = (max(clock.now(), self.tx_free_at) // frame_seconds + 1) * frame_seconds
+        frames = self.sim.frames(text)
+        for frame in range(frames):
+            on = start + frame * frame_seconds
+            self.at(on, lambda: self.to_driver({"type": "RIG.PTT", "value": "on"}))
+            self.at(on + frame_seconds * TX_DUTY, lambda: self.to_driver({"type": "RIG.PTT", "value": "off"}))
+        self.tx_free_at = start + frames * frame_seconds
+        airtime = frames * frame_seconds * TX_DUTY
+        self.at(self.tx_free_at - frame_seconds * (1 - TX_DUTY), lambda: self.sim.note_sent(requests, airtime))
+
+    def schedule_traffic(self, script: Optional[List[Tuple[float, str, str]]], interval: float):
+        start = clock.now()
+        if script is not None:
+            for offset, station, cmd in script:
+                self.at(start + offset, lambda s=station, c=cmd: self.to_driver(self.sim.rx_directed(s, c)))
+            return
+
+        if not self.sim.stations:
+            return
+        when = start
+        while True:
+            when += self.sim.random.expovariate(1 / interval)
+            if when >= self.end:
+                return
+            station, cmd = self.sim.random.choice(self.sim.stations), self.sim.random_request()
+            self.at(when, lambda s=station, c=cmd: self.to_driver(self.sim.rx_directed(s, c)))
+
+    def pump(self):
+        # Let the backend and the driver deal with everything they can at this moment
+        busy = True
+        while busy:
+            busy = False
+            while not c2b_q.empty():
+                m = c2b_q.get_nowait()
+                radio = self.server.radio_for(m)
+                for m_out in self.server.handle_comms_message(radio, m):
+                    send_to_comms(m_out, radio)
+                busy = True
+
+            announcements = self.server.due_announcements()
+            for radio, m in announcements:
+                send_to_comms(m, radio)
+            busy = busy or bool(announcements)
+
+            self.comms.check_rx_indicator()
+
+            while not self.comms.b2c_q_p0.empty() or \
+                    (not self.comms.b2c_q_p1.empty() and self.comms.tx_scheduler.release_time() <= clock.now()):
+                self.comms.process_tx_q()
+                busy = True
+
+    def next_wakeup(self) -> float:
+        times = [self.end]
+        if self.events:
+            times.append(self.events[0][0])
+        if not self.comms.b2c_q_p1.empty():
+            times.append(self.comms.tx_scheduler.release_time())
+        if self.comms.rx_ind_timeout > 0:
+            times.append(self.comms.rx_ind_timeout)
+        for radio in self.server.radios.values():
+            if SETTINGS.announce and radio.mb_announcement is not None:
+                times.append(radio.mb_announcement.next_announcement)
+        # The server compares times with >, so wake just after
+        return min(times) + 1e-6
+
+    def run(self):
+        self.comms.on_link_up()
+        while clock.now() < self.end:
+            while self.events and self.events[0][0] <= clock.now():
+                _, _, action = heapq.heappop(self.events)
+                action()
+                self.pump()
+            self.pump()
+            clock.get_clock().advance_to(self.next_wakeup())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m mbserver.replay",
+                                     description="Replay simulated net traffic through the server on a "
+                                                 "simulated clock, and report request latency and airtime.")
+    parser.add_argument("--hours", type=float, default=24.0, help="Simulated hours to run.")
+    parser.add_argument("--callsign", default="M0SIM", help="Callsign of the simulated station.")
+    parser.add_argument("--speed", type=int, default=DEFAULT_SPEED, choices=sorted(FRAME_SECONDS),
+                        help="JS8Call speed mode: 0 Normal, 1 Fast, 2 Turbo, 4 Slow, 8 Ultra.")
+    parser.add_argument("--chars-per-frame", dest="chars_per_frame", type=float, default=16.0,
+                        help="Message characters sent in each simulated frame.")
+    parser.add_argument("--stations", type=int, default=10, help="Number of virtual stations sending requests.")
+    parser.add_argument("--interval", type=float, default=300.0,
+                        help="Average seconds between requests, across all stations.")
+    parser.add_argument("--max-post-id", dest="max_post_id", type=int, default=10,
+                        help="Random requests ask for post IDs from 1 up to this.")
+    parser.add_argument("--script", default=None,
+                        help="File of requests to send instead of random ones; each line is "
+                             "<seconds from the start> <station> <request>.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed.")
+    parser.add_argument("--give-up", dest="give_up", type=float, default=3600.0,
+                        help="Seconds a station waits for a reply before the request counts as unanswered.")
+    parser.add_argument("--record", default=None,
+                        help="Write each request and its latencies to this file as JSON lines.")
+    parser.add_argument("--log-level", dest="log_level", default="WARNING",
+                        help="Logging level for the server and the replay. Defaults to WARNING.")
+    args = parser.parse_args(sys.argv[1:])
+
+    configure_logging(level=getattr(logging, args.log_level.upper(), logging.WARNING), console=True)
+
+    clock.use_clock(SimulatedClock())
+    sim = Js8CallSimulator(
+        args.callsign, 7078000, 1500, args.speed, args.chars_per_frame,
+        args.stations, args.interval, args.max_post_id, seed=args.seed, give_up=args.give_up
+    )
+    replay = Replay(sim, args.hours)
+    replay.schedule_traffic(load_script(args.script) if args.script else None, args.interval)
+
+    started = time.perf_counter()
+    post_watcher = replay.server.warm_up()
+    replay.run()
+    post_watcher.close()
+
+    if args.record:
+        with open(args.record, "w") as f:
+            for request in sim.requests:
+                f.write(json.dumps(request.record()) + "\n")
+    report = sim.report()
+    report['server_spans_s'] = tracer.summary()
+    report['wall_clock_s'] = round(time.perf_counter() - started, 2)
+    print(json.dumps(report, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+from . import clock
+
+
+class RequestDedup:
+    """Drop a request that repeats one from the same station within window seconds.
+
+    Operators often resend a request when no reply has come yet, and relays can
+    deliver the same directed message more than once.  The reply to the first copy
+    is already queued or on air, so later copies are dropped rather than answered
+    again.  A window of 0 turns this off.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.seen: Dict[Tuple[str, str], float] = {}  # (source, cmd) -> when the request was first answered
+        self.dropped = 0
+        self.airtime_saved = 0.0  # seconds, estimated
+
+    def is_duplicate(self, source: str, cmd: str, now: Optional[float] = None) -> bool:
+        if self.window <= 0:
+            return False
+
+        now = clock.now() if now is None else now
+        if len(self.seen) > 256:
+            self.seen = {key: at for key, at in self.seen.items() if now - at < self.window}
+
+        at = self.seen.get((source, cmd))
+        if at is not None and now - at < self.window:
+            return True
+
+        self.seen[(source, cmd)] = now
+        return False
+
+    def note_dropped(self, airtime: float):
+        self.dropped += 1
+        self.airtime_saved += airtime
+
+    def stats(self) -> dict:
+        return {'dropped': self.dropped, 'airtime_saved_s': round(self.airtime_saved)}
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import re
+from typing import List, Optional, TypedDict
+
+
+class MbRequest(TypedDict, total=False):
+    cmd: str  # the request in API form, e.g. 'E6,10,12~' (CLI requests are translated)
+    verb: str  # LIST, GET, INFO or SEARCH
+    by: str  # ID, DATE, DATE_RANGE, DAYS or TEXT
+    id_list: Optional[List[int]]
+    date: str
+    date_from: str
+    date_to: str
+    days: int
+    text: str
+
+
+# One pattern covers every CLI (M.x) and API (x~) request.  The named group that
+# matched tells us the request type, so a request is parsed in a single match.
+_DATE = r"\d{4}-\d{2}-\d{2}"
+
+REQUEST_EXP = re.compile(
+    rf"""
+    M\.(?:
+        [EL](?:\ +(?:
+            (?P<cli_from>{_DATE})\ +(?P<cli_to>{_DATE})
+            | (?P<cli_date>{_DATE})
+            | (?P<cli_days>\d+)D
+            | (?P<cli_id>\d+)
+        ))?(?P<cli_list>)
+        | G\ +(?P<cli_get>\d+)
+        | WX(?P<cli_wx>)
+        | S\ +(?P<cli_text>[^~]+)
+        | [I?](?P<cli_info>)
+    )$
+    | E(?:
+        (?P<date_from>{_DATE})/(?P<date_to>{_DATE})
+        | (?P<date>{_DATE})
+        | (?P<days>\d+)D
+        | (?P<ids>\d+(?:,\d+)*)
+    )?~(?P<list>)
+    | G(?P<get>\d+)~
+    | I~(?P<info>)
+    | S(?P<text>[^~]+)~  # up to the first ~, as anything after it is ignored
+    """,
+    re.VERBOSE,
+)
+
+REQUEST_COMPONENTS_EXP = re.compile(r"^([A-Z0-9]+): *([A-Z0-9]+) *([\S ]*)$")
+
+
+def _list_request(cmd: str, date_from, date_to, date, days, ids) -> MbRequest:
+    if date_from is not None:
+        return {'cmd': cmd, 'verb': 'LIST', 'by': 'DATE_RANGE', 'date_from': date_from, 'date_to': date_to}
+    if date is not None:
+        return {'cmd': cmd, 'verb': 'LIST', 'by': 'DATE', 'date': date}
+    if days is not None:
+        return {'cmd': cmd, 'verb': 'LIST', 'by': 'DAYS', 'days': int(days)}
+    id_list = [int(i) for i in ids.split(',')] if ids else []
+    return {'cmd': cmd, 'verb': 'LIST', 'by': 'ID', 'id_list': id_list}
+
+
+def parse_request(mb_cmd: str) -> MbRequest:
+    """Parse a CLI or API request into an MbRequest; returns {} if it isn't a valid request.
+
+    API requests only need to start with a valid command; anything after the ~ is ignored.
+    CLI requests must match in full.
+    """
+    m = REQUEST_EXP.match(mb_cmd)
+    if m is None:
+        return {}
+
+    g = m.groupdict()
+
+    # API forms
+    if g['list'] is not None:
+        return _list_request(mb_cmd, g['date_from'], g['date_to'], g['date'], g['days'], g['ids'])
+    if g['get'] is not None:
+        return {'cmd': mb_cmd, 'verb': 'GET', 'by': 'ID', 'id_list': [int(g['get'])]}
+    if g['info'] is not None:
+        return {'cmd': mb_cmd, 'verb': 'INFO', 'by': 'ID', 'id_list': []}
+    if g['text'] is not None:
+        return {'cmd': mb_cmd, 'verb': 'SEARCH', 'by': 'TEXT', 'text': g['text'].strip()}
+
+    # CLI forms, which are given the cmd of the equivalent API request
+    if g['cli_list'] is not None:
+        if g['cli_from'] is not None:
+            cmd = f"E{g['cli_from']}/{g['cli_to']}~"
+        elif g['cli_date'] is not None:
+            cmd = f"E{g['cli_date']}~"
+        elif g['cli_days'] is not None:
+            cmd = f"E{g['cli_days']}D~"
+        elif g['cli_id'] is not None:
+            cmd = f"E{g['cli_id']}~"
+        else:
+            cmd = "E~"
+        return _list_request(cmd, g['cli_from'], g['cli_to'], g['cli_date'], g['cli_days'], g['cli_id'])
+    if g['cli_get'] is not None:
+        return {'cmd': f"G{g['cli_get']}~", 'verb': 'GET', 'by': 'ID', 'id_list': [int(g['cli_get'])]}
+    if g['cli_wx'] is not None:
+        return {'cmd': "G0~", 'verb': 'GET', 'by': 'ID', 'id_list': [0]}
+    if g['cli_text'] is not None:
+        return {'cmd': f"S{g['cli_text']}~", 'verb': 'SEARCH', 'by': 'TEXT', 'text': g['cli_text'].strip()}
+
+    return {'cmd': "I~", 'verb': 'INFO', 'by': 'ID', 'id_list': []}
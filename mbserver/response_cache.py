@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import logging
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(req: dict) -> Tuple:
+    # Requests that resolve to the same verb and post IDs get the same response,
+    # e.g. M.E, E~ and E12,11,10,9,8~ when 12 is the latest post.
+    if req['verb'] == 'INFO':
+        return ('INFO',)
+    if req['by'] == 'DAYS':
+        # E7D~ covers different dates tomorrow, so it is keyed by the dates it covers today
+        return (req['verb'], req['cmd'], req['date_from'], req['date_to'], tuple(req['id_list']))
+    if req['by'] != 'ID':
+        # Listings by date and searches reply with the command itself
+        return (req['verb'], req['cmd'], tuple(req['id_list'] or ()))
+    return (req['verb'], tuple(req['id_list']))
+
+
+def file_stamp(path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ResponseCache:
+    """LRU cache of finished response lists, keyed by the normalised request.
+
+    Each entry is stored with a validator describing everything the response was
+    built from (post index generation, settings, source file stamp).  A lookup with
+    a different validator is a miss, and the stale entry is replaced on put().
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Tuple, Tuple[Hashable, List[str]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple, validator: Hashable) -> Optional[List[str]]:
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == validator:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, validator: Hashable, response: List[str]) -> None:
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (validator, list(response))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import re
+from typing import List
+
+# A LIST response is one header line, e.g. +E12~ or -E12~, and one listing line
+LIST_RESPONSE_EXP = re.compile(r"^[+-]E\d+~\n[^\n]*$")
+
+
+def pack_responses(responses: List[str], max_chars: int) -> List[str]:
+    """Merge LIST responses into as few messages as max_chars allows.
+
+    A packed message is simply the responses one after another, each still
+    starting with its own +En~ or -En~ header line:
+
+        +E6~
+        6 - 2026-01-25 - Road closures
+        -E10~
+        NO POSTS FOUND
+        +E12~
+        12 - 2026-01-27 - Water point open
+
+    so a client splits it before every line that matches [+-]E<digits>~.
+    Every other response, and any single response longer than max_chars, is sent
+    on its own.  A max_chars of 0 turns packing off.
+    """
+    if max_chars <= 0 or len(responses) < 2:
+        return responses
+
+    packed: List[str] = []
+    pending = ""
+    for response in responses:
+        if not LIST_RESPONSE_EXP.match(response):
+            if pending:
+                packed.append(pending)
+                pending = ""
+            packed.append(response)
+        elif pending and len(pending) + 1 + len(response) <= max_chars:
+            pending += "\n" + response
+        else:
+            if pending:
+                packed.append(pending)
+            pending = response
+
+    if pending:
+        packed.append(pending)
+
+    return packed
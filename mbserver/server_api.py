@@ -1,11 +1,15 @@
-import re
 import logging
-from pathlib import Path
+from typing import Optional
+from datetime import datetime, timedelta, timezone
 
+from . import clock
 from .config import SETTINGS
-from .server_cli import cli_translate
+from .post_store import post_store
+from .request_grammar import MbRequest, REQUEST_COMPONENTS_EXP, parse_request
 
+msg_terminator = SETTINGS.msg_terminator
 lst_limit = SETTINGS.lst_limit
+search_limit = SETTINGS.search_limit
 posts_dir = SETTINGS.posts_dir
 
 logger = logging.getLogger(__name__)
@@ -13,138 +17,63 @@ logger = logging.getLogger(__name__)
 
 def api_get_ids_for_date(date: str) -> list:
     # The request looks like this {'cmd': api_request, 'verb': 'LIST', 'by': 'DATE', 'date': date}
-    id_list = []
+    return post_store.ids_for_date(date)
 
-    file_list = sorted(Path(posts_dir).glob(f"*{date}*.txt"), reverse=True)
-    file_names = [f.name for f in file_list]
 
-    for fn in file_names:
-        post_id = re.findall(r'^(\d+) - \d{4}-\d{2}-\d{2} - [\S\s]*\.txt', fn)[0]
-        if post_id:
-            id_list.append(int(post_id))
+def api_get_ids_for_date_range(date_from: str, date_to: str) -> list:
+    # The request looks like this
+    # {'cmd': api_request, 'verb': 'LIST', 'by': 'DATE_RANGE', 'date_from': date_from, 'date_to': date_to}
+    return post_store.ids_for_date_range(date_from, date_to)
 
-    return id_list
 
+def api_get_dates_for_days(days: int) -> tuple:
+    # The range covers today (UTC) and the days-1 days before it, as (date_from, date_to)
+    today = datetime.fromtimestamp(clock.now(), timezone.utc).date()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
 
-def api_get_ids_for_recent() -> list:
-    # The request looks like this {'cmd': api_request, 'verb': 'LIST', 'by': 'ID', 'id_list': []]}
-    id_list = []
-
-    file_list = sorted(Path(posts_dir).glob(f"* - * - *.txt"), reverse=True)
-    file_names = [f.name for f in file_list]
-
-    for i, fn in enumerate(file_names):
-        if i >= lst_limit:
-            break
-
-        post_id = re.findall(r'^(\d+) - \d{4}-\d{2}-\d{2} - [\S\s]*\.txt', fn)
-        if post_id:
-            id_list.append(int(post_id[0]))
-
-    return id_list
-
-
-def api_parse_list(api_request: str, match: dict) -> dict:
-    # {'cmd': 'E~', 'verb': 'LIST', 'by': 'ID', 'id_list': []}  -> lists the most recent
-    # {'cmd': 'E6~', 'verb': 'LIST', 'by': 'ID', 'id_list': [6]}  -> list #6, #10 and #12
-    # {'cmd': 'E6,10,12~', 'verb': 'LIST', 'by': 'ID', 'id_list': [6, 10, 12]}  -> list #6, #10 and #12
-    # {'cmd': 'E2026-01-25~', 'verb': 'LIST', 'by': 'DATE', 'date': '2026-01-25'}  -> list 2026-01-25
-
-    post_id_list = []  # We'll return this list, which will be empty if we have no matching lists
-
-    if match['by'] == 'ID':
-        if re.fullmatch(r'E\d+(?:,\d+)*~', api_request):
-            post_id_list = list(map(int, re.findall(r'\d+', api_request)))
-
-        # If we didn't get a match, the api_request must be E~
 
-        return {
-            'cmd': api_request,
-            'verb': 'LIST',
-            'by': 'ID',
-            'id_list': post_id_list
-        }
+def api_get_ids_for_days(days: int) -> list:
+    # The request looks like this {'cmd': api_request, 'verb': 'LIST', 'by': 'DAYS', 'days': days}
+    if days <= 0:
+        return []
+    return post_store.ids_for_date_range(*api_get_dates_for_days(days))
 
-    elif match['by'] == 'DATE':
-        date = re.findall(r'^E(\d{4}-\d{2}-\d{2})~', match['date'])[0]
 
-        return {
-            'cmd': api_request,
-            'verb': 'LIST',
-            'by': 'DATE',
-            'date': date
-        }
+def api_get_ids_for_search(text: str) -> Optional[list]:
+    # The request looks like this {'cmd': api_request, 'verb': 'SEARCH', 'by': 'TEXT', 'text': text}
+    # Returns None if the post store doesn't support search
+    return post_store.search(text, search_limit)
 
-    return {}
-
-
-def api_parse_get(api_request: str) -> dict:
-    # {'cmd': 'G12~', 'verb': 'GET', 'post_id': 6}  -> get #12
-    post_id_list = list(map(int, re.findall(r'\d+', api_request)))
-
-    return {
-        'cmd': api_request,
-        'verb': 'GET',
-        'by': 'ID',
-        'id_list': post_id_list
-    }
 
-
-def api_parse_info(api_request: str) -> dict:
-    # {'cmd': 'I~', 'verb': 'INFO', 'post_id': []}  -> send server info from info.txt
-
-    return {
-        'cmd': api_request,
-        'verb': 'INFO',
-        'by': 'ID',
-        'id_list': []
-    }
+def api_get_ids_for_recent() -> list:
+    # The request looks like this {'cmd': api_request, 'verb': 'LIST', 'by': 'ID', 'id_list': []]}
+    return post_store.recent(lst_limit)
 
 
-def api_parse_req(api_req: str) -> dict:
+def api_parse_req(api_req: str) -> MbRequest:
     # Here we normalise the input to produce a dictionary that we return to the caller.
+    # The input can be an API command (e.g. E~) or a CLI command (e.g. M.E), which are
+    # both parsed in one pass by the request grammar.
     # The dictionary looks like one of these:
     # {'cmd': 'E~', 'verb': 'LIST', 'by': 'ID', 'id_list': []}  -> lists the most recent
     # {'cmd': 'E6~', 'verb': 'LIST', 'by': 'ID', 'id_list': [6]}  -> list #6, #10 and #12
     # {'cmd': 'E6,10,12~', 'verb': 'LIST', 'by': 'ID', 'id_list': [6, 10, 12]}  -> list #6, #10 and #12
     # {'cmd': 'E2026-01-25~', 'verb': 'LIST', 'by': 'DATE', 'date': '2026-01-25'}  -> list 2026-01-25
-    # {'cmd': 'G12~', 'verb': 'GET', 'post_id': 12}  -> get #12
-    # {'cmd': 'I~', 'verb': 'INFO', 'post_id': []}  -> send server info from info.txt
-
-    # the following is a list of valid commands and
-    # their corresponding command processors in the CmdProcessors class
-    # the following list contains regex patterns used to check inbound API requests
-    # and the corresponding cmd processor
-    api_format = [
-        {'exp': r'^E~', 'verb': 'LIST', 'by': 'ID'},
-        {'exp': r'^E(\d+,)*\d+~', 'verb': 'LIST', 'by': 'ID'},
-        {'exp': r'^E\d{4}-\d{2}-\d{2}~', 'verb': 'LIST', 'by': 'ID'},
+    # {'cmd': 'E2026-01-19/2026-01-25~', 'verb': 'LIST', 'by': 'DATE_RANGE',
+    #   'date_from': '2026-01-19', 'date_to': '2026-01-25'}  -> list 2026-01-19 to 2026-01-25 inclusive
+    # {'cmd': 'E7D~', 'verb': 'LIST', 'by': 'DAYS', 'days': 7}  -> list the last seven days, including today
+    # {'cmd': 'G12~', 'verb': 'GET', 'by': 'ID', 'id_list': [12]}  -> get #12
+    # {'cmd': 'I~', 'verb': 'INFO', 'by': 'ID', 'id_list': []}  -> send server info from info.txt
+    # {'cmd': 'SFLOOD~', 'verb': 'SEARCH', 'by': 'TEXT', 'text': 'FLOOD'}  -> IDs of posts containing FLOOD
 
-        {'exp': r'^G\d+~', 'verb': 'GET', 'by': 'ID'},
+    if api_req[:2] == 'M.':
+        api_req = api_req.replace(msg_terminator, '').strip()
 
-        {'exp': r'^I~', 'verb': 'INFO', 'by': 'ID'},
-    ]
-
-    req_dict = {}
-    
-    for entry in api_format:
-        # try to match the request
-        m = re.search(entry['exp'], api_req)
-        if m is None:
-            continue
-
-        if entry['verb'] == 'LIST':
-            req_dict = api_parse_list(api_req, entry)
-        elif entry['verb'] == 'GET':
-            req_dict = api_parse_get(api_req)
-        elif entry['verb'] == 'INFO':
-            req_dict = api_parse_info(api_req)
-
-    return req_dict
+    return parse_request(api_req)
 
 
 def api_get_req_components(req: str) -> dict:
-    components = re.findall(r'^([A-Z0-9]+): *([A-Z0-9]+) *([\S ]*)$', req)[0]
+    components = REQUEST_COMPONENTS_EXP.findall(req)[0]
     return {
         'source': components[0],
         'destination': components[1],
@@ -152,15 +81,14 @@ def api_get_req_components(req: str) -> dict:
     }
 
 
-def api_get_req_structure(mb_cmd: str) -> dict:
+def api_get_req_structure(mb_cmd: str) -> MbRequest:
     # mb_cmd is a cli command (e.g. M.E) or an api command (e.g. E~)
 
-    if mb_cmd[:2] == 'M.':
-        # This is a CLI command that we need to translate to an api command
-        mb_cmd = cli_translate(mb_cmd)
-
     req_dict = api_parse_req(mb_cmd)
 
+    if req_dict and mb_cmd[:2] == 'M.':
+        logger.info(f"Translated {mb_cmd} to {req_dict['cmd']}")
+
     if req_dict == {}:
         return req_dict
     
@@ -168,6 +96,20 @@ def api_get_req_structure(mb_cmd: str) -> dict:
         id_list = api_get_ids_for_date(req_dict['date'])
         req_dict['id_list'] = id_list
 
+    if req_dict['by'] == 'DATE_RANGE':
+        id_list = api_get_ids_for_date_range(req_dict['date_from'], req_dict['date_to'])
+        req_dict['id_list'] = id_list
+
+    if req_dict['by'] == 'DAYS':
+        # The dates the days cover move on at midnight, so record them with the request
+        req_dict['date_from'], req_dict['date_to'] = api_get_dates_for_days(req_dict['days'])
+        id_list = api_get_ids_for_days(req_dict['days'])
+        req_dict['id_list'] = id_list
+
+    if req_dict['by'] == 'TEXT':
+        id_list = api_get_ids_for_search(req_dict['text'])
+        req_dict['id_list'] = id_list
+
     if req_dict['by'] == 'ID' and len(req_dict['id_list']) == 0:
         id_list = api_get_ids_for_recent()
         req_dict['id_list'] = id_list
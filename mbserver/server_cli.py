@@ -1,7 +1,6 @@
-import re
-
 from logging import getLogger
 from .config import SETTINGS
+from .request_grammar import parse_request
 
 msg_terminator = SETTINGS.msg_terminator
 
@@ -9,43 +8,19 @@ logger = getLogger(__name__)
 
 
 def cli_translate(command: str) -> str:
-    # the following is a list of valid commands and
-    # their corresponding command processors in the CmdProcessors class
-    # the following list contains regex patterns used to check inbound API requests
-    # and the corresponding cmd processor
-    cli_format = [
-        {'exp': r'^M.E$', 'xlat': 'E~', 'by': 'id'},
-        {'exp': r'^M.E +(\d+)$', 'xlat': 'E{param}~', 'by': 'id'},
-        {'exp': r'^M.E +(\d{4}-\d{2}-\d{2})$', 'xlat': 'E{param}~', 'by': 'date'},
-
-        {'exp': r'^M.G +(\d+)$', 'xlat': 'G{param}~', 'by': 'id'},
-
-        {'exp': r'^M.WX$', 'xlat': 'G0~', 'by': 'id'},
-
-        {'exp': r'^M.I$', 'xlat': 'I~', 'by': 'id'},
-        {'exp': r'^M.\?$', 'xlat': 'I~', 'by': 'id'},
-
-        # The following commands are deprecated and now return extended listings.
-        {'exp': r'^M.L$', 'xlat': 'E~', 'by': 'id'},
-        {'exp': r'^M.L +(\d+)$', 'xlat': 'E{param}~', 'by': 'id'},
-        {'exp': r'^M.L +(\d{4}-\d{2}-\d{2})$', 'xlat': 'E{param}~', 'by': 'date'},
-    ]
-
-    translated_command = ""
+    # Translate a CLI command (e.g. M.E 12) to the equivalent API command (e.g. E12~).
+    # The CLI forms are part of the request grammar, which parses both forms in one pass;
+    # see request_grammar.REQUEST_EXP.  Returns "" if the command isn't valid.
 
     command = command.replace(msg_terminator, '')
     command = command.strip()
 
-    for entry in cli_format:
-        # try to match the request
-        result = re.findall(entry['exp'], command)
-        if not result:
-            continue
+    if command[:2] != 'M.':
+        return ""
 
-        # ToDo: We need to add code here to handle invalid commands
+    translated_command = parse_request(command).get('cmd', "")
 
-        translated_command = str(entry['xlat']).format(param=str(result[0]))
+    if translated_command:
         logger.info(f"Translated {command} to {translated_command}")
-        break
 
     return translated_command
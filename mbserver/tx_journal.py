@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import os
+import re
+import zlib
+import struct
+import logging
+import threading
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from . import clock
+from .config import SETTINGS
+from .message_codec import encode_body, decode_message
+from .message_q import UnifiedMessage, MessageParameter, _PARAM_KEYS
+from .tx_scheduler import Transmission
+
+logger = logging.getLogger(__name__)
+
+tx_journal = SETTINGS.tx_journal
+tx_journal_expiry = SETTINGS.tx_journal_expiry
+
+# Each record is its length and CRC-32, then the kind of record, the entry it is for and,
+# for ACCEPTED and QUEUED, the message in the form used by message_codec
+_HEAD = struct.Struct("<II")
+_ENTRY = struct.Struct("<BQ")
+ACCEPTED, QUEUED, DONE = range(1, 4)
+
+SYNC_INTERVAL = 0.2  # seconds; records written this close together share one fsync
+COMPACT_RECORDS = 1000  # the file is rewritten once it holds this many records, most of them finished
+
+_JOURNAL = _PARAM_KEYS[MessageParameter.JOURNAL]
+_TRACE = _PARAM_KEYS[MessageParameter.TRACE]
+
+
+def journal_path(path: str, radio: str) -> str:
+    # With several radios, each has a journal of its own (each may have its own comms process)
+    if not path or not radio:
+        return path
+    root, ext = os.path.splitext(path)
+    name = re.sub(r"[^\w.-]", "_", radio)
+    return f"{root}-{name}{ext}"
+
+
+class TxJournal:
+    """Write-ahead journal of the requests and replies a comms driver is holding.
+
+    A request is journaled as it is handed to the backend, and a reply as it is
+    queued for sending.  A reply's entry is finished when the PTT is seen going off
+    after it has been transmitted (or, in debug mode, when it is handed over, as
+    nothing reaches JS8Call).  A request's is finished when a reply to it (or to a
+    later request, as the backend answers them in order) is queued, or collapsed
+    into the same reply already waiting, or when the backend says it gets no
+    reply.  A reply whose PTT off was never seen stays in the journal, to be sent
+    again after a restart.  Records are written without waiting for the disk; a
+    thread syncs the file at most every SYNC_INTERVAL seconds, so a crash loses at
+    most that much.
+
+    When the server starts, open() reads the journal and returns what was left
+    unfinished and is less than expiry seconds old, for the driver to queue
+    again.  The file is emptied whenever nothing is left in it, and rewritten with
+    just the unfinished entries once it has grown to COMPACT_RECORDS.
+
+    Until open() is called (e.g. in the replay harness) nothing is journaled.
+    """
+
+    def __init__(self, path: str, expiry: float = tx_journal_expiry):
+        self.path = path
+        self.expiry = expiry
+        self.file: Optional[BinaryIO] = None
+        self.lock = threading.Condition()
+        self.stopping = threading.Event()
+        self.sync_thread: Optional[threading.Thread] = None
+        self.dirty = False
+        self.next_entry = 1
+        self.live: Dict[int, Tuple[float, bytes]] = {}  # unfinished entries, oldest first: (ts, record)
+        self.requests: Dict[int, int] = {}  # trace -> entry, of requests not yet answered, oldest first
+
+        self.records = 0  # in the file now
+        self.written = 0
+        self.syncs = 0
+        self.recovered = 0
+        self.expired = 0
+
+    def open(self) -> Tuple[List[UnifiedMessage], List[UnifiedMessage]]:
+        # The requests and replies left unfinished when the server last stopped, oldest first.
+        # Each has its entry in the JOURNAL param, and no TRACE (that was the old process's).
+        requests: List[UnifiedMessage] = []
+        replies: List[UnifiedMessage] = []
+        if not self.path:
+            return requests, replies
+
+        now = clock.now()
+        with self.lock:
+            for entry, record in self._load().items():
+                kind = record[_HEAD.size]
+                try:
+                    m = decode_message(record[_HEAD.size + _ENTRY.size:])
+                except (ValueError, IndexError, struct.error, UnicodeDecodeError) as e:
+                    logger.warning(f"Ignoring an entry in {self.path} that can't be decoded: {e}")
+                    continue
+                if now - m.get_ts() > self.expiry:
+                    self.expired += 1
+                    continue
+                m.params[_JOURNAL] = entry
+                m.params.pop(_TRACE, None)
+                self.live[entry] = (m.get_ts(), record)
+                (requests if kind == ACCEPTED else replies).append(m)
+
+            try:
+                self._rewrite()
+            except OSError as e:
+                logger.warning(f"Can't write to the TX journal {self.path}: {e}")
+                return requests, replies
+
+        self.recovered = len(self.live)
+        if self.live:
+            logger.info(
+                f"Recovered {len(replies)} replies and {len(requests)} requests from {self.path}"
+                f" ({self.expired} too old to send)"
+            )
+        self.sync_thread = threading.Thread(target=self.run_sync, name="tx journal", daemon=True)
+        self.sync_thread.start()
+        return requests, replies
+
+    def _load(self) -> Dict[int, bytes]:
+        # The record of each entry not finished, in the order they were written
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            logger.warning(f"Can't read the TX journal {self.path}: {e}")
+            return {}
+
+        live: Dict[int, bytes] = {}
+        offset = 0
+        while offset + _HEAD.size <= len(data):
+            length, crc = _HEAD.unpack_from(data, offset)
+            start = offset + _HEAD.size
+            payload = data[start:start + length]
+            if length < _ENTRY.size or len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            kind, entry = _ENTRY.unpack_from(payload)
+            if kind == DONE:
+                live.pop(entry, None)
+            else:
+                live[entry] = data[offset:start + length]
+            self.next_entry = max(self.next_entry, entry + 1)
+            offset = start + length
+
+        if offset < len(data):
+            logger.warning(f"Ignoring {len(data) - offset} bytes at the end of {self.path}, left by a crash")
+        return live
+
+    def _rewrite(self):
+        # Replace the file with one holding just the unfinished entries
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as f:
+            for _, record in self.live.values():
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, "ab")
+        self.records = len(self.live)
+
+    def _append(self, kind: int, entry: int, m: Optional[UnifiedMessage] = None) -> bytes:
+        # Called with the lock held
+        payload = _ENTRY.pack(kind, entry) + (encode_body(m) if m is not None else b"")
+        record = _HEAD.pack(len(payload), zlib.crc32(payload)) + payload
+        if self.file is None:
+            return record
+        try:
+            self.file.write(record)
+        except OSError as e:
+            logger.warning(f"Can't write to the TX journal {self.path}: {e}; it is now off")
+            self.file = None
+            self.lock.notify()
+            return record
+        self.records += 1
+        self.written += 1
+        if not self.dirty:
+            self.dirty = True
+            self.lock.notify()
+        return record
+
+    def _new_entry(self, kind: int, m: UnifiedMessage) -> int:
+        entry = self.next_entry
+        self.next_entry += 1
+        self.live[entry] = (m.get_ts(), self._append(kind, entry, m))
+        return entry
+
+    def _finish(self, entry: Optional[int]):
+        # Called with the lock held
+        if entry not in self.live:
+            return
+        del self.live[entry]
+        self._append(DONE, entry)
+        if self.file is None:
+            return
+        if not self.live:
+            self.file.truncate(0)  # nothing left to keep
+            self.records = 0
+        elif self.records >= COMPACT_RECORDS and self.records > 2 * len(self.live):
+            self._compact()
+
+    def _compact(self):
+        # Give up on entries too old to be worth sending, then rewrite the file
+        oldest = clock.now() - self.expiry
+        for entry in [entry for entry, (ts, _) in self.live.items() if ts < oldest]:
+            del self.live[entry]
+            self.expired += 1
+        self.requests = {trace: entry for trace, entry in self.requests.items() if entry in self.live}
+        try:
+            self._rewrite()
+        except OSError as e:
+            logger.warning(f"Can't compact the TX journal {self.path}: {e}")
+
+    def accepted(self, m: UnifiedMessage):
+        # A request is being handed to the backend
+        if self.file is None:
+            return
+        with self.lock:
+            if self.file is None:
+                return
+            entry = m.get_param(MessageParameter.JOURNAL)  # already journaled, if recovered by open()
+            if entry is None:
+                entry = self._new_entry(ACCEPTED, m)
+            trace = m.get_param(MessageParameter.TRACE)
+            if trace is not None:
+                self.requests[trace] = entry
+
+    def no_reply(self, m: UnifiedMessage):
+        # The backend had no room for the request, or has dealt with it without a reply
+        # (e.g. a repeat, or not a valid request); m has the request's TRACE
+        if self.file is None:
+            return
+        with self.lock:
+            self._finish(self.requests.pop(m.get_param(MessageParameter.TRACE), None))
+
+    def queued(self, m: UnifiedMessage):
+        # A reply has been queued for sending; called by the FairQueue
+        if self.file is None or m.get_param(MessageParameter.JOURNAL) is not None:
+            return  # a reply recovered by open() is already journaled
+        destination = m.get_param(MessageParameter.DESTINATION) or ""
+        if destination.startswith("@"):
+            return  # announcements are made afresh after a restart
+        with self.lock:
+            if self.file is None:
+                return
+            m.params[_JOURNAL] = self._new_entry(QUEUED, m)
+            self._answered(m.get_param(MessageParameter.TRACE))
+
+    def collapsed(self, m: UnifiedMessage):
+        # A reply wasn't queued, as the same reply was already waiting; that one answers its request
+        if self.file is None:
+            return
+        with self.lock:
+            if self.file is None:
+                return
+            self._finish(m.get_param(MessageParameter.JOURNAL))  # a recovered reply
+            self._answered(m.get_param(MessageParameter.TRACE))
+
+    def _answered(self, trace: Optional[int]):
+        # Called with the lock held.  The backend answers requests in order, so it has
+        # dealt with this one and all before it.
+        if trace not in self.requests:
+            return
+        while self.requests:
+            answered, entry = next(iter(self.requests.items()))
+            del self.requests[answered]
+            self._finish(entry)
+            if answered == trace:
+                break
+
+    def dropped(self, m: UnifiedMessage):
+        # A recovered reply that didn't fit in the queue
+        if self.file is None:
+            return
+        with self.lock:
+            self._finish(m.get_param(MessageParameter.JOURNAL))
+
+    def sent(self, m: UnifiedMessage):
+        # A reply handed over where no PTT will confirm it, as in debug mode
+        if self.file is None:
+            return
+        with self.lock:
+            self._finish(m.get_param(MessageParameter.JOURNAL))
+
+    def transmitted(self, tx: Transmission):
+        # Called as each transmission finishes; only a PTT seen going off confirms the reply went
+        if tx.entry is None or tx.started_at is None or tx.ptt_off_lost or self.file is None:
+            return
+        with self.lock:
+            self._finish(tx.entry)
+
+    def run_sync(self):
+        # Group commit: sync whatever has been written, then let more gather for SYNC_INTERVAL
+        while True:
+            with self.lock:
+                self.lock.wait_for(lambda: self.dirty or self.file is None)
+                if self.file is None:
+                    return
+                self.dirty = False
+                try:
+                    self.file.flush()
+                    fd = os.dup(self.file.fileno())
+                except OSError as e:
+                    logger.warning(f"Can't write to the TX journal {self.path}: {e}")
+                    continue
+            try:
+                os.fsync(fd)  # without the lock, so nothing waits for the disk
+                self.syncs += 1
+            except OSError as e:
+                logger.warning(f"Can't sync the TX journal {self.path}: {e}")
+            finally:
+                os.close(fd)
+            if self.stopping.wait(SYNC_INTERVAL):
+                return
+
+    def close(self):
+        # What is still unfinished stays in the file, to be sent after a restart
+        self.stopping.set()
+        with self.lock:
+            if self.file is None:
+                return
+            try:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+            except OSError as e:
+                logger.warning(f"Can't write to the TX journal {self.path}: {e}")
+            self.file = None
+            self.lock.notify()
+        if self.live:
+            logger.info(f"{len(self.live)} requests and replies are left in {self.path} for the next start")
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self.live),
+            'records': self.records,
+            'written': self.written,
+            'syncs': self.syncs,
+            'recovered': self.recovered,
+            'expired': self.expired,
+        }
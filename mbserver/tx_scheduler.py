@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import math
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from . import clock
+
+logger = logging.getLogger(__name__)
+
+# JS8Call speed modes, as reported in the SPEED param of MODE.SPEED and STATION.STATUS,
+# mapped to the length of one TX frame (cycle) in seconds
+FRAME_SECONDS = {
+    0: 15.0,  # Normal
+    1: 10.0,  # Fast
+    2: 6.0,  # Turbo
+    4: 30.0,  # Slow
+    8: 4.0,  # Ultra
+}
+DEFAULT_SPEED = 0
+
+# The part of each cycle in which the transmitter is keyed; the rest is the gap before the next frame
+TX_DUTY = 0.85
+
+START_MARGIN = 2.0  # seconds allowed on top of one cycle for JS8Call to key up after TX.SEND_MESSAGE
+LOST_PTT_FRAMES = 2  # cycles allowed beyond the predicted airtime before a missing PTT off is given up on
+
+
+def estimate_airtime(text: str, chars_per_frame: float, speed: int = DEFAULT_SPEED) -> float:
+    # For reporting where the current speed isn't known; see TxScheduler.predict()
+    frames = 1 + math.ceil(len(text) / chars_per_frame)
+    return (frames - 1 + TX_DUTY) * FRAME_SECONDS.get(speed, FRAME_SECONDS[DEFAULT_SPEED])
+
+
+@dataclass
+class Transmission:
+    label: str  # for logging
+    frames: int  # predicted
+    predicted: float  # predicted airtime, seconds
+    sent_at: float
+    started_at: Optional[float] = None  # first PTT on
+    ptt_off_at: Optional[float] = None  # most recent PTT off, while the PTT is off
+    ptt_on: bool = False
+    ptt_off_lost: bool = False  # finished without the PTT off being seen
+    frames_seen: int = 0
+    trace: Optional[int] = None  # the request this is a reply to, see latency_trace
+    entry: Optional[int] = None  # the message's entry in the TX journal, see tx_journal
+
+
+class TxScheduler:
+    """Decide when the next priority 1 message can be handed to JS8Call.
+
+    Each message's airtime is predicted from its length and the current speed
+    mode.  The real transmission is then followed through RIG.PTT events: the
+    next message is released once the PTT has gone off after the predicted number
+    of frames and no further frame has started within the gap between frames.
+    If the PTT never keys (for example, in debug mode) the message is treated as
+    sent once its predicted airtime has passed, and if the PTT off is never seen
+    (the event was lost) it is treated as finished LOST_PTT_FRAMES cycles after
+    the predicted airtime.
+
+    Predicted and actual airtime are logged for each transmission, so
+    chars_per_frame can be calibrated.
+    """
+
+    def __init__(
+        self, chars_per_frame: float = 16.0, on_finish: Optional[Callable[[Transmission, float], None]] = None
+    ):
+        self.chars_per_frame = chars_per_frame
+        self.on_finish = on_finish  # called with each transmission once it has finished
+        self.speed = DEFAULT_SPEED
+        self.current: Optional[Transmission] = None
+
+        self.transmissions = 0
+        self.predicted_total = 0.0
+        self.actual_total = 0.0
+
+    @property
+    def frame_seconds(self) -> float:
+        return FRAME_SECONDS.get(self.speed, FRAME_SECONDS[DEFAULT_SPEED])
+
+    def set_speed(self, speed: int):
+        if speed not in FRAME_SECONDS:
+            logger.warning(f"Unknown JS8Call speed {speed}; airtime is estimated for Normal")
+        elif speed != self.speed:
+            logger.info(f"JS8Call speed is now {speed} ({FRAME_SECONDS[speed]:.0f}s frames)")
+        self.speed = speed
+
+    def predict_frames(self, text: str) -> int:
+        # The first frame carries the callsigns; the text follows in as many frames as it needs
+        return 1 + math.ceil(len(text) / self.chars_per_frame)
+
+    def predict(self, text: str) -> float:
+        # From the PTT going on for the first frame to it going off after the last
+        return estimate_airtime(text, self.chars_per_frame, self.speed)
+
+    def on_send(
+        self, label: str, text: str, now: Optional[float] = None, trace: Optional[int] = None,
+        entry: Optional[int] = None
+    ):
+        now = clock.now() if now is None else now
+        self.current = Transmission(label, self.predict_frames(text), self.predict(text), now, trace=trace, entry=entry)
+
+    def reset(self):
+        # Forget the transmission in progress, e.g. after losing the connection to JS8Call
+        self.current = None
+
+    def on_ptt(self, on: bool, now: Optional[float] = None):
+        now = clock.now() if now is None else now
+        tx = self.current
+        if tx is None:
+            return  # e.g. the operator transmitting from JS8Call
+
+        if on and not tx.ptt_on:
+            if tx.started_at is None:
+                tx.started_at = now
+            tx.frames_seen += 1
+            tx.ptt_off_at = None
+        elif not on and tx.ptt_on:
+            tx.ptt_off_at = now
+        tx.ptt_on = on
+
+    def release_time(self) -> float:
+        # The earliest time the next message may go, on what is known now
+        tx = self.current
+        if tx is None:
+            return 0.0
+
+        if tx.started_at is None:
+            # Waiting for JS8Call to key up
+            return tx.sent_at + self.frame_seconds + START_MARGIN + tx.predicted
+
+        if tx.ptt_on:
+            # Normally a PTT off comes first; this is in case it has been lost
+            return tx.started_at + tx.predicted + self.frame_seconds * LOST_PTT_FRAMES
+
+        gap = self.frame_seconds * (1 - TX_DUTY) + 1.0
+        if tx.frames_seen < tx.frames:
+            # More frames are expected; allow a whole cycle for the next one to start
+            gap = self.frame_seconds
+        return tx.ptt_off_at + gap
+
+    def can_release(self, now: Optional[float] = None) -> bool:
+        now = clock.now() if now is None else now
+        if now < self.release_time():
+            return False
+        if self.current is not None:
+            self._finish(self.current, now)
+            self.current = None
+        return True
+
+    def _finish(self, tx: Transmission, now: float):
+        lost_ptt_off = tx.ptt_on
+        if lost_ptt_off:
+            tx.ptt_on = False
+            tx.ptt_off_at = now
+            tx.ptt_off_lost = True
+
+        if self.on_finish is not None:
+            self.on_finish(tx, now)
+
+        if tx.started_at is None:
+            logger.warning(f"No PTT seen for {tx.label}; assumed sent after {now - tx.sent_at:.1f}s")
+            return
+        if lost_ptt_off:
+            # The airtime isn't known, so it is left out of the totals
+            logger.warning(f"No PTT off seen for {tx.label}; assumed finished after {now - tx.started_at:.1f}s")
+            return
+
+        actual = tx.ptt_off_at - tx.started_at
+        self.transmissions += 1
+        self.predicted_total += tx.predicted
+        self.actual_total += actual
+        logger.info(
+            f"Airtime for {tx.label}: predicted {tx.predicted:.1f}s ({tx.frames} frames),"
+            f" actual {actual:.1f}s ({tx.frames_seen} frames);"
+            f" actual/predicted over {self.transmissions} transmissions {self.actual_total / self.predicted_total:.2f}"
+        )
+
+    def stats(self) -> dict:
+        return {
+            'transmissions': self.transmissions,
+            'predicted_s': round(self.predicted_total, 1),
+            'actual_s': round(self.actual_total, 1),
+            'actual_over_predicted': round(self.actual_total / self.predicted_total, 3) if self.predicted_total else None,
+        }
@@ -8,6 +8,7 @@ import logging
 from typing import Optional
 
 from .config import SETTINGS
+from .post_store import post_store
 
 logger = logging.getLogger(__name__)
 
@@ -48,8 +49,9 @@ class UpstreamStore:
             entries = re.findall(r"(\d+) - ([ .A-Za-z0-9\-]+)\r\n", post_lst)
             # print(entries)
 
-            for i, entry in enumerate(entries):
-                if i < starting_at:
+            for entry in entries:
+                # Compare IDs numerically; post.lst may skip IDs or not be in order
+                if int(entry[0]) < starting_at:
                     continue
                 else:
                     file_name = f"{entry[0]} - {entry[1]}"
@@ -63,3 +65,5 @@ class UpstreamStore:
                         f = open(f"{self.posts_dir}/{file_name}", "wt")
                         f.write(post_text)
                         f.close()
+                        # Index the post now so that the announcement that follows includes it
+                        post_store.add_file(file_name)
@@ -0,0 +1,19 @@
+import time
+
+import pytest
+
+
+def best_of(fn, repeat: int = 5, number: int = 1) -> float:
+    # Seconds per call to fn, from the fastest of repeat runs of number calls
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+@pytest.fixture
+def timer():
+    return best_of
@@ -0,0 +1,28 @@
+import pytest
+
+from mbserver import clock
+from mbserver.clock import Clock, SimulatedClock
+from mbserver.post_store import post_store
+from mbserver.server_api import api_get_ids_for_days
+
+
+def test_a_clock_must_tell_the_time_and_sleep():
+    class HalfAClock(Clock):
+        def time(self):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        HalfAClock()
+
+
+def test_days_are_counted_back_from_the_clock(monkeypatch):
+    ranges = []
+    monkeypatch.setattr(post_store, "ids_for_date_range", lambda date_from, date_to: ranges.append((date_from, date_to)) or [])
+    previous = clock.use_clock(SimulatedClock(start=1_700_000_000.0))  # 2023-11-14 22:13 UTC
+    try:
+        api_get_ids_for_days(7)
+        clock.get_clock().advance(2 * 3600)
+        api_get_ids_for_days(1)
+    finally:
+        clock.use_clock(previous)
+    assert ranges == [("2023-11-08", "2023-11-14"), ("2023-11-15", "2023-11-15")]
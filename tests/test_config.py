@@ -0,0 +1,28 @@
+import os
+from pathlib import Path
+
+from mbserver import config
+
+
+def settings_from(tmp_path, monkeypatch, text):
+    ini = tmp_path / "config.ini"
+    ini.write_text(text, encoding="utf-8")
+    monkeypatch.setattr(config, "_config_path", lambda: ini)
+    return config.load_settings()
+
+
+def test_relative_file_paths_are_taken_from_the_app_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = str(Path(config.__file__).resolve().parents[1])
+    settings = settings_from(tmp_path, monkeypatch, "[posts]\ndb_file = data/posts.db\n")
+    assert settings.db_file == os.path.join(root, "data/posts.db")
+    for path in (settings.archive_file, settings.tx_journal, settings.comms_socket, settings.log_file,
+                 settings.posts_dir):
+        assert path.startswith(root)
+
+
+def test_full_and_blank_paths_are_left_alone(tmp_path, monkeypatch):
+    journal = str(tmp_path / "tx.journal")
+    settings = settings_from(tmp_path, monkeypatch, f"[server]\ntx_journal = {journal}\n[logging]\ntrace_file =\n")
+    assert settings.tx_journal == journal
+    assert settings.trace_file == ""
@@ -0,0 +1,99 @@
+import os
+
+from mbserver.content_cache import ContentCache
+from mbserver.response_cache import file_stamp
+
+
+class Loader:
+    """Stands in for reading a post, counting the reads."""
+
+    def __init__(self, body):
+        self.body = body
+        self.loads = 0
+
+    def __call__(self):
+        self.loads += 1
+        return self.body
+
+
+def fill(cache, *keys, size=10):
+    for key in keys:
+        cache.get(key, 1, Loader("x" * size))
+
+
+def test_the_least_recently_used_entry_is_evicted_first():
+    cache = ContentCache(30)
+    fill(cache, "a", "b", "c")
+    cache.get("a", 1, Loader("not read"))  # a is now the most recently used
+    fill(cache, "d")
+    assert list(cache.entries) == ["c", "a", "d"]
+    fill(cache, "e", size=20)
+    assert list(cache.entries) == ["d", "e"]
+    assert cache.stats()["evictions"] == 3
+
+
+def test_size_is_counted_in_bytes_of_utf8():
+    cache = ContentCache(100)
+    cache.get("a", 1, Loader("♢" * 10))  # three bytes each
+    cache.get("b", 1, Loader("hello"))
+    assert cache.size_bytes == 35
+    assert cache.stats()["entries"] == 2
+
+    cache.get("a", 2, Loader("é"))  # reloaded, so its old size is given back
+    assert cache.size_bytes == 7
+    cache.get("b", None, Loader("not read"))
+    assert cache.size_bytes == 2
+    cache.clear()
+    assert cache.size_bytes == 0 and cache.entries == {}
+
+
+def test_content_larger_than_the_cache_is_returned_but_not_kept():
+    cache = ContentCache(10)
+    fill(cache, "a", size=5)
+    assert cache.get("big", 1, Loader("x" * 11)) == "x" * 11
+    assert list(cache.entries) == ["a"] and cache.size_bytes == 5
+
+
+def test_a_hit_does_not_load_again():
+    cache = ContentCache(100)
+    load = Loader("hello")
+    assert cache.get("a", 1, load) == cache.get("a", 1, load) == "hello"
+    assert load.loads == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_a_changed_post_file_is_read_again(tmp_path):
+    path = tmp_path / "0012 - 2026-01-27 - Net times.txt"
+    path.write_text("The net meets at 1900.")
+    cache = ContentCache(100)
+
+    def load():
+        return path.read_text()
+
+    assert cache.get(str(path), file_stamp(path), load) == "The net meets at 1900."
+    path.write_text("The net meets at 2000.")  # the same size, so only the mtime tells
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.get(str(path), file_stamp(path), load) == "The net meets at 2000."
+    assert cache.misses == 2
+
+
+def test_a_removed_post_file_is_dropped_from_the_cache(tmp_path):
+    path = tmp_path / "info.txt"
+    path.write_text("About this blog")
+    cache = ContentCache(100)
+    assert cache.get(str(path), file_stamp(path), path.read_text) == "About this blog"
+
+    path.unlink()
+    assert cache.get(str(path), file_stamp(path), path.read_text) is None
+    assert cache.entries == {} and cache.size_bytes == 0
+
+
+def test_a_file_gone_between_stat_and_read_is_not_cached(tmp_path):
+    path = tmp_path / "info.txt"
+    path.write_text("About this blog")
+    stamp = file_stamp(path)
+    path.unlink()
+    cache = ContentCache(100)
+    assert cache.get(str(path), stamp, path.read_text) is None
+    assert cache.entries == {}
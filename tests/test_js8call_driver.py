@@ -0,0 +1,250 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from mbserver import js8call_driver
+from mbserver.js8call_driver import AsyncJs8CallApi, AsyncJs8CallDriver, Js8CallDriver, Reconnector
+from mbserver.latency_trace import tracer
+from mbserver.mb_server import MbServer, Radio, send_to_comms
+from mbserver.message_q import AsyncOverflowQueue, FairQueue, MessageParameter, OverflowQueue, UnifiedMessage
+
+
+@pytest.fixture
+def journal_file(tmp_path, monkeypatch):
+    path = tmp_path / "tx.journal"
+    monkeypatch.setattr(js8call_driver, "tx_journal", str(path))
+    return path
+
+
+def start_driver():
+    # As the server does on starting: recover from the journal, then resend the requests
+    driver = Js8CallDriver(OverflowQueue(), FairQueue(), OverflowQueue(), addr=("127.0.0.1", 1))
+    driver.recover()
+    driver.resend_recovered_requests()
+    return driver
+
+
+def stop_driver(driver):
+    driver.journal.close()
+    driver.js8call_api.sock.close()
+
+
+def receive(driver, source, text):
+    # A request arriving from JS8Call
+    driver.to_backend(UnifiedMessage.create(
+        target="BACKEND", typ="MB_MSG", verb="INFORM",
+        params={"source": source, "destination": "M0BLOG", "mb_msg": text, "trace": tracer.start(source)},
+    ))
+
+
+def answer(driver, text):
+    # The backend answering the next request
+    request = driver.c2b_q.get_nowait()
+    driver.b2c_q_p1.put(UnifiedMessage.create(
+        target="COMMS", typ="MB_MSG", verb="SEND", priority=1,
+        params={
+            "destination": request.get_param(MessageParameter.SOURCE),
+            "mb_msg": text,
+            "trace": request.get_param(MessageParameter.TRACE),
+        },
+    ))
+
+
+def test_a_request_answered_by_a_waiting_reply_is_not_resent_after_every_restart(journal_file):
+    driver = start_driver()
+    receive(driver, "G0ABC", "E6~")
+    answer(driver, "E6 hello")
+    receive(driver, "G0ABC", "E6~")  # asked again before the reply went out; then the server stops
+    stop_driver(driver)
+
+    driver = start_driver()
+    assert driver.b2c_q_p1.qsize() == 1  # the reply
+    assert driver.c2b_q.qsize() == 1  # the request, resent to the backend
+    answer(driver, "E6 hello")  # the same as the reply waiting, so collapsed into it
+    assert driver.b2c_q_p1.qsize() == 1
+    stop_driver(driver)
+
+    driver = start_driver()
+    assert driver.c2b_q.qsize() == 0
+    assert driver.b2c_q_p1.qsize() == 1
+    stop_driver(driver)
+
+
+def test_a_reply_that_could_not_be_sent_goes_first_and_is_not_journaled_again(journal_file, monkeypatch):
+    driver = start_driver()
+    for source in ("G0ABC", "M0XYZ"):
+        receive(driver, source, "E6~")
+        answer(driver, f"E6 hello {source}")
+    written = driver.journal.written
+
+    def lost(*args, **kwargs):
+        raise OSError("connection reset")
+
+    monkeypatch.setattr(driver.js8call_api, "send", lost)
+    with pytest.raises(OSError):
+        driver.process_tx_q()
+    assert driver.journal.written == written
+    assert driver.b2c_q_p1.waiting() == ["G0ABC", "M0XYZ"]
+    assert driver.b2c_q_p1.get_nowait().get_param(MessageParameter.MB_MSG) == "E6 hello G0ABC"
+    stop_driver(driver)
+
+
+def test_the_async_driver_is_set_up_as_the_threaded_one(journal_file):
+    driver = AsyncJs8CallDriver(AsyncOverflowQueue(), FairQueue(), AsyncOverflowQueue(), radio="IC-7300")
+    assert isinstance(driver.js8call_api, AsyncJs8CallApi)
+    assert driver.journal.path.endswith("tx-IC-7300.journal")
+    assert driver.b2c_q_p1.on_queued == driver.journal.queued
+    assert driver.b2c_q_p1.on_collapsed == driver.on_reply_collapsed
+    receive(driver, "G0ABC", "E6~")
+    assert len(driver.backend_outbox) == 1 and driver.c2b_q.empty()
+
+
+def test_a_request_that_gets_no_reply_is_not_resent_after_a_restart(journal_file):
+    driver = start_driver()
+    server = MbServer(radio_settings=())
+    radio = Radio("M0BLOG", driver)
+    radio.this_blog = "M0BLOG"
+    receive(driver, "G0ABC", "hello")  # not a valid request
+    for m in server.handle_comms_message(radio, driver.c2b_q.get_nowait()):
+        send_to_comms(m, radio)
+    driver.process_tx_q()
+    assert driver.journal.live == {}
+    stop_driver(driver)
+
+    driver = start_driver()
+    assert driver.c2b_q.qsize() == 0
+    stop_driver(driver)
+
+
+def test_a_repeated_request_is_not_resent_after_a_restart(journal_file):
+    driver = start_driver()
+    server = MbServer(radio_settings=())
+    radio = Radio("M0BLOG", driver)
+    radio.this_blog = "M0BLOG"
+    for _ in range(2):
+        receive(driver, "G0ABC", "I~")  # asked again before the first reply went out
+        for m in server.handle_comms_message(radio, driver.c2b_q.get_nowait()):
+            send_to_comms(m, radio)
+    driver.process_tx_q()
+    assert len(driver.journal.live) == 1  # only the first, waiting for its reply to go out
+    stop_driver(driver)
+
+    driver = start_driver()
+    assert driver.c2b_q.qsize() == 0
+    assert driver.b2c_q_p1.qsize() == 1
+    stop_driver(driver)
+
+
+def test_in_debug_mode_a_reply_is_finished_once_handed_over(journal_file, monkeypatch):
+    monkeypatch.setattr(js8call_driver, "debug", True)
+    driver = start_driver()
+    receive(driver, "G0ABC", "E6~")
+    answer(driver, "E6 hello")
+    driver.process_tx_q()
+    assert driver.b2c_q_p1.qsize() == 0
+    assert driver.journal.live == {}
+    stop_driver(driver)
+
+
+class FakeJs8Call:
+    """A JS8Call TCP API that can be stopped and started, recording what it is sent.
+
+    While stopped its port is bound but not listening, so connections are refused.
+    """
+
+    def __init__(self):
+        self.listener = self.bind(("127.0.0.1", 0))
+        self.addr = self.listener.getsockname()
+        self.conns = []
+        self.received = []
+        self.lock = threading.Condition()
+
+    @staticmethod
+    def bind(addr):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addr)
+        return sock
+
+    def start(self):
+        self.listener.listen()
+        threading.Thread(target=self.accept, args=(self.listener,), daemon=True).start()
+
+    def stop(self):
+        for sock in [self.listener] + self.conns:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # wakes the threads blocked on it
+            except OSError:
+                pass  # not listening, or already closed by the driver
+            sock.close()
+        self.conns = []
+        self.listener = self.bind(self.addr)
+
+    def accept(self, listener):
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self.read, args=(conn,), daemon=True).start()
+
+    def read(self, conn):
+        with conn.makefile("rb") as lines:
+            try:
+                for line in lines:
+                    with self.lock:
+                        self.received.append(json.loads(line)["type"])
+                        self.lock.notify_all()
+            except OSError:
+                pass
+
+    def wait_for(self, *types, timeout=5.0):
+        with self.lock:
+            assert self.lock.wait_for(lambda: set(types) <= set(self.received), timeout), self.received
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_the_driver_reconnects_to_js8call_and_keeps_its_replies(journal_file):
+    js8call = FakeJs8Call()
+    driver = Js8CallDriver(OverflowQueue(), FairQueue(), OverflowQueue(), addr=js8call.addr)
+    driver.reconnector = Reconnector(min_delay=0.02, max_delay=0.1)
+    comms = threading.Thread(target=driver.run_comms, daemon=True)
+    comms.start()
+
+    wait_until(lambda: driver.reconnector.attempt >= 3)  # JS8Call isn't up yet
+    js8call.start()
+    js8call.wait_for("STATION.GET_CALLSIGN", "RIG.GET_FREQ")
+    assert driver.link_stats() == {'connected': True, 'reconnects': 0, 'downtime_s': 0.0}
+
+    js8call.stop()
+    wait_until(lambda: not driver.link_stats()['connected'])
+    driver.b2c_q_p1.put(UnifiedMessage.create(
+        target="COMMS", typ="MB_MSG", verb="SEND", params={"destination": "G0ABC", "mb_msg": "E6 hello"},
+    ))
+    time.sleep(0.3)
+    assert driver.reconnector.attempt >= 2
+    assert driver.b2c_q_p1.qsize() == 1  # held while JS8Call is away
+
+    js8call.received.clear()
+    js8call.start()
+    js8call.wait_for("TX.SEND_MESSAGE")
+    assert js8call.received[:3] == ["STATION.GET_CALLSIGN", "RIG.GET_FREQ", "MODE.GET_SPEED"]
+    assert driver.b2c_q_p1.qsize() == 0
+    stats = driver.link_stats()
+    assert stats['connected'] and stats['reconnects'] == 1 and stats['downtime_s'] >= 0.3
+
+    driver.b2c_q_p0.put(UnifiedMessage.create(target="COMMS", typ="CONTROL", verb="SHUTDOWN"))
+    comms.join(5.0)
+    assert not comms.is_alive()
+    js8call.stop()
+    js8call.listener.close()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from mbserver.js8call_sim import Js8CallSimulator, answers, load_script
+from mbserver.tx_scheduler import TX_DUTY
+
+
+class FastSimulator(Js8CallSimulator):
+    frame_seconds = 0.05  # instead of the 15s of Normal speed
+
+
+def simulator(script=None):
+    return FastSimulator(
+        "M0SIM", 7078000, 1500, 0, 16.0, stations=0, interval=1.0, max_post_id=10, script=script, seed=1
+    )
+
+
+class Connection:
+    """The server's end of a connection to the simulator."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.received = []  # (type, value, params, when)
+
+    def send(self, typ, value=""):
+        self.writer.write((json.dumps({"type": typ, "value": value, "params": {"_ID": "42"}}) + "\n").encode())
+
+    async def read_until(self, done, timeout=5.0):
+        async def read():
+            while not done(self.received):
+                message = json.loads(await self.reader.readline())
+                self.received.append((message["type"], message["value"], message["params"], time.monotonic()))
+
+        await asyncio.wait_for(read(), timeout)
+
+
+def connect(sim, session):
+    # Run session(connection) against the simulator, as the server would talk to JS8Call
+    async def run():
+        server = await asyncio.start_server(sim.handle, "127.0.0.1", 0)
+        async with server:
+            connection = Connection(*await asyncio.open_connection(*server.sockets[0].getsockname()))
+            await session(connection)
+            connection.writer.close()
+            return connection.received
+
+    return asyncio.run(run())
+
+
+def types(received, typ=None):
+    return [r[0] for r in received if typ is None or r[0] == typ]
+
+
+def test_the_station_info_is_answered():
+    async def session(connection):
+        for typ in ("STATION.GET_CALLSIGN", "RIG.GET_FREQ", "MODE.GET_SPEED"):
+            connection.send(typ)
+        await connection.read_until(lambda received: len(received) == 3)
+
+    received = connect(simulator(), session)
+    assert [(typ, value) for typ, value, _, _ in received] == [
+        ("STATION.CALLSIGN", "M0SIM"), ("RIG.FREQ", ""), ("MODE.SPEED", "")
+    ]
+    assert all(params["_ID"] == "42" for _, _, params, _ in received)
+    assert received[1][2] == {"_ID": "42", "DIAL": 7078000, "FREQ": 7079500, "OFFSET": 1500}
+
+
+def test_a_reply_is_timed_and_transmitted_with_the_ptt():
+    sim = simulator(script=[(0.0, "G4AAA", "E~")])
+    reply = "G4AAA +E12~\n12 - 2026-01-27 - " + "x" * 40
+
+    async def session(connection):
+        await connection.read_until(lambda received: types(received) == ["RX.DIRECTED"])
+        connection.send("TX.SEND_MESSAGE", reply)
+        await connection.read_until(lambda received: len(types(received, "RIG.PTT")) == 2 * sim.frames(reply))
+        await asyncio.sleep(0.01)  # for the simulator to note the end of the transmission
+
+    received = connect(sim, session)
+    assert received[0][1] == "G4AAA: M0SIM E~ ♢"
+    ptt = [(value, at) for typ, value, _, at in received if typ == "RIG.PTT"]
+    assert [value for value, _ in ptt] == ["on", "off"] * sim.frames(reply)
+    for (_, on), (_, off) in zip(ptt[::2], ptt[1::2]):
+        assert off - on == pytest.approx(sim.frame_seconds * TX_DUTY, abs=0.03)
+
+    report = sim.report()
+    assert (report["requests"], report["answered"], report["transmissions"]) == (1, 1, 1)
+    assert report["airtime_s"] == pytest.approx(sim.frames(reply) * sim.frame_seconds * TX_DUTY, abs=0.1)
+    assert 0 < sim.requests[0].first_reply < sim.requests[0].first_reply_done
+
+
+def test_replies_are_matched_to_requests():
+    assert answers("E~", "G4AAA +E12~\n12 - 2026-01-27 - hello")
+    assert answers("E12,14~", "G4AAA +E14~\n14 - 2026-01-27 - hello")
+    assert not answers("E12,14~", "G4AAA +E13~\n13 - 2026-01-27 - hello")
+    assert answers("I~", "G4AAA +I~\nabout this blog")
+    assert not answers("G12~", "G4AAA +E12~\n12 - 2026-01-27 - hello")
+
+
+def test_a_script_is_read_in_time_order(tmp_path):
+    path = tmp_path / "script.txt"
+    path.write_text("# at station request\n12.5 G4AAA E~\n\n3 M0XYZ G12~\n")
+    assert load_script(str(path)) == [(3.0, "M0XYZ", "G12~"), (12.5, "G4AAA", "E~")]
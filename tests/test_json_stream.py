@@ -0,0 +1,108 @@
+import json
+import random
+
+import pytest
+
+from mbserver.json_stream import JsonLineDecoder
+
+
+def js8call_line(i):
+    # As JS8Call sends them, some with the ♢ terminator on the text
+    if i % 3 == 0:
+        message = {"type": "RX.DIRECTED", "value": f"G0ABC: M0BLOG E{i}~ ♢", "params": {"SNR": -i, "_ID": i}}
+    elif i % 3 == 1:
+        message = {"type": "STATION.STATUS", "value": "", "params": {"DIAL": 7078000, "OFFSET": 1000 + i}}
+    else:
+        message = {"type": "RX.ACTIVITY", "value": "CQ CQ ☺", "params": {"FREQ": 7079000 + i}}
+    return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def expected(lines):
+    return [json.loads(line.decode("utf-8").replace("♢", "")) for line in lines]
+
+
+def feed_all(chunks):
+    decoder = JsonLineDecoder()
+    messages = []
+    for chunk in chunks:
+        messages += decoder.feed(chunk)
+    return messages, decoder.pending()
+
+
+def test_a_stream_split_at_every_byte_boundary():
+    lines = [js8call_line(i) for i in range(4)]
+    stream = b"".join(lines)
+    for cut in range(len(stream) + 1):
+        assert feed_all([stream[:cut], stream[cut:]]) == (expected(lines), 0), cut
+
+
+def test_a_stream_split_at_every_pair_of_byte_boundaries():
+    lines = [js8call_line(0), js8call_line(1)]
+    stream = b"".join(lines)
+    for first in range(len(stream) + 1):
+        for second in range(first, len(stream) + 1):
+            chunks = [stream[:first], stream[first:second], stream[second:]]
+            assert feed_all(chunks) == (expected(lines), 0), (first, second)
+
+
+def test_a_stream_fed_one_byte_at_a_time():
+    lines = [js8call_line(i) for i in range(30)]
+    stream = b"".join(lines)
+    assert feed_all([stream[i:i + 1] for i in range(len(stream))]) == (expected(lines), 0)
+
+
+def test_random_recv_sizes_lose_nothing():
+    rng = random.Random(1)
+    lines = [js8call_line(i) for i in range(5000)]
+    stream = b"".join(lines)
+    for _ in range(20):
+        chunks, pos = [], 0
+        while pos < len(stream):
+            size = rng.randint(1, 65500)
+            chunks.append(stream[pos:pos + size])
+            pos += size
+        assert feed_all(chunks) == (expected(lines), 0)
+
+
+def test_a_bad_line_is_skipped_and_its_neighbours_kept():
+    lines = [js8call_line(0), b'{"type": "RX.DIRECTED", "value": \n', b"[1, 2]\n", js8call_line(1)]
+    assert feed_all([b"".join(lines)]) == (expected([lines[0], lines[3]]), 0)
+
+
+def test_a_partial_line_waits_for_the_rest():
+    line = js8call_line(0)
+    decoder = JsonLineDecoder()
+    assert decoder.feed(line[:10]) == []
+    assert decoder.pending() == 10
+    assert decoder.feed(line[10:]) == expected([line])
+
+
+def old_decode(content):
+    # How Js8CallApi.listen() decoded each recv before the decoder
+    content = content.replace("♢".encode("utf-8"), b"").replace(b"  '}", b"'}")
+    content = b"[" + content.replace(b"}\n{", b"},{") + b"]"
+    content = content.replace(b"}\n]", b"}]")
+    try:
+        return json.loads(content)
+    except ValueError:
+        return []
+
+
+@pytest.mark.benchmark
+def test_throughput_against_the_old_decoding(timer):
+    lines = [js8call_line(i) for i in range(5000)]
+    batches = [b"".join(lines[i:i + 20]) for i in range(0, len(lines), 20)]
+    stream = b"".join(lines)
+    recvs = [stream[i:i + 65500] for i in range(0, len(stream), 65500)]
+
+    def decode_new(chunks):
+        return lambda: feed_all(chunks)[0]
+
+    def decode_old(chunks):
+        return lambda: [message for chunk in chunks for message in old_decode(chunk)]
+
+    assert len(decode_new(recvs)()) == 5000
+    assert len(decode_old(recvs)()) < 5000  # messages split between recvs were lost
+    old, new = timer(decode_old(batches), repeat=3), timer(decode_new(batches), repeat=3)
+    print(f"\n5000 messages, 20 per recv: old {old * 1e3:.1f} ms, new {new * 1e3:.1f} ms")
+    assert new < old * 2
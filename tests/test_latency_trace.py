@@ -0,0 +1,37 @@
+from mbserver.latency_trace import LatencyTracer
+from mbserver.tx_scheduler import Transmission
+
+
+def test_a_request_whose_replies_all_collapse_is_no_longer_traced():
+    tracer = LatencyTracer(path="")
+    trace = tracer.start("G0ABC")
+    tracer.queued(trace, "E6~", 2)
+    tracer.collapsed(trace)
+    assert trace in tracer.open
+    tracer.collapsed(trace)
+    assert trace not in tracer.open
+    assert tracer.summary()['in_progress'] == 0
+
+
+def test_a_disabled_tracer_hands_out_ids_but_traces_nothing():
+    tracer = LatencyTracer(path="")
+    tracer.enabled = False
+    first, second = tracer.start("G0ABC"), tracer.start("G0ABC")
+    assert first != second
+    tracer.queued(first, "E6~", 1)
+    tracer.transmitted(Transmission("G0ABC", 1, 15.0, 0.0, started_at=1.0, ptt_off_at=13.0, trace=first), 13.0)
+    assert tracer.summary() == {'completed': 0, 'in_progress': 0, 'abandoned': 0}
+
+
+def test_a_transmission_does_not_complete_a_trace_the_backend_never_reported():
+    # As in a comms process: the trace is started, but queued() is called in the backend
+    tracer = LatencyTracer(path="")
+    trace = tracer.start("G0ABC")
+    tx = Transmission("G0ABC", 1, 15.0, 0.0, started_at=1.0, ptt_off_at=13.0, trace=trace)
+    tracer.transmitted(tx, 13.0)
+    assert tracer.summary()['completed'] == 0
+    tracer.queued(trace, "E6~", 2)
+    tracer.transmitted(tx, 13.0)
+    assert tracer.summary()['completed'] == 0  # one of two replies
+    tracer.transmitted(tx, 28.0)
+    assert tracer.summary()['completed'] == 1
@@ -0,0 +1,121 @@
+import json
+import random
+
+import pytest
+
+from mbserver.message_codec import MessageFrameDecoder, decode_message, encode_body, encode_message
+from mbserver.message_q import MessageParameter, MessageTarget, MessageType, MessageVerb, UnifiedMessage, _PARAM_KEYS
+
+
+def sample(i):
+    # A mix of what crosses the socket: requests, replies and signals, with every kind of value
+    if i % 3 == 0:
+        return UnifiedMessage.internal(1, MessageTarget.BACKEND, MessageType.REQUEST, MessageVerb.GET_POST, {
+            MessageParameter.SOURCE: "G0ABC", MessageParameter.POST_ID: i, MessageParameter.TRACE: i,
+        })
+    if i % 3 == 1:
+        return UnifiedMessage.internal(1, MessageTarget.COMMS, MessageType.MB_MSG, MessageVerb.SEND, {
+            MessageParameter.DESTINATION: "G0ABC", MessageParameter.MB_MSG: f"E{i} 2024-01-01 héllo ♢ " * 3,
+            MessageParameter.JOURNAL: None,
+        })
+    return UnifiedMessage.internal(0, MessageTarget.BACKEND, MessageType.SIGNAL, MessageVerb.NOTE_PTT, {
+        MessageParameter.PTT: i % 2 == 0, MessageParameter.FREQUENCY: 7078000.5,
+    })
+
+
+def fields(m):
+    return m.ts, m.priority, m.target, m.typ, m.verb, m.params
+
+
+def feed_all(chunks):
+    decoder = MessageFrameDecoder()
+    messages = []
+    for chunk in chunks:
+        messages += decoder.feed(chunk)
+    return [fields(m) for m in messages], len(decoder.buffer)
+
+
+def test_a_message_survives_the_round_trip():
+    for i in range(3):
+        m = sample(i)
+        assert fields(decode_message(encode_body(m))) == fields(m)
+    assert type(decode_message(encode_body(sample(0))).get_param(MessageParameter.POST_ID)) is int
+    assert decode_message(encode_body(sample(2))).get_param(MessageParameter.PTT) is True
+
+
+def test_a_stream_split_at_every_byte_boundary():
+    messages = [sample(i) for i in range(3)]
+    stream = b"".join(map(encode_message, messages))
+    for cut in range(len(stream) + 1):
+        assert feed_all([stream[:cut], stream[cut:]]) == ([fields(m) for m in messages], 0), cut
+
+
+def test_a_stream_split_at_every_pair_of_byte_boundaries():
+    messages = [sample(0), sample(2)]
+    stream = b"".join(map(encode_message, messages))
+    for first in range(len(stream) + 1):
+        for second in range(first, len(stream) + 1):
+            chunks = [stream[:first], stream[first:second], stream[second:]]
+            assert feed_all(chunks) == ([fields(m) for m in messages], 0), (first, second)
+
+
+def test_random_recv_sizes_lose_nothing():
+    rng = random.Random(1)
+    messages = [sample(i) for i in range(3000)]
+    stream = b"".join(map(encode_message, messages))
+    for _ in range(10):
+        chunks, pos = [], 0
+        while pos < len(stream):
+            size = rng.randint(1, 4096)
+            chunks.append(stream[pos:pos + size])
+            pos += size
+        assert feed_all(chunks) == ([fields(m) for m in messages], 0)
+
+
+def test_a_bad_frame_is_skipped_and_its_neighbours_kept():
+    good = [sample(0), sample(2)]
+    bad = encode_body(sample(1))[:-5]  # a string cut short
+    stream = encode_message(good[0]) + len(bad).to_bytes(4, "little") + bad + encode_message(good[1])
+    assert feed_all([stream]) == ([fields(m) for m in good], 0)
+
+
+def test_an_oversized_frame_means_a_corrupt_stream():
+    with pytest.raises(ValueError):
+        MessageFrameDecoder().feed(b"\xff\xff\xff\xff")
+
+
+def as_json(m):
+    # What the frames would be as JSON lines, the alternative the codec was chosen over
+    return (json.dumps({
+        "ts": m.ts, "priority": m.priority, "target": m.target.name, "typ": m.typ.name, "verb": m.verb.name,
+        "params": m.params,
+    }) + "\n").encode()
+
+
+PARAMS_BY_KEY = {key: p for p, key in _PARAM_KEYS.items()}
+
+
+def from_json(line):
+    d = json.loads(line)
+    m = UnifiedMessage.internal(
+        d["priority"], MessageTarget[d["target"]], MessageType[d["typ"]], MessageVerb[d["verb"]],
+        {PARAMS_BY_KEY[k]: v for k, v in d["params"].items()},
+    )
+    m.ts = d["ts"]
+    return m
+
+
+@pytest.mark.benchmark
+def test_codec_against_json(timer):
+    messages = [sample(i) for i in range(3000)]
+    frames, lines = b"".join(map(encode_message, messages)), b"".join(map(as_json, messages))
+    assert [fields(from_json(line)) for line in lines.splitlines()] == [fields(m) for m in messages]
+
+    codec = timer(lambda: MessageFrameDecoder().feed(b"".join(map(encode_message, messages))), repeat=3)
+    text = timer(lambda: [from_json(line) for line in b"".join(map(as_json, messages)).splitlines()], repeat=3)
+    print(
+        f"\n3000 messages encoded and decoded: codec {codec * 1e3:.1f} ms ({len(frames)} bytes),"
+        f" JSON {text * 1e3:.1f} ms ({len(lines)} bytes)"
+    )
+    assert len(frames) < len(lines)
+    assert codec < text * 2
@@ -0,0 +1,257 @@
+import threading
+import time
+
+import pytest
+
+from mbserver import message_q
+from mbserver.message_q import (
+    FairQueue, MessageParameter, MessageTarget, MessageType, MessageVerb, OverflowQueue, UnifiedMessage
+)
+
+
+def message(verb, typ="SIGNAL"):
+    return UnifiedMessage.create(target="BACKEND", typ=typ, verb=verb)
+
+
+def full_of_requests(capacity=2):
+    q = OverflowQueue(capacity)
+    for _ in range(capacity):
+        assert q.put(message("GET_POST", "REQUEST"))
+    return q
+
+
+def test_a_signal_is_dropped_at_once_and_counted_once():
+    q = full_of_requests()
+    started = time.monotonic()
+    assert not q.put_wait(message("NOTE_RX"), timeout=5.0)
+    assert time.monotonic() - started < 1.0
+    assert q.stats()['dropped'] == 1
+    assert q.stats()['refused'] == 0
+
+
+def test_a_request_waits_for_room():
+    q = full_of_requests()
+    getter = threading.Timer(0.1, q.get)
+    getter.start()
+    assert q.put_wait(message("GET_LISTING", "REQUEST"), timeout=5.0)
+    getter.join()
+    assert q.qsize() == 2
+    assert q.stats()['refused'] == 0
+
+
+def test_a_request_is_refused_after_the_timeout_and_counted_once():
+    q = full_of_requests()
+    started = time.monotonic()
+    assert not q.put_wait(message("GET_LISTING", "REQUEST"), timeout=0.2)
+    assert time.monotonic() - started >= 0.2
+    assert q.stats()['refused'] == 1
+
+
+def test_a_request_takes_the_place_of_a_signal():
+    q = OverflowQueue(2)
+    q.put(message("NOTE_PTT"))
+    q.put(message("GET_POST", "REQUEST"))
+    assert q.put_wait(message("GET_LISTING", "REQUEST"), timeout=0.0)
+    assert [m.verb.name for m in q.queue] == ["GET_POST", "GET_LISTING"]
+    assert q.stats()['dropped'] == 1
+    assert q.unfinished_tasks == 2
+
+
+def test_essential_messages_are_always_queued():
+    q = full_of_requests()
+    assert q.put_wait(message("NOTE_CALLSIGN"), timeout=0.0)
+    assert q.put(message("SHUTDOWN", "CONTROL"))
+    assert q.qsize() == 4
+
+
+def reply(destination, text, trace=None):
+    params = {"destination": destination, "mb_msg": text}
+    if trace is not None:
+        params["trace"] = trace
+    return UnifiedMessage.create(target="COMMS", typ="MB_MSG", verb="SEND", params=params)
+
+
+def test_a_duplicate_reply_is_collapsed_and_reported():
+    q = FairQueue()
+    queued, collapsed = [], []
+    q.on_queued = queued.append
+    q.on_collapsed = collapsed.append
+    first, second = reply("G0ABC", "E6 hello", trace=1), reply("G0ABC", "E6 hello", trace=2)
+    assert q.put(first)
+    assert q.put(second)
+    assert q.put(reply("M0XYZ", "E6 hello", trace=3))
+    assert queued[:1] == [first] and collapsed == [second]
+    assert q.qsize() == 2
+    assert q.stats()["G0ABC"]["collapsed"] == 1
+
+
+def test_collapsing_can_be_turned_off():
+    q = FairQueue(collapse=False)
+    q.put(reply("G0ABC", "E6 hello"))
+    q.put(reply("G0ABC", "E6 hello"))
+    assert q.qsize() == 2
+
+
+def fields(m):
+    return m.priority, m.target, m.typ, m.verb, m.params
+
+
+def offset_signal(offset):
+    # As Js8CallDriver.signal_backend makes one for every STATION.STATUS
+    return UnifiedMessage.internal(
+        0, MessageTarget.BACKEND, MessageType.SIGNAL, MessageVerb.NOTE_OFFSET, {MessageParameter.OFFSET: offset}
+    )
+
+
+def test_internal_makes_the_same_message_as_create():
+    created = UnifiedMessage.create(
+        priority=0, target="BACKEND", typ="SIGNAL", verb="NOTE_OFFSET", params={"offset": 1500}
+    )
+    assert fields(offset_signal(1500)) == fields(created)
+
+
+def test_strings_are_taken_by_name_or_value_in_any_case():
+    for target in ("COMMS", "comms", " Comms ", MessageTarget.COMMS.value):
+        assert UnifiedMessage.create(target=target).target is MessageTarget.COMMS
+    assert UnifiedMessage.create(verb=MessageVerb.NOTE_PTT.value.upper()).verb is MessageVerb.NOTE_PTT
+    with pytest.raises(ValueError):
+        UnifiedMessage.create(target="RADIO")
+    with pytest.raises(ValueError):
+        UnifiedMessage.create(params={"bandwidth": 50})
+
+
+def test_a_parameter_can_be_read_by_member_name_value_or_stored_key():
+    m = offset_signal(1500)
+    assert m.params == {"MessageParameter.OFFSET": 1500}
+    for key in (MessageParameter.OFFSET, "offset", "OFFSET", " Offset ", "MessageParameter.OFFSET"):
+        assert m.get_param(key) == 1500, key
+    assert m.get_param("trace") is None
+    with pytest.raises(ValueError):
+        m.get_param("bandwidth")
+
+
+def test_internal_is_only_checked_when_validation_is_on(monkeypatch):
+    monkeypatch.setattr(message_q, "VALIDATE_MESSAGES", False)
+    assert UnifiedMessage.internal(0, "BACKEND", MessageType.SIGNAL, MessageVerb.NOTE_RX).target == "BACKEND"
+    monkeypatch.setattr(message_q, "VALIDATE_MESSAGES", True)
+    with pytest.raises(TypeError):
+        UnifiedMessage.internal(0, "BACKEND", MessageType.SIGNAL, MessageVerb.NOTE_RX)
+    with pytest.raises(TypeError):
+        UnifiedMessage.internal(0, MessageTarget.BACKEND, MessageType.SIGNAL, MessageVerb.NOTE_RX, {"rx": True})
+    assert offset_signal(1500).verb is MessageVerb.NOTE_OFFSET  # a valid message passes
+
+
+@pytest.mark.benchmark
+def test_dispatch_throughput(timer, monkeypatch):
+    monkeypatch.setattr(message_q, "VALIDATE_MESSAGES", False)
+    n = 20000
+
+    def created():
+        for offset in range(n):
+            UnifiedMessage.create(priority=0, target="BACKEND", typ="SIGNAL", verb="NOTE_OFFSET",
+                                  params={"offset": offset})
+
+    def internal():
+        for offset in range(n):
+            offset_signal(offset)
+
+    def queued():
+        q = OverflowQueue(n)
+        for offset in range(n):
+            q.put(offset_signal(offset))
+        while not q.empty():
+            q.get_nowait()
+            q.task_done()
+
+    slow, fast, through_queue = timer(created, repeat=3), timer(internal, repeat=3), timer(queued, repeat=3)
+    print(
+        f"\nNOTE_OFFSET signals: create() {n / slow:,.0f}/s, internal() {n / fast:,.0f}/s"
+        f" ({slow / fast:.1f}x); internal() through an OverflowQueue {n / through_queue:,.0f}/s"
+    )
+    assert fast < slow
+
+
+def drain(q):
+    sent = []
+    while not q.empty():
+        sent.append(q.get_nowait())
+    return sent
+
+
+def test_a_station_flooding_the_queue_cannot_starve_another():
+    q = FairQueue(station_size=10, quantum=100)
+    for i in range(10):
+        q.put(reply("G0ABC", f"E{i} " + "x" * 250))
+    assert q.get_nowait().get_param(MessageParameter.DESTINATION) == "G0ABC"
+    short = reply("M0XYZ", "E6 hello")
+    q.put(short)
+    assert q.get_nowait() is short  # next out, not behind the nine long replies still waiting
+    assert len(drain(q)) == 9
+
+
+def test_stations_take_turns_weighted_by_message_length():
+    q = FairQueue(station_size=20, quantum=100)
+    for i in range(20):
+        q.put(reply("G0ABC", f"E{i:02d} " + "x" * 196))  # 201 characters with the newline
+        q.put(reply("M0XYZ", f"E{i:02d} " + "x" * 46))  # 51
+    served = {"G0ABC": 0, "M0XYZ": 0}
+    for m in [q.get_nowait() for _ in range(20)]:
+        served[m.get_param(MessageParameter.DESTINATION)] += len(m.get_param(MessageParameter.MB_MSG)) + 1
+    # Much the same airtime each, so the station with short replies gets about four times as many out
+    assert abs(served["G0ABC"] - served["M0XYZ"]) <= 100 + 201
+    assert q.stats()["M0XYZ"]["sent"] > 3 * q.stats()["G0ABC"]["sent"]
+
+
+def test_a_message_put_back_keeps_its_turn():
+    q = FairQueue(quantum=100)
+    q.put(reply("G0ABC", "E1 " + "x" * 150))
+    q.put(reply("G0ABC", "E2 " + "x" * 150))
+    q.put(reply("M0XYZ", "E1 " + "x" * 150))
+    m = q.get_nowait()
+    queued = []
+    q.on_queued = queued.append
+    deficit = dict(q.deficit)
+    q.put_back(m)
+    assert q.waiting()[0] == "G0ABC"
+    assert q.qsize() == 3
+    assert q.stats()["G0ABC"]["sent"] == 0
+    assert queued == []  # not journalled a second time
+    assert q.get_nowait() is m
+    assert q.deficit == deficit  # charged once, as if it had never been given back
+    assert [m.get_param(MessageParameter.DESTINATION) for m in drain(q)] == ["M0XYZ", "G0ABC"]
+
+
+def test_a_message_put_back_by_a_station_with_nothing_else_waiting():
+    q = FairQueue()
+    q.put(reply("M0XYZ", "E1 hello"))
+    m = q.get_nowait()
+    q.put(reply("G0ABC", "E6 hello"))
+    q.put_back(m)
+    assert q.waiting() == ["M0XYZ", "G0ABC"]
+    assert drain(q)[0] is m
+
+
+def test_duplicates_collapse_into_the_message_waiting():
+    q = FairQueue()
+    for trace in range(5):
+        q.put(reply("G0ABC", "E6 hello", trace=trace))
+    q.put(reply("G0ABC", "E7 hello"))
+    sent = drain(q)
+    assert [m.get_param(MessageParameter.TRACE) for m in sent] == [0, None]
+    assert q.stats()["G0ABC"]["collapsed"] == 4
+    assert q.airtime_saved > 0
+
+    q.put(reply("G0ABC", "E6 hello"))  # the first copy has gone, so this one is queued
+    assert q.qsize() == 1
+
+
+def test_each_message_goes_to_exactly_one_hook():
+    q = FairQueue(station_size=2)
+    queued, collapsed = [], []
+    q.on_queued = queued.append
+    q.on_collapsed = collapsed.append
+    messages = [reply("G0ABC", text) for text in ("E1 a", "E1 a", "E2 b", "E3 c")]
+    assert [q.put(m) for m in messages] == [True, True, True, False]
+    assert queued == [messages[0], messages[2]]
+    assert collapsed == [messages[1]]  # and the one dropped for want of room goes to neither
+    assert q.stats()["G0ABC"]["dropped"] == 1
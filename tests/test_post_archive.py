@@ -0,0 +1,81 @@
+import pytest
+
+from mbserver.post_archive import PostArchive, pack_posts, unpack_posts
+from mbserver.post_index import PostIndex
+
+
+def write_posts(posts_dir, count):
+    posts_dir.mkdir()
+    for post_id in range(1, count + 1):
+        name = f"{post_id:04d} - 2026-01-{post_id % 28 + 1:02d} - Post {post_id}.txt"
+        (posts_dir / name).write_text(f"Body of post {post_id}\n", encoding="utf-8")
+
+
+def test_posts_are_served_from_the_archive_once_packed(tmp_path):
+    posts_dir, archive_file = tmp_path / "posts", str(tmp_path / "posts.mbar")
+    write_posts(posts_dir, 30)
+    assert pack_posts(str(posts_dir), archive_file, remove=True) == 30
+    assert not list(posts_dir.glob("*.txt"))
+
+    archive = PostArchive(archive_file, str(posts_dir))
+    archive.build()
+    assert archive.ids == list(range(1, 31))
+    assert archive.read_bytes(17) == b"Body of post 17\n"
+    archive.close()
+
+
+def test_unpacking_gives_back_the_post_files(tmp_path):
+    posts_dir, archive_file = tmp_path / "posts", str(tmp_path / "posts.mbar")
+    write_posts(posts_dir, 3)
+    before = {p.name: p.read_bytes() for p in posts_dir.iterdir()}
+    pack_posts(str(posts_dir), archive_file, remove=True)
+    assert unpack_posts(archive_file, str(posts_dir)) == 3
+    assert {p.name: p.read_bytes() for p in posts_dir.iterdir()} == before
+
+
+def test_removing_leaves_a_file_shadowed_by_another_with_its_id(tmp_path):
+    posts_dir, archive_file = tmp_path / "posts", str(tmp_path / "posts.mbar")
+    write_posts(posts_dir, 3)
+    shadowed = posts_dir / "0002 - 2026-01-01 - Older post 2.txt"  # sorts first, so isn't served
+    shadowed.write_text("Older body of post 2\n", encoding="utf-8")
+    assert pack_posts(str(posts_dir), archive_file, remove=True) == 3
+    assert [p.name for p in posts_dir.iterdir()] == [shadowed.name]
+
+    archive = PostArchive(archive_file, str(tmp_path / "empty"))
+    archive.build()
+    assert archive.read_bytes(2) == b"Body of post 2\n"
+    archive.close()
+
+
+@pytest.mark.benchmark
+def test_startup_and_first_response_against_the_posts_directory(tmp_path, timer):
+    posts_dir, archive_file = tmp_path / "posts", str(tmp_path / "posts.mbar")
+    write_posts(posts_dir, 10_000)
+    pack_posts(str(posts_dir), archive_file)
+    empty_dir = str(tmp_path / "empty")
+
+    def first_response(index):
+        # Startup, then the body of the latest post, as for a G~ straight after starting
+        index.build()
+        body = index.read(index.latest())
+        if isinstance(index, PostArchive):
+            index.close()
+        return body
+
+    assert first_response(PostArchive(archive_file, empty_dir)) == first_response(PostIndex(str(posts_dir)))
+    directory = timer(lambda: first_response(PostIndex(str(posts_dir))), repeat=3)
+    archive = timer(lambda: first_response(PostArchive(archive_file, empty_dir)), repeat=3)
+
+    directory_index, archive_index = PostIndex(str(posts_dir)), PostArchive(archive_file, empty_dir)
+    directory_index.build()
+    archive_index.build()
+    ids = directory_index.ids[::97]
+    directory_get = timer(lambda: [directory_index.read(directory_index.get(i)) for i in ids], number=10) / len(ids)
+    archive_get = timer(lambda: [archive_index.read(archive_index.get(i)) for i in ids], number=10) / len(ids)
+    archive_index.close()
+    print(
+        f"\n10000 posts: startup and first response: directory {directory * 1e3:.1f} ms, archive {archive * 1e3:.1f} ms;"
+        f" per GET: directory {directory_get * 1e6:.1f} us, archive {archive_get * 1e6:.1f} us"
+    )
+    assert archive < directory
+    assert archive_get < directory_get
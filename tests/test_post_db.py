@@ -0,0 +1,145 @@
+import logging
+import os
+import random
+
+import pytest
+
+from mbserver.post_db import PostDb
+
+
+def write_post(posts_dir, post_id, post_date, title, body, mtime_ns=None):
+    path = posts_dir / f"{post_id:04d} - {post_date} - {title}.txt"
+    path.write_text(body, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+@pytest.fixture
+def posts_dir(tmp_path):
+    posts_dir = tmp_path / "posts"
+    posts_dir.mkdir()
+    write_post(posts_dir, 1, "2026-01-01", "River levels", "The river is rising after the rain.\n")
+    write_post(posts_dir, 2, "2026-01-02", "Flood warning", "Flooding expected on the low road.\n")
+    write_post(posts_dir, 3, "2026-01-02", "Net times", "The net meets at 1900 on 7078.\n")
+    return posts_dir
+
+
+def open_db(tmp_path, posts_dir):
+    db = PostDb(str(tmp_path / "db" / "posts.db"), str(posts_dir))
+    db.build()
+    return db
+
+
+def test_the_posts_directory_is_imported(tmp_path, posts_dir):
+    db = open_db(tmp_path, posts_dir)
+    assert len(db) == 3
+    assert db.recent(2) == [3, 2]
+    assert db.latest().listing == "0003 - 2026-01-02 - Net times"
+    assert db.ids_for_date("2026-01-02") == [3, 2]
+    assert db.ids_for_date_range("2026-01-01", "2026-01-31") == [3, 2, 1]
+    assert db.read(db.get(2)) == "Flooding expected on the low road.\n"
+    assert db.get(4) is None
+    db.close()
+
+
+def test_the_database_is_the_store_of_record(tmp_path, posts_dir):
+    db = open_db(tmp_path, posts_dir)
+    db.close()
+    for path in posts_dir.iterdir():
+        path.unlink()
+
+    db = open_db(tmp_path, posts_dir)
+    assert len(db) == 3
+    assert db.search("rain", 10) == [1]
+    assert db.remove_file("0001 - 2026-01-01 - River levels.txt") is False
+    db.close()
+
+
+def test_only_new_or_changed_files_are_imported_again(tmp_path, posts_dir, caplog):
+    caplog.set_level(logging.INFO, logger="mbserver.post_db")
+    db = open_db(tmp_path, posts_dir)
+    stamps = {post_id: db.stamp(db.get(post_id)) for post_id in (1, 2, 3)}
+    db.build()
+    assert "Imported 0 posts" in caplog.records[-1].getMessage()
+
+    write_post(posts_dir, 2, "2026-01-02", "Flood warning", "All clear: the water has gone down.\n",
+               mtime_ns=os.stat(posts_dir / "0002 - 2026-01-02 - Flood warning.txt").st_mtime_ns + 10**9)
+    db.build()
+    assert "Imported 1 posts" in caplog.records[-1].getMessage()
+    assert db.read(db.get(2)) == "All clear: the water has gone down.\n"
+    assert db.stamp(db.get(2)) != stamps[2]
+    assert db.stamp(db.get(1)) == stamps[1]
+    db.close()
+
+
+def test_the_search_index_follows_imports_and_updates(tmp_path, posts_dir):
+    db = open_db(tmp_path, posts_dir)
+    assert db.search("flooding", 10) == [2]
+    assert db.search("the", 10) == [3, 2, 1]
+    assert db.search("the", 2) == [3, 2]
+    assert db.search("flood", 10) == [2]  # in the title
+
+    write_post(posts_dir, 2, "2026-01-02", "All clear", "The water has gone down.\n")
+    write_post(posts_dir, 4, "2026-01-03", "Flooding again", "More rain.\n")
+    assert db.add_file("0002 - 2026-01-02 - All clear.txt")
+    assert db.add_file("0004 - 2026-01-03 - Flooding again.txt")
+    assert db.search("flooding", 10) == [4]  # the old body of post 2 is gone from the index
+    assert db.search("water", 10) == [2]
+    assert db.search("rain", 10) == [4, 1]
+    assert db.search("rain river", 10) == [1]  # every word must match
+    db.close()
+
+
+@pytest.mark.parametrize("text", [
+    '"', 'flood"', 'flood" OR "net', "NEAR(flood net)", "title:flood", "flood*", "-flood", "^flood",
+    "flood AND", "NOT flood", "(", "'; DROP TABLE posts; --", "",
+])
+def test_search_takes_any_text_as_plain_words(tmp_path, posts_dir, text):
+    db = open_db(tmp_path, posts_dir)
+    assert set(db.search(text, 10)) <= {2}  # never a syntax error, and no operator takes effect
+    assert len(db) == 3
+    db.close()
+
+
+def test_search_operators_are_taken_as_words(tmp_path, posts_dir):
+    db = open_db(tmp_path, posts_dir)
+    assert db.search('flood" OR "net', 10) == []  # no post has all of flood, OR and net
+    assert db.search("NOT flood", 10) == []
+    assert db.search("on OR", 10) == []
+    assert db.search("", 10) == []
+    assert db.search("---", 10) == []
+    assert db.search("flood", 0) == []
+    db.close()
+
+
+WORDS = ["river", "rain", "net", "road", "bridge", "power", "water", "school", "wind", "snow", "ice", "field"]
+
+
+@pytest.mark.benchmark
+def test_search_latency_at_100k_posts(tmp_path, timer):
+    rng = random.Random(1)
+    db = PostDb(str(tmp_path / "posts.db"), str(tmp_path / "empty"))
+    conn = db._open()
+    rows = []
+    for post_id in range(1, 100_001):
+        body = " ".join(rng.choices(WORDS, k=40))
+        if post_id % 10_000 == 0:
+            body += " flooding"
+        title = f"Post {post_id}"
+        rows.append((post_id, "2026-01-01", title, f"{post_id:04d} - 2026-01-01 - {title}", body, None, None, None, 0))
+    conn.executemany("INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    db.build()
+    assert len(db) == 100_000
+
+    assert db.search("flooding", 20) == list(range(100_000, 0, -10_000))
+    rare = timer(lambda: db.search("flooding", 20), number=20)
+    common = timer(lambda: db.search("river", 20), number=20)
+    both = timer(lambda: db.search("river rain", 20), number=20)
+    print(
+        f"\n100000 posts, the first 20 matches: rare word {rare * 1e3:.2f} ms, common word {common * 1e3:.2f} ms,"
+        f" two common words {both * 1e3:.2f} ms"
+    )
+    db.close()
+    assert max(rare, common, both) < 0.05
@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+from mbserver.post_index import PostIndex, PostMeta
+
+
+def post_name(post_id, post_date, width=4):
+    return f"{post_id:0{width}d} - {post_date} - Post number {post_id}.txt"
+
+
+def random_posts(count, seed=1):
+    # Post IDs with gaps, several posts on most dates, not in date order
+    rng = random.Random(seed)
+    ids = rng.sample(range(1, count * 3), count)
+    return {post_id: f"202{rng.randint(0, 5)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" for post_id in ids}
+
+
+def synthetic_index(posts):
+    # An index of posts that aren't on disk, for sizes too large to write out
+    index = PostIndex("posts")
+    by_id = {
+        post_id: PostMeta(post_id, post_date, f"Post number {post_id}", post_name(post_id, post_date)[:-4])
+        for post_id, post_date in posts.items()
+    }
+    index._load(by_id, {post_name(post_id, post_date): post_id for post_id, post_date in posts.items()})
+    return index
+
+
+def expected_range(posts, date_from, date_to):
+    # Most recent date first, and the highest ID first within a date
+    return [post_id for post_id, post_date in sorted(posts.items(), key=lambda p: (p[1], p[0]), reverse=True)
+            if date_from <= post_date <= date_to]
+
+
+@pytest.fixture
+def posts_on_disk(tmp_path):
+    posts = random_posts(2000)
+    for post_id, post_date in posts.items():
+        (tmp_path / post_name(post_id, post_date)).write_text(f"Body {post_id}", encoding="utf-8")
+    return tmp_path, posts
+
+
+def test_lookups_match_the_posts_on_disk(posts_on_disk):
+    posts_dir, posts = posts_on_disk
+    index = PostIndex(str(posts_dir))
+    index.build()
+
+    assert index.ids == sorted(posts)
+    assert index.recent(10) == sorted(posts, reverse=True)[:10]
+    assert index.latest().post_id == max(posts)
+    assert index.get(min(posts)).path == str(posts_dir / post_name(min(posts), posts[min(posts)]))
+    some_date = posts[min(posts)]
+    assert index.ids_for_date(some_date) == expected_range(posts, some_date, some_date)
+    assert index.ids_for_date_range("2021-03-01", "2023-06-30") == expected_range(posts, "2021-03-01", "2023-06-30")
+    assert index.ids_for_date_range("2030-01-01", "2030-12-31") == []
+
+
+def test_adding_and_removing_files_keeps_the_index_as_a_rebuild_would(posts_on_disk):
+    posts_dir, posts = posts_on_disk
+    index = PostIndex(str(posts_dir))
+    index.build()
+
+    rng = random.Random(2)
+    removed = rng.sample(sorted(posts), 500)
+    for post_id in removed:
+        name = post_name(post_id, posts[post_id])
+        (posts_dir / name).unlink()
+        assert index.remove_file(name)
+    added = {post_id: "2026-01-25" for post_id in range(10_000, 10_300)}
+    for post_id, post_date in rng.sample(sorted(added.items()), len(added)):
+        name = post_name(post_id, post_date)
+        (posts_dir / name).write_text("new", encoding="utf-8")
+        assert index.add_file(name)
+
+    rebuilt = PostIndex(str(posts_dir))
+    rebuilt.build()
+    assert index.ids == rebuilt.ids
+    assert index.dates == rebuilt.dates
+    assert index.by_date == rebuilt.by_date
+    assert index.by_id == rebuilt.by_id
+
+
+def test_a_later_file_with_the_same_id_takes_over_and_hands_back(tmp_path):
+    (tmp_path / "0005 - 2026-01-01 - Draft.txt").write_text("draft", encoding="utf-8")
+    index = PostIndex(str(tmp_path))
+    index.build()
+    (tmp_path / "0005 - 2026-01-02 - Final.txt").write_text("final", encoding="utf-8")
+    index.add_file("0005 - 2026-01-02 - Final.txt")
+    assert index.get(5).title == "Final"
+    assert index.ids_for_date("2026-01-01") == []
+    index.remove_file("0005 - 2026-01-02 - Final.txt")
+    assert index.get(5).title == "Draft"
+
+
+@pytest.mark.benchmark
+def test_lookup_time_does_not_grow_with_the_number_of_posts(timer):
+    timings = {}
+    for count in (1_000, 100_000):
+        posts = random_posts(count)
+        index = synthetic_index(posts)
+        some_id, some_date = next(iter(posts.items()))
+
+        def lookups():
+            index.get(some_id)
+            index.recent(5)
+            index.latest()
+            index.ids_for_date(some_date)
+
+        timings[count] = timer(lookups, number=2000)
+        print(f"\n{count} posts: {timings[count] * 1e6:.2f} us per request's lookups")
+    assert timings[100_000] < timings[1_000] * 3
+
+
+@pytest.mark.benchmark
+def test_listing_three_posts_is_quicker_than_globbing_for_them(posts_on_disk, timer):
+    # What E6,10,12~ cost before the index: a glob of posts_dir for each ID
+    posts_dir, posts = posts_on_disk
+    wanted = sorted(posts)[:3]
+    index = PostIndex(str(posts_dir))
+    index.build()
+
+    def by_glob():
+        return [sorted(posts_dir.glob(f"{post_id:04d}*.txt"))[-1].name for post_id in wanted]
+
+    def by_index():
+        return [f"{index.get(post_id).listing}.txt" for post_id in wanted]
+
+    assert by_index() == by_glob()
+    globbed, indexed = timer(by_glob, repeat=3), timer(by_index, number=1000)
+    print(f"\nE with 3 IDs over {len(posts)} posts: glob {globbed * 1e3:.2f} ms, index {indexed * 1e6:.2f} us")
+    assert indexed * 100 < globbed
+
+
+def test_ids_past_9999_sort_numerically(tmp_path):
+    for post_id, width in ((9998, 4), (9999, 4), (10000, 5), (10001, 1), (123, 5), (12, 4)):
+        (tmp_path / post_name(post_id, "2026-01-25", width)).write_text(str(post_id), encoding="utf-8")
+    index = PostIndex(str(tmp_path))
+    index.build()
+    assert index.ids == [12, 123, 9998, 9999, 10000, 10001]
+    assert index.recent(3) == [10001, 10000, 9999]
+    assert index.latest().post_id == 10001
+    assert index.get(12).listing.startswith("0012 ")  # not 00123, which a glob for 0012* also matched
+    assert index.ids_for_date("2026-01-25") == [10001, 10000, 9999, 9998, 123, 12]
+
+
+def test_padded_and_unpadded_names_are_the_same_post(tmp_path):
+    (tmp_path / post_name(12, "2026-01-01", 4)).write_text("padded", encoding="utf-8")
+    (tmp_path / post_name(12, "2026-01-02", 2)).write_text("unpadded", encoding="utf-8")
+    index = PostIndex(str(tmp_path))
+    index.build()
+    assert index.ids == [12]
+    assert index.get(12).post_date == "2026-01-02"  # the name that sorts last, as before
+    assert sorted(index.scan_report.duplicates[12]) == sorted(f.name for f in tmp_path.iterdir())
+
+
+def test_most_recent_at_120k_posts():
+    posts = random_posts(120_000, seed=3)
+    index = synthetic_index(posts)
+    newest = sorted(posts, reverse=True)
+    assert newest[0] > 9999
+    assert index.recent(5) == newest[:5]
+    assert index.latest().post_id == newest[0]
+    index._link(PostMeta(newest[0] + 1, "2020-01-01", "Late", "late"))
+    assert index.recent(2) == [newest[0] + 1, newest[0]]
+    assert index.ids_for_date_range("2020-01-01", "2020-01-01")[0] == newest[0] + 1
@@ -0,0 +1,74 @@
+import os
+
+from mbserver import clock
+from mbserver.clock import SimulatedClock
+from mbserver.post_index import PostIndex
+from mbserver.post_watcher import PostWatcher
+
+
+class RecordingIndex(PostIndex):
+    def __init__(self, posts_dir):
+        super().__init__(posts_dir)
+        self.added = []
+
+    def add_file(self, file_name):
+        self.added.append(file_name)
+        return super().add_file(file_name)
+
+
+def polling_watcher(tmp_path):
+    index = RecordingIndex(str(tmp_path))
+    watcher = PostWatcher(index, poll_interval=0.0)
+    watcher.start()
+    watcher.close()  # as where there is no inotify
+    return index, watcher
+
+
+def touch(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_polling_picks_up_added_edited_and_removed_posts(tmp_path):
+    first = tmp_path / "0001 - 2026-01-01 - First.txt"
+    first.write_text("one", encoding="utf-8")
+    touch(first, 1_000_000_000)
+    index, watcher = polling_watcher(tmp_path)
+    assert index.ids == [1]
+
+    second = tmp_path / "0002 - 2026-01-02 - Second.txt"
+    second.write_text("two", encoding="utf-8")
+    watcher.poll()
+    assert index.ids == [1, 2]
+    assert index.added == [second.name]
+
+    first.write_text("one, edited", encoding="utf-8")
+    touch(first, 2_000_000_000)
+    watcher.poll()
+    assert index.added == [second.name, first.name]
+
+    watcher.poll()  # nothing changed
+    assert len(index.added) == 2
+
+    second.unlink()
+    watcher.poll()
+    assert index.ids == [1]
+
+
+def test_polling_is_timed_by_the_server_clock(tmp_path):
+    index = RecordingIndex(str(tmp_path))
+    watcher = PostWatcher(index, poll_interval=30.0)
+    watcher.start()
+    watcher.close()
+    previous = clock.use_clock(SimulatedClock(start=1000.0))
+    try:
+        watcher.poll()  # the first poll is due at once
+        post = tmp_path / "0001 - 2026-01-01 - First.txt"
+        post.write_text("one", encoding="utf-8")
+        clock.get_clock().advance(29)
+        watcher.poll()
+        assert index.added == []
+        clock.get_clock().advance(1)
+        watcher.poll()
+        assert index.added == [post.name]
+    finally:
+        clock.use_clock(previous)
@@ -0,0 +1,92 @@
+import pytest
+
+from mbserver import clock, js8call_driver, mb_server
+from mbserver.mb_server import MbServer, send_to_comms
+from mbserver.message_q import MessageParameter, MessageVerb
+
+RADIOS = (("IC-7300", "127.0.0.1", 1), ("FT-991", "127.0.0.1", 2))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # Two radios served by one backend, each with its own callsign
+    monkeypatch.setattr(js8call_driver, "tx_journal", str(tmp_path / "tx.journal"))
+    monkeypatch.setattr(mb_server, "posts_url_root", "")
+    server = MbServer(radio_settings=RADIOS)
+    drain(server.c2b_q)
+    for name, callsign in (("IC-7300", "M0BLOG"), ("FT-991", "M0ABC")):
+        server.radios[name].comms.signal_backend(
+            MessageVerb.NOTE_CALLSIGN, {MessageParameter.CALLSIGN: callsign}
+        )
+    handle_all(server)
+    yield server
+    for radio in server.radios.values():
+        radio.comms.journal.close()
+        radio.comms.js8call_api.sock.close()
+
+
+def drain(q):
+    messages = []
+    while not q.empty():
+        messages.append(q.get_nowait())
+    return messages
+
+
+def handle_all(server):
+    # As run_server does for each message from the comms drivers
+    while not server.c2b_q.empty():
+        m = server.c2b_q.get_nowait()
+        radio = server.radio_for(m)
+        for m_out in server.handle_comms_message(radio, m):
+            send_to_comms(m_out, radio)
+
+
+def outbound(radio):
+    # The destinations of the messages waiting to go out on a radio
+    return [m.get_param(MessageParameter.DESTINATION) for m in drain(radio.comms.b2c_q_p1)]
+
+
+def test_each_radio_knows_its_own_blog(server):
+    assert [(radio.name, radio.this_blog) for radio in server.radios.values()] == [
+        ("IC-7300", "M0BLOG"), ("FT-991", "M0ABC")
+    ]
+    assert server.radios["FT-991"].label == " via FT-991"
+
+
+def test_a_reply_goes_back_on_the_radio_the_request_came_in_on(server):
+    ic7300, ft991 = server.radios["IC-7300"], server.radios["FT-991"]
+    ft991.comms.inform_backend("G0ABC", 7078000, "M0ABC", "I~")
+    ic7300.comms.inform_backend("M0XYZ", 14078000, "M0BLOG", "I~")
+    ic7300.comms.inform_backend("G4AAA", 14078000, "M0ABC", "I~")  # for the blog on the other radio
+    handle_all(server)
+
+    assert outbound(ft991) == ["G0ABC"]
+    assert outbound(ic7300) == ["M0XYZ"]
+    assert (ft991.requests, ic7300.requests) == (1, 1)
+
+
+def test_a_station_asking_on_each_radio_is_answered_on_each(server):
+    # Each radio keeps its own record of requests answered, so neither copy is a repeat
+    for radio in server.radios.values():
+        radio.comms.inform_backend("G0ABC", 7078000, radio.this_blog, "I~")
+    handle_all(server)
+    assert [outbound(radio) for radio in server.radios.values()] == [["G0ABC"], ["G0ABC"]]
+
+
+def test_an_announcement_goes_out_on_each_radio(server):
+    due = server.due_announcements()
+    assert [radio.name for radio, _ in due] == ["IC-7300", "FT-991"]
+    for radio, m in due:
+        send_to_comms(m, radio)
+    for radio in server.radios.values():
+        assert outbound(radio) == ["@MB"]
+    assert server.due_announcements() == []
+
+
+def test_an_announcement_due_soon_is_brought_forward_to_go_with_another(server):
+    ic7300, ft991 = server.radios["IC-7300"], server.radios["FT-991"]
+    for radio, m in server.due_announcements():
+        send_to_comms(m, radio)
+    ft991.mb_announcement.next_announcement = clock.now() + 30
+    ic7300.mb_announcement.next_announcement = 0
+    assert [radio.name for radio, _ in server.due_announcements()] == ["IC-7300", "FT-991"]
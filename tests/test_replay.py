@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Server spans timed on the real clock, as they measure the server's own work
+WALL_CLOCK_SPANS = ("parse", "lookup")
+
+
+def replay(tmp_path, name, *args):
+    # Each run in a process of its own, as the server's queues and caches are module globals
+    record = tmp_path / f"{name}.jsonl"
+    result = subprocess.run(
+        [sys.executable, "-m", "mbserver.replay", "--record", str(record), *args],
+        cwd=ROOT, capture_output=True, text=True, timeout=120, check=True,
+    )
+    report = json.loads(result.stdout[result.stdout.index("{"):])
+    return report, record.read_text()
+
+
+def simulated(report):
+    report = dict(report)
+    wall_clock = report.pop("wall_clock_s")
+    report["server_spans_s"] = {
+        span: figures for span, figures in report["server_spans_s"].items() if span not in WALL_CLOCK_SPANS
+    }
+    return report, wall_clock
+
+
+def test_a_replay_gives_the_same_results_every_time(tmp_path):
+    args = ("--hours", "6", "--stations", "10", "--interval", "120", "--seed", "3")
+    first, first_record = replay(tmp_path, "first", *args)
+    second, second_record = replay(tmp_path, "second", *args)
+
+    first, wall_clock = simulated(first)
+    assert first == simulated(second)[0]
+    assert first_record == second_record
+    assert first["elapsed_s"] == 6 * 3600
+    assert first["requests"] > 100 and first["answered"] > 0 and first["announcements"] > 0
+    assert wall_clock < 30  # six hours of traffic in seconds
+
+
+def test_a_different_seed_gives_different_traffic(tmp_path):
+    first, _ = replay(tmp_path, "first", "--hours", "1", "--seed", "1")
+    second, _ = replay(tmp_path, "second", "--hours", "1", "--seed", "2")
+    assert simulated(first)[0] != simulated(second)[0]
@@ -0,0 +1,92 @@
+import pytest
+
+from mbserver import clock
+from mbserver.clock import SimulatedClock
+from mbserver.latency_trace import tracer
+from mbserver.mb_server import MbServer, Radio
+from mbserver.message_q import MessageParameter, MessageVerb, UnifiedMessage
+from mbserver.request_dedup import RequestDedup
+
+
+def test_a_repeat_from_the_same_station_inside_the_window_is_a_duplicate():
+    dedup = RequestDedup(60)
+    assert not dedup.is_duplicate("G0ABC", "E~", now=1000.0)
+    assert dedup.is_duplicate("G0ABC", "E~", now=1030.0)
+    assert dedup.is_duplicate("G0ABC", "E~", now=1059.9)
+    assert not dedup.is_duplicate("M0XYZ", "E~", now=1030.0)  # another station
+    assert not dedup.is_duplicate("G0ABC", "G12~", now=1030.0)  # another request
+
+
+def test_a_request_may_be_repeated_once_the_window_has_passed():
+    dedup = RequestDedup(60)
+    assert not dedup.is_duplicate("G0ABC", "E~", now=1000.0)
+    assert dedup.is_duplicate("G0ABC", "E~", now=1030.0)  # doesn't move the window on
+    assert not dedup.is_duplicate("G0ABC", "E~", now=1060.0)
+    assert dedup.is_duplicate("G0ABC", "E~", now=1100.0)  # the window now runs from 1060
+
+
+def test_a_window_of_0_turns_it_off():
+    dedup = RequestDedup(0)
+    assert not dedup.is_duplicate("G0ABC", "E~", now=1000.0)
+    assert not dedup.is_duplicate("G0ABC", "E~", now=1000.0)
+    assert dedup.seen == {}
+
+
+def test_expired_requests_are_forgotten():
+    dedup = RequestDedup(60)
+    for i in range(300):
+        dedup.is_duplicate(f"G{i}", "E~", now=1000.0)
+    assert not dedup.is_duplicate("M0XYZ", "E~", now=1100.0)
+    assert list(dedup.seen) == [("M0XYZ", "E~")]
+
+
+def test_the_window_is_timed_by_the_server_clock():
+    previous = clock.use_clock(SimulatedClock(start=1000.0))
+    try:
+        dedup = RequestDedup(60)
+        assert not dedup.is_duplicate("G0ABC", "E~")
+        clock.get_clock().advance(59)
+        assert dedup.is_duplicate("G0ABC", "E~")
+        clock.get_clock().advance(1)
+        assert not dedup.is_duplicate("G0ABC", "E~")
+    finally:
+        clock.use_clock(previous)
+
+
+@pytest.fixture
+def radio():
+    previous = clock.use_clock(SimulatedClock(start=1000.0))
+    radio = Radio("M0BLOG", comms=None)
+    radio.this_blog = "M0BLOG"
+    radio.request_dedup = RequestDedup(60)
+    yield radio
+    clock.use_clock(previous)
+
+
+def request(source, text):
+    return UnifiedMessage.create(
+        target="BACKEND", typ="MB_MSG", verb="INFORM",
+        params={"source": source, "destination": "M0BLOG", "mb_msg": text, "trace": tracer.start(source)},
+    )
+
+
+def verbs(messages):
+    return [m.get_verb() for m in messages]
+
+
+def test_a_repeated_request_is_closed_without_a_reply(radio):
+    server = MbServer(radio_settings=())
+    assert verbs(server.handle_comms_message(radio, request("G0ABC", "E~")))[0] == MessageVerb.SEND
+
+    repeat = request("G0ABC", "E~")
+    replies = server.handle_comms_message(radio, repeat)
+    # The comms driver is told, so its TX journal doesn't keep the repeat to answer after a restart
+    assert verbs(replies) == [MessageVerb.NO_REPLY]
+    assert replies[0].get_param(MessageParameter.TRACE) == repeat.get_param(MessageParameter.TRACE)
+    assert radio.request_dedup.stats()['dropped'] == 1
+    assert radio.request_dedup.stats()['airtime_saved_s'] > 0
+    assert radio.requests == 1
+
+    clock.get_clock().advance(60)
+    assert verbs(server.handle_comms_message(radio, request("G0ABC", "E~")))[0] == MessageVerb.SEND
+    assert radio.requests == 2
@@ -0,0 +1,167 @@
+import random
+import re
+
+import pytest
+
+from mbserver.request_grammar import REQUEST_COMPONENTS_EXP, parse_request
+from mbserver.server_api import api_parse_req
+
+
+# The parser the grammar replaced: cli_translate() turned a CLI request into an API one,
+# then api_parse_req() tried every API pattern in turn, each match overwriting the last.
+
+_OLD_CLI_FORMAT = [
+    {'exp': r'^M.E$', 'xlat': 'E~', 'by': 'id'},
+    {'exp': r'^M.E +(\d+)$', 'xlat': 'E{param}~', 'by': 'id'},
+    {'exp': r'^M.E +(\d{4}-\d{2}-\d{2})$', 'xlat': 'E{param}~', 'by': 'date'},
+    {'exp': r'^M.E +(\d{4}-\d{2}-\d{2} +\d{4}-\d{2}-\d{2})$', 'xlat': 'E{param}~', 'by': 'date_range'},
+    {'exp': r'^M.E +(\d+D)$', 'xlat': 'E{param}~', 'by': 'days'},
+    {'exp': r'^M.G +(\d+)$', 'xlat': 'G{param}~', 'by': 'id'},
+    {'exp': r'^M.WX$', 'xlat': 'G0~', 'by': 'id'},
+    {'exp': r'^M.S +([\S ]+)$', 'xlat': 'S{param}~', 'by': 'text'},
+    {'exp': r'^M.I$', 'xlat': 'I~', 'by': 'id'},
+    {'exp': r'^M.\?$', 'xlat': 'I~', 'by': 'id'},
+    {'exp': r'^M.L$', 'xlat': 'E~', 'by': 'id'},
+    {'exp': r'^M.L +(\d+)$', 'xlat': 'E{param}~', 'by': 'id'},
+    {'exp': r'^M.L +(\d{4}-\d{2}-\d{2})$', 'xlat': 'E{param}~', 'by': 'date'},
+]
+
+_OLD_API_FORMAT = [
+    {'exp': r'^E~', 'verb': 'LIST', 'by': 'ID'},
+    {'exp': r'^E(\d+,)*\d+~', 'verb': 'LIST', 'by': 'ID'},
+    {'exp': r'^E\d{4}-\d{2}-\d{2}~', 'verb': 'LIST', 'by': 'DATE'},
+    {'exp': r'^E\d{4}-\d{2}-\d{2}/\d{4}-\d{2}-\d{2}~', 'verb': 'LIST', 'by': 'DATE_RANGE'},
+    {'exp': r'^E\d+D~', 'verb': 'LIST', 'by': 'DAYS'},
+    {'exp': r'^G\d+~', 'verb': 'GET', 'by': 'ID'},
+    {'exp': r'^I~', 'verb': 'INFO', 'by': 'ID'},
+    {'exp': r'^S[\S ]+~', 'verb': 'SEARCH', 'by': 'TEXT'},
+]
+
+
+def old_cli_translate(command):
+    command = command.strip()
+    for entry in _OLD_CLI_FORMAT:
+        result = re.findall(entry['exp'], command)
+        if not result:
+            continue
+        param = str(result[0])
+        if entry['by'] == 'date_range':
+            param = '/'.join(param.split())
+        return str(entry['xlat']).format(param=param)
+    return ""
+
+
+def old_api_parse_list(api_request, by):
+    if by == 'ID':
+        post_id_list = []
+        if re.fullmatch(r'E\d+(?:,\d+)*~', api_request):
+            post_id_list = list(map(int, re.findall(r'\d+', api_request)))
+        return {'cmd': api_request, 'verb': 'LIST', 'by': 'ID', 'id_list': post_id_list}
+    if by == 'DATE':
+        date = re.findall(r'^E(\d{4}-\d{2}-\d{2})~', api_request)[0]
+        return {'cmd': api_request, 'verb': 'LIST', 'by': 'DATE', 'date': date}
+    if by == 'DATE_RANGE':
+        date_from, date_to = re.findall(r'^E(\d{4}-\d{2}-\d{2})/(\d{4}-\d{2}-\d{2})~', api_request)[0]
+        return {'cmd': api_request, 'verb': 'LIST', 'by': 'DATE_RANGE', 'date_from': date_from, 'date_to': date_to}
+    days = int(re.findall(r'^E(\d+)D~', api_request)[0])
+    return {'cmd': api_request, 'verb': 'LIST', 'by': 'DAYS', 'days': days}
+
+
+def old_api_parse_req(api_req):
+    req_dict = {}
+    for entry in _OLD_API_FORMAT:
+        if re.search(entry['exp'], api_req) is None:
+            continue
+        if entry['verb'] == 'LIST':
+            req_dict = old_api_parse_list(api_req, entry['by'])
+        elif entry['verb'] == 'GET':
+            req_dict = {'cmd': api_req, 'verb': 'GET', 'by': 'ID', 'id_list': list(map(int, re.findall(r'\d+', api_req)))}
+        elif entry['verb'] == 'INFO':
+            req_dict = {'cmd': api_req, 'verb': 'INFO', 'by': 'ID', 'id_list': []}
+        elif entry['verb'] == 'SEARCH':
+            text = re.findall(r'^S([\S ]+)~', api_req)[0]
+            req_dict = {'cmd': api_req, 'verb': 'SEARCH', 'by': 'TEXT', 'text': text.strip()}
+    return req_dict
+
+
+def old_parse(mb_cmd):
+    if mb_cmd[:2] == 'M.':
+        mb_cmd = old_cli_translate(mb_cmd)
+    return old_api_parse_req(mb_cmd)
+
+
+def random_requests(count, seed=1):
+    # Valid requests of every API and CLI form
+    rng = random.Random(seed)
+
+    def post_id():
+        return str(rng.randint(0, 99999)).zfill(rng.choice((1, 4, 5)))
+
+    def a_date():
+        return f"{rng.randint(2000, 2099)}-{rng.randint(1, 12):02d}-{rng.randint(1, 31):02d}"
+
+    def spaces():
+        return " " * rng.randint(1, 3)
+
+    def text():
+        words = ["".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", k=rng.randint(1, 8)))
+                 for _ in range(rng.randint(1, 4))]
+        return " ".join(words)
+
+    forms = [
+        lambda: "E~",
+        lambda: f"E{','.join(post_id() for _ in range(rng.randint(1, 6)))}~",
+        lambda: f"E{a_date()}~",
+        lambda: f"E{a_date()}/{a_date()}~",
+        lambda: f"E{rng.randint(0, 400)}D~",
+        lambda: f"G{post_id()}~",
+        lambda: "I~",
+        lambda: f"S{text()}~",
+        lambda: f"S {text()}~",
+        lambda: rng.choice(("M.E", "M.L", "M.I", "M.?", "M.WX")),
+        lambda: f"M.{rng.choice('EL')}{spaces()}{post_id()}",
+        lambda: f"M.{rng.choice('EL')}{spaces()}{a_date()}",
+        lambda: f"M.E{spaces()}{a_date()}{spaces()}{a_date()}",
+        lambda: f"M.E{spaces()}{rng.randint(0, 400)}D",
+        lambda: f"M.G{spaces()}{post_id()}",
+        lambda: f"M.S{spaces()}{text()}",
+        lambda: f"M.{rng.choice('EG')} {post_id()}{spaces()}",  # the request is read up to the end of the line
+    ]
+    return [rng.choice(forms)() for _ in range(count)]
+
+
+def test_valid_requests_parse_as_they_did_before():
+    for request in random_requests(20_000):
+        new = api_parse_req(request)
+        assert new == old_parse(request), request
+        assert new
+
+
+@pytest.mark.parametrize("request_text", ["", "~", "E", "E6", "G~", "Gx~", "S~", "M.", "M.G", "M.E x", "M.X", "HELLO"])
+def test_invalid_requests_parse_to_nothing(request_text):
+    assert parse_request(request_text) == {}
+    assert old_parse(request_text) == {}
+
+
+def test_search_text_ends_at_the_first_terminator():
+    assert parse_request("S foo~ E6~") == {'cmd': "S foo~ E6~", 'verb': 'SEARCH', 'by': 'TEXT', 'text': "foo"}
+    assert parse_request("SFLOOD WARNING~ ~")['text'] == "FLOOD WARNING"
+    assert parse_request("M.S flood water")['cmd'] == "Sflood water~"
+    assert parse_request("M.S flood~ E6") == {}  # would otherwise become the API request Sflood~ E6~
+
+
+def test_request_components():
+    assert REQUEST_COMPONENTS_EXP.findall("G0ABC: M0BLOG  E6,10~") == [("G0ABC", "M0BLOG", "E6,10~")]
+
+
+@pytest.mark.benchmark
+def test_the_grammar_is_quicker_than_the_old_parser(timer):
+    requests = random_requests(2000, seed=2)
+
+    def parse_all(parse):
+        return lambda: [parse(request) for request in requests]
+
+    old = timer(parse_all(old_parse), repeat=3) / len(requests)
+    new = timer(parse_all(api_parse_req), repeat=3) / len(requests)
+    print(f"\nParsing a request: old {old * 1e6:.2f} us, grammar {new * 1e6:.2f} us")
+    assert new * 2 < old
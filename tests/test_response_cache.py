@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from mbserver import clock, mb_server, server_api
+from mbserver.clock import SimulatedClock
+from mbserver.content_cache import ContentCache
+from mbserver.mb_server import MbServer
+from mbserver.post_index import PostIndex
+from mbserver.response_cache import ResponseCache, request_key
+from mbserver.server_api import api_get_req_structure
+
+
+def write_post(posts_dir, post_id, post_date, title, body):
+    path = posts_dir / f"{post_id:04d} - {post_date} - {title}.txt"
+    path.write_text(body, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def posts_dir(tmp_path, monkeypatch):
+    # A posts directory and caches of the test's own in place of the server's
+    write_post(tmp_path, 1, "2023-11-13", "River levels", "The river is rising.\nStay clear.")
+    write_post(tmp_path, 2, "2023-11-14", "Net times", "The net meets at 1900.")
+    (tmp_path / "info.txt").write_text("About this blog")
+    store = PostIndex(str(tmp_path))
+    store.build()
+    for module in (mb_server, server_api):
+        monkeypatch.setattr(module, "post_store", store)
+    monkeypatch.setattr(mb_server, "posts_dir", str(tmp_path))
+    monkeypatch.setattr(mb_server, "content_cache", ContentCache(10000))
+    monkeypatch.setattr(mb_server, "response_cache", ResponseCache(20))
+    return tmp_path
+
+
+def respond(cmd):
+    # The response, and whether it came from the cache
+    hits = mb_server.response_cache.hits
+    response = MbServer.respond(api_get_req_structure(cmd))
+    return response, mb_server.response_cache.hits > hits
+
+
+def test_requests_for_the_same_posts_share_a_response(posts_dir):
+    assert request_key(api_get_req_structure("E~")) == request_key(api_get_req_structure("E2,1~"))
+    assert request_key(api_get_req_structure("M.E")) == request_key(api_get_req_structure("E~"))
+    assert request_key(api_get_req_structure("M.G 2")) == request_key(api_get_req_structure("G2~"))
+    assert request_key(api_get_req_structure("G2~")) != request_key(api_get_req_structure("E2~"))
+    # A listing by date replies with the command itself, so the command is part of the key
+    assert request_key(api_get_req_structure("E2023-11-14~")) != request_key(api_get_req_structure("E2~"))
+
+    respond("E~")
+    assert respond("M.E") == (respond("E~")[0], True)
+
+
+def test_a_new_post_makes_listings_stale(posts_dir):
+    first, _ = respond("E~")
+    assert respond("E1~") == ([first[-1]], False)
+    write_post(posts_dir, 3, "2023-11-15", "Flood warning", "Flooding on the low road.")
+    assert mb_server.post_store.add_file("0003 - 2023-11-15 - Flood warning.txt")
+    assert respond("E1~") == ([first[-1]], False)  # a new generation, even for a listing that hasn't changed
+    response, cached = respond("E~")
+    assert not cached and response[0].startswith("+E3~")
+
+
+def test_a_changed_post_file_makes_its_response_stale(posts_dir):
+    assert respond("G2~") == (["+G2~\nThe net meets at 1900."], False)
+    assert respond("G2~")[1]
+    path = write_post(posts_dir, 2, "2023-11-14", "Net times", "The net meets at 2000.")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # the same size, so only the mtime tells
+    assert respond("G2~") == (["+G2~\nThe net meets at 2000."], False)
+
+
+def test_a_changed_or_removed_info_file_makes_its_response_stale(posts_dir):
+    assert respond("I~") == (["+I~\nAbout this blog"], False)
+    assert respond("I~")[1]
+    (posts_dir / "info.txt").write_text("About this blog, now longer")
+    assert respond("I~") == (["+I~\nAbout this blog, now longer"], False)
+    (posts_dir / "info.txt").unlink()
+    assert respond("I~") == (["-I~\nNO INFORMATION IS AVAILABLE FOR THIS SERVER"], False)
+
+
+@pytest.mark.parametrize("setting, value", [("lst_limit", 1), ("replace_nl", True)])
+def test_a_change_of_setting_makes_responses_stale(posts_dir, monkeypatch, setting, value):
+    respond("E~")
+    respond("G1~")
+    monkeypatch.setattr(mb_server, setting, value)
+    assert not respond("E~")[1]
+    assert not respond("G1~")[1]
+
+
+def test_newlines_are_replaced_in_a_response_built_after_replace_nl_is_set(posts_dir, monkeypatch):
+    assert respond("G1~")[0] == ["+G1~\nThe river is rising.\nStay clear."]
+    monkeypatch.setattr(mb_server, "replace_nl", True)
+    assert respond("G1~")[0] == ["+G1~\nThe river is rising. Stay clear."]
+
+
+def test_a_days_listing_is_keyed_by_the_dates_it_covers(posts_dir):
+    previous = clock.use_clock(SimulatedClock(start=1_700_000_000.0))  # 2023-11-14 22:13 UTC
+    try:
+        today = api_get_req_structure("E1D~")
+        assert (today['date_from'], today['date_to'], today['id_list']) == ("2023-11-14", "2023-11-14", [2])
+        assert respond("E7D~")[1] is False
+        assert respond("M.E 7D")[1] is True
+
+        clock.get_clock().advance(2 * 3600)  # past midnight, with the same posts in the last seven days
+        tomorrow = api_get_req_structure("E7D~")
+        assert tomorrow['id_list'] == [2, 1]
+        assert (tomorrow['date_from'], tomorrow['date_to']) == ("2023-11-09", "2023-11-15")
+        assert respond("E7D~")[1] is False
+        assert respond("E1D~") == (["-E1D~\nNO POSTS FOUND"], False)
+    finally:
+        clock.use_clock(previous)
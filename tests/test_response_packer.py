@@ -0,0 +1,26 @@
+import re
+
+from mbserver.response_packer import pack_responses
+
+LISTINGS = [f"+E{i}~\n{i} - 2026-01-{i:02d} - Post number {i}" for i in range(1, 11)]
+
+
+def split(message):
+    # As a client does: a new listing starts at every +En~ or -En~ line
+    return re.split(r"\n(?=[+-]E\d+~\n)", message)
+
+
+def test_packing_is_off_with_no_limit():
+    assert pack_responses(LISTINGS, 0) == LISTINGS
+
+
+def test_packed_listings_split_back_into_the_originals():
+    packed = pack_responses(LISTINGS, 120)
+    assert 1 < len(packed) < len(LISTINGS)
+    assert all(len(message) <= 120 for message in packed)
+    assert [listing for message in packed for listing in split(message)] == LISTINGS
+
+
+def test_other_replies_are_never_packed():
+    post = "+G3~\nThe content of post 3"
+    assert pack_responses([LISTINGS[0], post, LISTINGS[1]], 250) == [LISTINGS[0], post, LISTINGS[1]]
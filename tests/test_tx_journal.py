@@ -0,0 +1,123 @@
+import pytest
+
+from mbserver.message_q import FairQueue, MessageParameter, UnifiedMessage
+from mbserver.tx_journal import TxJournal
+from mbserver.tx_scheduler import Transmission, TxScheduler
+
+
+def request(source, text, trace):
+    return UnifiedMessage.create(
+        target="BACKEND", typ="MB_MSG", verb="INFORM",
+        params={"source": source, "destination": "M0BLOG", "mb_msg": text, "trace": trace},
+    )
+
+
+def reply(destination, text, trace):
+    return UnifiedMessage.create(
+        target="COMMS", typ="MB_MSG", verb="SEND",
+        params={"destination": destination, "mb_msg": text, "trace": trace},
+    )
+
+
+def open_journal(path):
+    journal = TxJournal(str(path))
+    recovered = journal.open()
+    return journal, recovered
+
+
+def test_a_request_answered_by_a_collapsed_reply_is_finished(tmp_path):
+    path = tmp_path / "tx.journal"
+    journal, _ = open_journal(path)
+    q = FairQueue()
+    q.on_queued = journal.queued
+    q.on_collapsed = journal.collapsed
+
+    journal.accepted(request("G0ABC", "E6~", trace=1))
+    q.put(reply("G0ABC", "E6 hello", trace=1))
+    journal.accepted(request("G0ABC", "E6~", trace=2))
+    q.put(reply("G0ABC", "E6 hello", trace=2))  # collapsed into the first
+    assert q.qsize() == 1
+    assert len(journal.live) == 1  # just the reply waiting to be sent
+    journal.close()
+
+    journal, (requests, replies) = open_journal(path)
+    assert requests == []
+    assert [m.get_param(MessageParameter.MB_MSG) for m in replies] == ["E6 hello"]
+    journal.close()
+
+
+def test_a_request_that_gets_no_reply_is_finished(tmp_path):
+    path = tmp_path / "tx.journal"
+    journal, _ = open_journal(path)
+    journal.accepted(request("G0ABC", "E6~", trace=1))
+    journal.accepted(request("G0ABC", "hello", trace=2))
+    journal.no_reply(request("G0ABC", "hello", trace=2))
+    journal.close()
+
+    journal, (requests, _) = open_journal(path)
+    assert [m.get_param(MessageParameter.MB_MSG) for m in requests] == ["E6~"]
+    journal.close()
+
+
+def queued_reply(journal, trace):
+    m = reply("G0ABC", "E6 hello", trace=trace)
+    journal.queued(m)
+    return m
+
+
+def transmission(m, **kwargs):
+    return Transmission("G0ABC E6 hello", 2, 25.0, 0.0, entry=m.get_param(MessageParameter.JOURNAL), **kwargs)
+
+
+def test_only_a_ptt_seen_going_off_confirms_a_reply(tmp_path):
+    journal, _ = open_journal(tmp_path / "tx.journal")
+    never_keyed, ptt_off_lost, sent = (queued_reply(journal, trace) for trace in (1, 2, 3))
+
+    journal.transmitted(transmission(never_keyed))
+    journal.transmitted(transmission(ptt_off_lost, started_at=1.0, ptt_off_at=60.0, ptt_off_lost=True))
+    journal.transmitted(transmission(sent, started_at=1.0, ptt_off_at=26.0))
+    assert sorted(journal.live) == sorted(m.get_param(MessageParameter.JOURNAL) for m in (never_keyed, ptt_off_lost))
+    journal.close()
+
+
+def test_the_scheduler_marks_a_lost_ptt_off():
+    finished = []
+    scheduler = TxScheduler(on_finish=lambda tx, now: finished.append(tx))
+    scheduler.on_send("G0ABC E6 hello", "E6 hello", now=0.0)
+    scheduler.on_ptt(True, now=15.0)
+    assert scheduler.can_release(now=1000.0)
+    assert finished[0].ptt_off_lost
+
+
+def test_a_reply_handed_over_with_no_ptt_to_confirm_it_is_finished(tmp_path):
+    journal, _ = open_journal(tmp_path / "tx.journal")
+    journal.sent(queued_reply(journal, trace=1))
+    assert journal.live == {}
+    journal.close()
+
+
+@pytest.mark.benchmark
+def test_journal_overhead_per_message(tmp_path, timer):
+    # Each message is a request and its reply: accepted, queued, then both entries finished
+    n = 5000
+
+    def messages(journal):
+        def run():
+            for trace in range(n):
+                journal.accepted(request("G0ABC", "E6~", trace))
+                m = reply("G0ABC", "E6 hello", trace)
+                journal.queued(m)
+                journal.transmitted(transmission(m, started_at=1.0, ptt_off_at=26.0))
+        return run
+
+    off = TxJournal("")  # as with tx_journal blank
+    off.open()
+    on, _ = open_journal(tmp_path / "tx.journal")
+    without, with_journal = timer(messages(off), repeat=3) / n, timer(messages(on), repeat=3) / n
+    assert on.live == {}
+    print(
+        f"\nPer message: no journal {without * 1e6:.1f} us, journal {with_journal * 1e6:.1f} us"
+        f" ({on.written} records, {on.syncs} syncs)"
+    )
+    on.close()
+    assert with_journal - without < 500e-6  # well under a millisecond, nothing like an fsync per record
@@ -0,0 +1,62 @@
+from mbserver.tx_scheduler import TxScheduler, LOST_PTT_FRAMES, FRAME_SECONDS, TX_DUTY, START_MARGIN
+
+
+def ultra_scheduler(finished):
+    scheduler = TxScheduler(16, on_finish=lambda tx, now: finished.append((tx, now)))
+    scheduler.set_speed(8)  # 4 second frames
+    return scheduler
+
+
+def test_nothing_sent_can_release_at_once():
+    assert TxScheduler().release_time() == 0.0
+    assert TxScheduler().can_release(now=0.0)
+
+
+def test_released_after_the_last_frame_and_its_gap():
+    finished = []
+    scheduler = ultra_scheduler(finished)
+    scheduler.on_send("a", "x" * 10, now=0.0)  # 2 frames
+    scheduler.on_ptt(True, now=4.0)
+    scheduler.on_ptt(False, now=7.4)
+    # One frame still to come, so a whole cycle is allowed for it to start
+    assert scheduler.release_time() == 7.4 + FRAME_SECONDS[8]
+    scheduler.on_ptt(True, now=8.0)
+    scheduler.on_ptt(False, now=11.4)
+    release = 11.4 + FRAME_SECONDS[8] * (1 - TX_DUTY) + 1.0
+    assert scheduler.release_time() == release
+    assert not scheduler.can_release(now=release - 0.1)
+    assert scheduler.can_release(now=release)
+    assert [tx.label for tx, _ in finished] == ["a"]
+    assert scheduler.stats()['transmissions'] == 1
+
+
+def test_no_ptt_at_all_is_released_after_the_predicted_airtime():
+    finished = []
+    scheduler = ultra_scheduler(finished)
+    scheduler.on_send("a", "x" * 10, now=0.0)
+    tx = scheduler.current
+    release = FRAME_SECONDS[8] + START_MARGIN + tx.predicted
+    assert not scheduler.can_release(now=release - 0.1)
+    assert scheduler.can_release(now=release)
+    assert finished[0][0].started_at is None
+    assert scheduler.stats()['transmissions'] == 0
+
+
+def test_a_lost_ptt_off_does_not_hold_the_queue_for_ever():
+    finished = []
+    scheduler = ultra_scheduler(finished)
+    scheduler.on_send("a", "x" * 30, now=0.0)
+    tx = scheduler.current
+    scheduler.on_ptt(True, now=4.0)  # and the PTT off never arrives
+
+    deadline = 4.0 + tx.predicted + FRAME_SECONDS[8] * LOST_PTT_FRAMES
+    assert scheduler.release_time() == deadline
+    assert not scheduler.can_release(now=deadline - 0.1)
+    assert scheduler.can_release(now=deadline)
+
+    finished_tx, _ = finished[0]
+    assert not finished_tx.ptt_on
+    assert finished_tx.ptt_off_at == deadline
+    # The airtime isn't known, so it isn't counted
+    assert scheduler.stats()['transmissions'] == 0
+    assert scheduler.current is None
@@ -0,0 +1,29 @@
+from mbserver import upstream
+from mbserver.upstream import UpstreamStore
+
+
+def test_new_posts_are_fetched_by_id_not_by_position(tmp_path, monkeypatch):
+    # post.lst out of order, with gaps and IDs past 9999
+    post_lst = "".join(f"{name}\r\n" for name in (
+        "9998 - 2026-01-01 - Old.txt",
+        "10001 - 2026-01-03 - Newer.txt",
+        "9999 - 2026-01-02 - Before.txt",
+        "10000 - 2026-01-02 - New.txt",
+    ))
+    fetched, indexed = [], []
+
+    def get_web_data(url):
+        if url.endswith("/post.lst"):
+            return post_lst
+        fetched.append(url)
+        return "Body\r\n"
+
+    store = UpstreamStore.__new__(UpstreamStore)
+    store.posts_url_root, store.posts_dir = "http://blog", str(tmp_path)
+    monkeypatch.setattr(store, "get_web_data", get_web_data)
+    monkeypatch.setattr(upstream.post_store, "add_file", indexed.append)
+
+    store.get_new_content(starting_at=10000)
+    assert indexed == ["10001 - 2026-01-03 - Newer.txt", "10000 - 2026-01-02 - New.txt"]
+    assert len(fetched) == 2
+    assert (tmp_path / "10000 - 2026-01-02 - New.txt").read_text() == "Body"
@@ -0,0 +1,45 @@
+import logging
+
+from mbserver.mb_server import MbServer, response_cache
+from mbserver.post_index import PostIndex, parse_post_file_name
+from mbserver.post_store import post_store
+from mbserver.server_api import api_get_req_structure
+
+
+def test_the_scan_reports_bad_names_and_shared_ids_once(tmp_path, caplog):
+    for name in (
+        "0001 - 2026-01-01 - First.txt",
+        "0002 - 2026-01-02 - Second.txt",
+        "2 - 2026-01-03 - Second again.txt",
+        "0003 - 2026-02-30 - No such date.txt",
+        "0004 - Missing date.txt",
+        "info.txt",
+        "notes.md",
+    ):
+        (tmp_path / name).write_text("x", encoding="utf-8")
+    index = PostIndex(str(tmp_path))
+    index.build()
+    report = index.scan_report
+
+    assert report.posts == 2
+    assert sorted(report.malformed) == ["0003 - 2026-02-30 - No such date.txt", "0004 - Missing date.txt"]
+    assert sorted(report.duplicates[2]) == ["0002 - 2026-01-02 - Second.txt", "2 - 2026-01-03 - Second again.txt"]
+    with caplog.at_level(logging.WARNING):
+        report.log(str(tmp_path))
+    assert len(caplog.records) == 3
+    assert "serving 2 - 2026-01-03 - Second again.txt" in caplog.records[-1].getMessage()
+
+
+def test_impossible_dates_are_not_post_names():
+    assert parse_post_file_name("12 - 2026-01-31 - Fine.txt") == (12, "2026-01-31", "Fine")
+    assert parse_post_file_name("12 - 2026-13-01 - Bad month.txt") is None
+
+
+def test_the_first_requests_are_answered_from_the_cache_after_warm_up():
+    server = MbServer(radio_settings=())
+    server.warm_up().close()
+    latest = post_store.latest()
+    before = response_cache.hits
+    for cmd in ("E~", "I~", f"G{latest.post_id}~"):
+        server.respond(api_get_req_structure(cmd))
+    assert response_cache.hits - before == 3